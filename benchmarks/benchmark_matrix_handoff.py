@@ -0,0 +1,89 @@
+"""
+Benchmark handing a travel matrix to vroom.Input: the former float64 .tolist()
+path against the uint32 array path. Every method runs in a fresh process so
+peak RSS is measured independently.
+
+    python -m benchmarks.benchmark_matrix_handoff --sizes 1000 3000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+METHODS = ("float64_tolist", "uint32_array")
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as fp:
+        return int(fp.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def run_method(method: str, size: int) -> dict:
+    """
+    Build a random symmetric matrix and time its handoff to vroom.Input
+    Returns:
+        Dict with setup seconds, peak RSS growth during the handoff and RSS
+        still held afterwards (vroom's own copy of the matrix), both in MB
+    """
+    import vroom
+    from infrastructure.matrix_service import as_vroom_matrix
+
+    rng = np.random.default_rng(0)
+    matrix = rng.integers(0, 7200, (size, size), dtype=np.int32)
+    matrix = np.triu(matrix, 1)
+    matrix += matrix.T
+    if method == "float64_tolist":
+        # The matrices used to reach the optimizer as float64 arrays
+        matrix = matrix.astype(np.float64)
+
+    problem_instance = vroom.Input()
+    peak_before = _peak_rss_mb()
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if method == "float64_tolist":
+        problem_instance.set_durations_matrix(profile="car", matrix_input=matrix.tolist())
+    else:
+        problem_instance.set_durations_matrix(profile="car", matrix_input=as_vroom_matrix(matrix))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "method": method,
+        "size": size,
+        "seconds": elapsed,
+        "peak_rss_growth_mb": _peak_rss_mb() - peak_before,
+        "retained_rss_mb": _rss_mb() - rss_before,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{'size':>6} {'method':>16} {'setup (s)':>10} {'peak RSS +MB':>13} {'retained MB':>12}")
+    for size in args.sizes:
+        for method in METHODS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.benchmark_matrix_handoff", "--method", method, "--sizes", str(size)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{size:>6} {method:>16} {result['seconds']:>10.3f} {result['peak_rss_growth_mb']:>13.1f} {result['retained_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the matrix handoff to vroom")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 3000], help="Matrix sizes to benchmark")
+    parser.add_argument("--method", choices=METHODS, help="Run a single method in this process (used internally)")
+    args = parser.parse_args()
+
+    if args.method:
+        for size in args.sizes:
+            print(json.dumps(run_method(args.method, size)))
+    else:
+        main(args)
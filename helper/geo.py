@@ -0,0 +1,176 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_pairs(start_latlongs, end_latlongs) -> np.ndarray:
+    """
+    Great-circle distance between matching rows of two coordinate arrays
+    Args:
+        start_latlongs: Array-like of shape (n, 2) holding (latitude, longitude)
+        end_latlongs: Array-like of shape (n, 2) holding (latitude, longitude)
+    Returns:
+        Array of n distances in meters
+    """
+    start = np.radians(np.asarray(start_latlongs, dtype=np.float64))
+    end = np.radians(np.asarray(end_latlongs, dtype=np.float64))
+    dlat = end[..., 0] - start[..., 0]
+    dlon = end[..., 1] - start[..., 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(start[..., 0]) * np.cos(end[..., 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(latlongs, other_latlongs=None) -> np.ndarray:
+    """
+    Great-circle distance between every pair of points, in one broadcast
+    Args:
+        latlongs: Array-like of shape (n, 2) holding (latitude, longitude)
+        other_latlongs: Optional array-like of shape (m, 2), defaults to latlongs
+    Returns:
+        Array of shape (n, m) with distances in meters
+    """
+    latlongs = np.asarray(latlongs, dtype=np.float64)
+    other_latlongs = latlongs if other_latlongs is None else np.asarray(other_latlongs, dtype=np.float64)
+    return haversine_pairs(latlongs[:, None, :], other_latlongs[None, :, :])
+
+
+def k_nearest(latlongs, k: int, chunk_size: int = 1024) -> np.ndarray:
+    """
+    Indices of the k nearest other points of every point by great-circle distance.
+    Rows are processed in chunks so memory stays at chunk_size x n.
+    Args:
+        latlongs: Array-like of shape (n, 2)
+        k: Number of neighbours, capped at n - 1
+        chunk_size: Number of rows per distance block
+    Returns:
+        int64 array of shape (n, k), neighbours of each row in no particular order
+    """
+    latlongs = np.asarray(latlongs, dtype=np.float64)
+    n = len(latlongs)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64)
+
+    neighbours = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        distances = haversine_matrix(latlongs[start:end], latlongs)
+        distances[np.arange(end - start), np.arange(start, end)] = np.inf
+        neighbours[start:end] = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return neighbours
+
+
+def tolerance_for_zoom(latitude: float, zoom: int, pixels: float = 1.0) -> float:
+    """
+    Ground distance covered by a number of screen pixels on a web map
+    Args:
+        latitude: Latitude of the map area
+        zoom: Web map zoom level
+        pixels: Number of pixels
+    Returns:
+        Distance in meters
+    """
+    metres_per_pixel = 2 * np.pi * EARTH_RADIUS_M * np.cos(np.radians(latitude)) / (256 * 2 ** zoom)
+    return float(metres_per_pixel * pixels)
+
+
+def simplify_polyline(latlongs, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of a (latitude, longitude) polyline
+    Args:
+        latlongs: Array-like of shape (n, 2)
+        tolerance_m: Maximum distance in meters between the simplified line and dropped points
+    Returns:
+        Array of the kept points, always including both ends
+    """
+    latlongs = np.asarray(latlongs, dtype=np.float64).reshape(-1, 2)
+    n = len(latlongs)
+    if n < 3 or tolerance_m <= 0:
+        return latlongs
+
+    # Local equirectangular projection to meters, accurate at the scale of one route
+    radians = np.radians(latlongs)
+    xy = np.column_stack((radians[:, 1] * np.cos(radians[:, 0].mean()), radians[:, 0])) * EARTH_RADIUS_M
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        direction = xy[end] - xy[start]
+        offsets = xy[start + 1:end] - xy[start]
+        length = np.hypot(direction[0], direction[1])
+        if length > 0:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return latlongs[keep]
+
+
+def kmeans(latlongs, k: int, max_iterations: int = 50, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Partition points into k geographic clusters with k-means on a local
+    equirectangular projection, seeded with k-means++
+    Args:
+        latlongs: Array-like of shape (n, 2)
+        k: Number of clusters, capped at n
+        max_iterations: Maximum number of assignment and update rounds
+        seed: Random seed of the initial centres
+    Returns:
+        Tuple of (int64 cluster label of every point, (k, 2) array of cluster centres as (latitude, longitude))
+    """
+    latlongs = np.asarray(latlongs, dtype=np.float64).reshape(-1, 2)
+    n = len(latlongs)
+    k = max(1, min(k, n))
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2))
+
+    radians = np.radians(latlongs)
+    xy = np.column_stack((radians[:, 1] * np.cos(radians[:, 0].mean()), radians[:, 0])) * EARTH_RADIUS_M
+
+    # k-means++: every next centre is drawn with probability proportional to the squared distance
+    rng = np.random.default_rng(seed)
+    centres = np.empty((k, 2))
+    centres[0] = xy[rng.integers(n)]
+    closest = ((xy - centres[0]) ** 2).sum(axis=1)
+    for index in range(1, k):
+        total = closest.sum()
+        pick = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centres[index] = xy[pick]
+        closest = np.minimum(closest, ((xy - centres[index]) ** 2).sum(axis=1))
+
+    # Squared distances as |x|^2 - 2 x.c + |c|^2, one matrix product per round
+    squared_norms = (xy ** 2).sum(axis=1)
+    labels = np.full(n, -1, dtype=np.int64)
+    for _ in range(max_iterations):
+        distances = squared_norms[:, None] - 2 * xy @ centres.T + (centres ** 2).sum(axis=1)[None, :]
+        new_labels = distances.argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, xy)
+        filled = counts > 0
+        centres[filled] = sums[filled] / counts[filled, None]
+        # An empty cluster restarts at the point farthest from its centre
+        for index in np.flatnonzero(~filled):
+            farthest = int(distances[np.arange(n), labels].argmax())
+            centres[index] = xy[farthest]
+            labels[farthest] = index
+            distances[farthest] = 0
+
+    # Back to (latitude, longitude)
+    centre_latitudes = centres[:, 1] / EARTH_RADIUS_M
+    centre_longitudes = centres[:, 0] / EARTH_RADIUS_M / np.cos(radians[:, 0].mean())
+    return labels, np.degrees(np.column_stack((centre_latitudes, centre_longitudes)))
@@ -0,0 +1,178 @@
+import atexit
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+def normalise_postal_code(postal_code) -> str:
+    """
+    Normalise a postal code to the 6 digit string used as cache key
+    (e.g. 18906 and "018906" map to the same entry)
+    """
+    postal_code = str(postal_code).strip()
+    if postal_code.isdigit():
+        postal_code = postal_code.zfill(6)
+    return postal_code
+
+
+@dataclass(frozen=True)
+class GeocodeRecord:
+    """
+    Result of a OneMap search for one postal code. A record without
+    coordinates remembers that OneMap did not find the postal code.
+    """
+    postal_code: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    address: Optional[str]
+    fetched_at: float
+
+    @property
+    def found(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+    @property
+    def latlong(self) -> tuple[float, float] | None:
+        if not self.found:
+            return None
+        return self.latitude, self.longitude
+
+
+class GeocodeCache:
+    """
+    SQLite backed cache of OneMap search results keyed by postal code.
+    Writes are buffered and committed in batches; pending records are
+    visible to readers immediately and flushed at exit.
+    """
+
+    def __init__(
+            self,
+            db_path: Path,
+            legacy_dict_path: Optional[Path] = None,
+            not_found_ttl: float = 7 * 24 * 3600,
+            batch_size: int = 50):
+        """
+        Args:
+            db_path: Path of the SQLite database file
+            legacy_dict_path: Optional postal_dict.yaml imported once into an empty cache
+            not_found_ttl: Seconds a "not found" result is trusted before searching again
+            batch_size: Number of pending records that triggers a commit
+        """
+        self._db_path = Path(db_path)
+        self._not_found_ttl = not_found_ttl
+        self._batch_size = batch_size
+        self._pending: Dict[str, GeocodeRecord] = {}
+        self._lock = threading.Lock()
+
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            "postal_code TEXT PRIMARY KEY, "
+            "latitude REAL, "
+            "longitude REAL, "
+            "address TEXT, "
+            "fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        if legacy_dict_path is not None:
+            self._import_legacy_dict(Path(legacy_dict_path))
+
+        atexit.register(self.flush)
+
+    def _import_legacy_dict(self, legacy_dict_path: Path) -> None:
+        """Seed an empty cache with the coordinates stored in postal_dict.yaml"""
+        if not legacy_dict_path.exists():
+            return
+        if self._conn.execute("SELECT 1 FROM geocode LIMIT 1").fetchone():
+            return
+
+        import yaml
+
+        with open(legacy_dict_path, 'r') as yaml_file:
+            postal_dict = yaml.load(yaml_file, Loader=yaml.Loader) or {}
+
+        now = time.time()
+        rows = [
+            (normalise_postal_code(postal_code), float(latlon[0]), float(latlon[1]), None, now)
+            for postal_code, latlon in postal_dict.items()
+            if postal_code is not None and latlon
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO geocode VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def _is_fresh(self, record: GeocodeRecord) -> bool:
+        if record.found:
+            return True
+        return time.time() - record.fetched_at < self._not_found_ttl
+
+    def get(self, postal_code) -> Optional[GeocodeRecord]:
+        """
+        Look up a postal code
+        Returns:
+            The cached record, or None on a miss or an expired "not found" entry
+        """
+        return self.get_many([postal_code]).get(normalise_postal_code(postal_code))
+
+    def get_many(self, postal_codes: Iterable) -> Dict[str, GeocodeRecord]:
+        """
+        Look up several postal codes with a single query
+        Returns:
+            Dict of normalised postal code to record, containing only fresh hits
+        """
+        keys = list(dict.fromkeys(normalise_postal_code(code) for code in postal_codes))
+        records = {}
+
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._pending:
+                    records[key] = self._pending[key]
+                else:
+                    missing.append(key)
+
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT postal_code, latitude, longitude, address, fetched_at "
+                    f"FROM geocode WHERE postal_code IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    records[row[0]] = GeocodeRecord(*row)
+
+        return {key: record for key, record in records.items() if self._is_fresh(record)}
+
+    def put(self, record: GeocodeRecord) -> None:
+        """Queue a record for writing; commits once the batch is full"""
+        with self._lock:
+            self._pending[record.postal_code] = record
+            if len(self._pending) >= self._batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Commit all pending records"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+            [
+                (r.postal_code, r.latitude, r.longitude, r.address, r.fetched_at)
+                for r in self._pending.values()
+            ]
+        )
+        self._conn.commit()
+        self._pending.clear()
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from helper.rate_limiter import PRIORITY_BULK, TokenBucketRateLimiter
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OneMapHttpClient:
+    """
+    Session based HTTP client for the OneMap API. Connections are pooled and
+    kept alive, every attempt draws a rate limiter token, 429/5xx responses and
+    connection errors are retried with jittered exponential backoff, and a 401
+    on an authorised call refreshes the token once before retrying.
+    """
+
+    def __init__(
+            self,
+            rate_limiter: TokenBucketRateLimiter,
+            token_provider: Optional[Callable[[bool], str]] = None,
+            timeout: tuple[float, float] = (5.0, 30.0),
+            max_retries: int = 4,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+            pool_size: int = 16,
+            gzip: bool = True):
+        """
+        Args:
+            rate_limiter: Limiter consulted before every attempt
+            token_provider: Callable returning the access token; called with True to force a refresh
+            timeout: (connect, read) timeout in seconds
+            max_retries: Retries after the first attempt
+            backoff_base: Delay in seconds before the first retry, doubled on each further retry
+            backoff_max: Upper bound for a single backoff delay
+            pool_size: Number of keep-alive connections to OneMap
+            gzip: Ask for gzip encoded responses
+        """
+        self._rate_limiter = rate_limiter
+        self._token_provider = token_provider
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._refresh_lock = threading.Lock()
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+
+    def get(self, url: str, priority: int = PRIORITY_BULK, auth: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a GET request
+        Args:
+            url: Request URL
+            priority: Rate limiter priority class
+            auth: Send the OneMap access token
+        Returns:
+            The successful response
+        Raises:
+            requests.exceptions.RequestException once all retries are exhausted
+        """
+        return self.request("GET", url, priority=priority, auth=auth, **kwargs)
+
+    def post(self, url: str, priority: int = PRIORITY_BULK, **kwargs) -> requests.Response:
+        """Send a POST request, see get()"""
+        return self.request("POST", url, priority=priority, **kwargs)
+
+    def request(self, method: str, url: str, priority: int = PRIORITY_BULK,
+                auth: bool = False, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self._timeout)
+        extra_headers = kwargs.pop("headers", None) or {}
+        token_refreshed = False
+        attempt = 0
+
+        while True:
+            headers = dict(extra_headers)
+            token = None
+            if auth and self._token_provider is not None:
+                token = self._token_provider(False)
+                headers["Authorization"] = token
+
+            self._rate_limiter.acquire(priority)
+            try:
+                response = self._session.request(method, url, headers=headers, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self._max_retries:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == 401 and token is not None and not token_refreshed:
+                self._refresh_token(token)
+                token_refreshed = True
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self._max_retries:
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _refresh_token(self, rejected_token: str) -> None:
+        """Refresh the token unless another thread already replaced the rejected one"""
+        with self._refresh_lock:
+            if self._token_provider(False) == rejected_token:
+                self._token_provider(True)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with equal jitter"""
+        delay = min(self._backoff_max, self._backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Parse a Retry-After header given either in seconds or as an HTTP date"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self._backoff_max)
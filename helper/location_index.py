@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+# Coordinates are quantised to 1e-6 degrees (about 0.1 m), so 1.3197280 and 1.319728 are the same place
+COORDINATE_SCALE = 10 ** 6
+_LONGITUDE_BITS = 31
+_OFFSET = 1 << 30
+
+
+def location_keys(latlongs) -> np.ndarray:
+    """
+    Pack quantised (latitude, longitude) pairs into one int64 key per location
+    Args:
+        latlongs: Array-like of shape (n, 2)
+    Returns:
+        int64 array of n keys
+    """
+    latlongs = np.asarray(latlongs, dtype=np.float64).reshape(-1, 2)
+    quantised = np.rint(latlongs * COORDINATE_SCALE).astype(np.int64) + _OFFSET
+    return (quantised[:, 0] << _LONGITUDE_BITS) | quantised[:, 1]
+
+
+class LocationIndex:
+    """
+    Hash index from quantised coordinates, and optionally postal codes, to
+    matrix store rows
+    """
+
+    def __init__(self, keys: np.ndarray, postal_codes: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            keys: Location key of each store row, see location_keys()
+            postal_codes: Optional postal code to store row mapping
+        """
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.postal_codes = dict(postal_codes or {})
+        self._rows = dict(zip(self.keys.tolist(), range(len(self.keys))))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, latlongs, postal_codes: Optional[Sequence[Optional[str]]] = None) -> "LocationIndex":
+        """
+        Build an index whose rows follow the order of latlongs
+        Args:
+            latlongs: Array-like of shape (n, 2)
+            postal_codes: Optional postal code per row (None where unknown)
+        """
+        postal_rows = {}
+        if postal_codes is not None:
+            postal_rows = {code: row for row, code in enumerate(postal_codes) if code}
+        return cls(location_keys(latlongs), postal_rows)
+
+    def lookup(self, latlongs) -> np.ndarray:
+        """
+        Find the store row of each location
+        Args:
+            latlongs: Array-like of shape (n, 2)
+        Returns:
+            int64 array of rows, -1 where the location is not in the store
+        """
+        rows = self._rows
+        return np.fromiter(
+            (rows.get(key, -1) for key in location_keys(latlongs).tolist()),
+            dtype=np.int64
+        )
+
+    def lookup_postal_codes(self, postal_codes: Iterable[str]) -> np.ndarray:
+        """
+        Find the store row of each postal code
+        Returns:
+            int64 array of rows, -1 where the postal code is not indexed
+        """
+        return np.fromiter(
+            (self.postal_codes.get(code, -1) for code in postal_codes),
+            dtype=np.int64
+        )
+
+    def save(self, keys_path: Path, postal_codes_path: Path) -> None:
+        np.save(keys_path, self.keys)
+        with open(postal_codes_path, 'w') as fp:
+            json.dump(self.postal_codes, fp)
+
+    @classmethod
+    def load(cls, keys_path: Path, postal_codes_path: Path) -> "LocationIndex":
+        postal_codes = {}
+        if Path(postal_codes_path).exists():
+            with open(postal_codes_path, 'r') as fp:
+                postal_codes = json.load(fp)
+        return cls(np.load(keys_path), postal_codes)
@@ -0,0 +1,266 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from helper.geo import haversine_pairs
+from helper.location_index import location_keys
+from helper.matrix_journal import MatrixJournal
+from helper.matrix_store import NO_ROUTE
+from helper.route_geometry_cache import RouteGeometryCache
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class RoutePairsFailed(Exception):
+    """Raised when route pairs of a matrix could not be fetched after all retries"""
+
+
+def print_progress(every: float = 0.05) -> ProgressCallback:
+    """
+    Build a progress callback that prints roughly every `every` fraction of the work
+    """
+    lock = threading.Lock()
+    state = {"next": 0.0}
+
+    def callback(done: int, total: int) -> None:
+        fraction = done / total if total else 1.0
+        with lock:
+            if fraction >= state["next"] or done == total:
+                print(f"Calculating matrices: {done}/{total} ({fraction:.0%})")
+                state["next"] = fraction + every
+
+    return callback
+
+
+def order_pairs(
+        locations: Sequence[tuple[float, float]],
+        pairs: Sequence[tuple[int, int]],
+        priority_indices: Iterable[int] = (0,)) -> List[tuple[int, int]]:
+    """
+    Order pairs so that rows of the priority indices (the depot) come first,
+    followed by the remaining pairs from nearest to farthest apart
+    """
+    if not pairs:
+        return []
+    coords = np.asarray(locations, dtype=np.float64)
+    pair_array = np.asarray(pairs, dtype=np.int64)
+    distances = haversine_pairs(coords[pair_array[:, 0]], coords[pair_array[:, 1]])
+    is_priority = np.isin(pair_array, list(priority_indices)).any(axis=1)
+    # lexsort sorts by the last key first: priority pairs, then distance
+    order = np.lexsort((distances, ~is_priority))
+    return [tuple(pair) for pair in pair_array[order].tolist()]
+
+
+class RouteMatrixBuilder:
+    """
+    Fills duration and distance matrices by querying route pairs concurrently.
+    Throughput is bounded by the shared OneMap rate limiter; the worker pool
+    only needs to be large enough to hide request latency.
+
+    With a journal, every completed pair is appended as it arrives and pairs
+    already in the journal are filled in without querying them again. With a
+    geometry cache, the route polyline of every pair is kept for map plotting.
+    Pairs that still fail after the HTTP client's retries are listed in
+    failed_pairs and never filled with a made-up value; they are queried again
+    by the next build. Pairs OneMap answers have no route are permanent: they
+    are listed in no_route_pairs and journaled as NO_ROUTE, so they are not.
+    """
+
+    def __init__(
+            self,
+            fetch_route: Callable[[tuple, tuple], dict],
+            max_workers: int = 8,
+            progress_callback: Optional[ProgressCallback] = None,
+            journal: Optional[MatrixJournal] = None,
+            geometry_cache: Optional[RouteGeometryCache] = None,
+            route_type: str = "drive"):
+        """
+        Args:
+            fetch_route: Callable returning the OneMap routing response for (start, end)
+            max_workers: Number of concurrent requests
+            progress_callback: Called with (completed, total) after every pair
+            journal: Optional journal used to checkpoint and resume the build
+            geometry_cache: Optional cache receiving the route geometry of every pair
+            route_type: OneMap route type of fetch_route, used as geometry cache key
+        """
+        self._fetch_route = fetch_route
+        self._max_workers = max_workers
+        self._progress_callback = progress_callback
+        self._journal = journal
+        self._geometry_cache = geometry_cache
+        self._route_type = route_type
+        self.failed_pairs: List[tuple[int, int]] = []
+        self.no_route_pairs: List[tuple[int, int]] = []
+        self.queried_pairs = 0
+
+    def fetch(
+            self,
+            locations: Sequence[tuple[float, float]],
+            pairs: Sequence[tuple[int, int]],
+            priority_indices: Iterable[int] = (0,),
+            no_route_value: float = np.nan,
+            query: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Query the given pairs
+        Args:
+            locations: List of (latitude, longitude) tuples indexed by the pairs
+            pairs: (start, end) index pairs to query
+            priority_indices: Indices whose pairs are queried first
+            no_route_value: Value returned for pairs OneMap has no route for (see no_route_pairs)
+            query: Query the pairs that are not in the journal; if False they are returned as failed
+        Returns:
+            Tuple of (durations, distances) float64 arrays aligned with pairs,
+            NaN where the pair failed (see failed_pairs)
+        """
+        pairs = [(int(i), int(j)) for i, j in pairs]
+        keys = location_keys(locations).tolist() if len(locations) else []
+        fetched = {}
+        remaining = self._resume_from_journal(pairs, keys, fetched)
+
+        ordered_pairs = order_pairs(locations, remaining, priority_indices) if query else []
+        total = len(ordered_pairs)
+        self.failed_pairs = [] if query else list(remaining)
+        self.queried_pairs = total
+        if total:
+            self._query(locations, ordered_pairs, keys, fetched)
+
+        values = np.array([fetched.get(pair, (np.nan, np.nan)) for pair in pairs], dtype=np.float64).reshape(-1, 2)
+        no_route = values[:, 0] == NO_ROUTE
+        self.no_route_pairs = [pair for pair, unroutable in zip(pairs, no_route.tolist()) if unroutable]
+        values[no_route] = no_route_value
+        return values[:, 0], values[:, 1]
+
+    def build(
+            self,
+            locations: Sequence[tuple[float, float]],
+            pairs: Optional[Sequence[tuple[int, int]]] = None,
+            duration_matrix: Optional[np.ndarray] = None,
+            distance_matrix: Optional[np.ndarray] = None,
+            priority_indices: Iterable[int] = (0,),
+            no_route_value: float = np.nan,
+            query: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Query the given pairs and write both directions of each into the matrices.
+        Failed pairs are listed in failed_pairs and their entries are left untouched.
+        Args:
+            locations: List of (latitude, longitude) tuples indexed by the pairs
+            pairs: (start, end) index pairs to query, defaults to the upper triangle
+            duration_matrix: Matrix to fill in place, if None a new matrix with a zero diagonal and NaN elsewhere
+            distance_matrix: Matrix to fill in place, if None a new matrix with a zero diagonal and NaN elsewhere
+            priority_indices: Indices whose pairs are queried first
+            no_route_value: Value written for pairs OneMap has no route for
+            query: Query the pairs that are not in the journal; if False they are left as failed
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        """
+        n = len(locations)
+        if pairs is None:
+            pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+        if duration_matrix is None:
+            duration_matrix = np.full((n, n), np.nan)
+            np.fill_diagonal(duration_matrix, 0)
+        if distance_matrix is None:
+            distance_matrix = np.full((n, n), np.nan)
+            np.fill_diagonal(distance_matrix, 0)
+
+        durations, distances = self.fetch(locations, pairs, priority_indices, no_route_value, query)
+        if len(pairs):
+            rows, cols = np.asarray(pairs, dtype=np.int64).reshape(-1, 2).T
+            ok = ~np.isnan(durations)
+            rows, cols = rows[ok], cols[ok]
+            # Matrix is symmetric
+            duration_matrix[rows, cols] = duration_matrix[cols, rows] = durations[ok]
+            distance_matrix[rows, cols] = distance_matrix[cols, rows] = distances[ok]
+        return duration_matrix, distance_matrix
+
+    def raise_on_failed_pairs(self) -> None:
+        """
+        Raise RoutePairsFailed if the last fetch or build left pairs unfetched
+        """
+        if self.failed_pairs:
+            raise RoutePairsFailed(
+                f"{len(self.failed_pairs)} route pairs could not be fetched, they are queried again on the next run"
+            )
+
+    def _query(
+            self,
+            locations: Sequence[tuple[float, float]],
+            ordered_pairs: List[tuple[int, int]],
+            keys: List[int],
+            fetched: Dict[tuple[int, int], tuple[float, float]]) -> None:
+        """Query pairs concurrently and collect the successful ones in fetched"""
+        total = len(ordered_pairs)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_route, locations[i], locations[j]): (i, j)
+                for i, j in ordered_pairs
+            }
+            try:
+                for future in as_completed(futures):
+                    i, j = futures[future]
+                    try:
+                        route_data = future.result()
+                    except Exception as e:
+                        print(f"Error fetching route data for points {i} to {j}: {e}")
+                        self.failed_pairs.append((i, j))
+                    else:
+                        if route_data['status'] == 0:  # Success
+                            duration = route_data['route_summary']['total_time']
+                            distance = route_data['route_summary']['total_distance']
+                            fetched[(i, j)] = (duration, distance)
+
+                            if self._journal is not None:
+                                self._journal.append(keys[i], keys[j], duration, distance)
+                            if self._geometry_cache is not None and route_data.get('route_geometry'):
+                                self._geometry_cache.put(
+                                    locations[i], locations[j], route_data['route_geometry'], self._route_type
+                                )
+                        else:
+                            # OneMap has no route between the points, querying again gives the same answer
+                            print(f"No route found for points {i} to {j}")
+                            fetched[(i, j)] = (NO_ROUTE, NO_ROUTE)
+                            if self._journal is not None:
+                                self._journal.append(keys[i], keys[j], NO_ROUTE, NO_ROUTE)
+
+                    done += 1
+                    if self._progress_callback is not None:
+                        self._progress_callback(done, total)
+            except BaseException:
+                # Ctrl-C or a fatal error: stop queued requests, completed pairs are already journaled
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                if self._journal is not None:
+                    self._journal.close()
+                if self._geometry_cache is not None:
+                    self._geometry_cache.flush()
+
+    def _resume_from_journal(
+            self,
+            pairs: Sequence[tuple[int, int]],
+            keys: List[int],
+            fetched: Dict[tuple[int, int], tuple[float, float]]) -> List[tuple[int, int]]:
+        """Collect journaled pairs in fetched and return the pairs that still need querying"""
+        if self._journal is None:
+            return list(pairs)
+        journaled = self._journal.load()
+        if not journaled:
+            return list(pairs)
+
+        remaining = []
+        for i, j in pairs:
+            values = journaled.get((keys[i], keys[j]))
+            if values is None:
+                values = journaled.get((keys[j], keys[i]))
+            if values is None:
+                remaining.append((i, j))
+                continue
+            fetched[(i, j)] = values
+
+        if len(remaining) < len(pairs):
+            print(f"Resuming from journal: {len(pairs) - len(remaining)} route pairs already fetched")
+        return remaining
@@ -0,0 +1,88 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+JOURNAL_RECORD = np.dtype([
+    ('start', '<i8'),
+    ('end', '<i8'),
+    ('duration', '<f8'),
+    ('distance', '<f8'),
+])
+
+
+class MatrixJournal:
+    """
+    Append-only journal of route pairs fetched while building a matrix.
+    Pairs are keyed by location key (see helper.location_index), so a restarted
+    build can resume even if the location order changed. Records have a fixed
+    size; a partially written last record from a crash is ignored.
+    """
+
+    def __init__(self, path: Path, sync_every: int = 50):
+        """
+        Args:
+            path: Journal file
+            sync_every: fsync the journal after this many appended records
+        """
+        self._path = Path(path)
+        self._sync_every = sync_every
+        self._unsynced = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> Dict[tuple[int, int], tuple[float, float]]:
+        """
+        Read all complete records
+        Returns:
+            Dict of (start_key, end_key) to (duration, distance)
+        """
+        if not self._path.exists():
+            return {}
+        with open(self._path, 'rb') as fp:
+            data = fp.read()
+        usable = len(data) - len(data) % JOURNAL_RECORD.itemsize
+        records = np.frombuffer(data[:usable], dtype=JOURNAL_RECORD)
+        return {
+            (start, end): (duration, distance)
+            for start, end, duration, distance in zip(
+                records['start'].tolist(), records['end'].tolist(),
+                records['duration'].tolist(), records['distance'].tolist()
+            )
+        }
+
+    def append(self, start_key: int, end_key: int, duration: float, distance: float) -> None:
+        """Append one completed pair"""
+        record = np.array([(start_key, end_key, duration, distance)], dtype=JOURNAL_RECORD).tobytes()
+        with self._lock:
+            if self._file is None:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self._path, 'ab')
+                # Drop a torn record left by a crash so new records stay aligned
+                size = self._file.tell()
+                if size % JOURNAL_RECORD.itemsize:
+                    self._file.truncate(size - size % JOURNAL_RECORD.itemsize)
+            self._file.write(record)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self._sync_every:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self._unsynced = 0
+
+    def clear(self) -> None:
+        """Remove the journal once its pairs have been merged into the matrix store"""
+        self.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
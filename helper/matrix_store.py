@@ -0,0 +1,348 @@
+import gzip
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from helper.location_index import LocationIndex, location_keys
+
+# Stored in place of a route pair that could not be fetched, so the next request queries it again
+MISSING = -1
+
+# Stored for a route pair OneMap has no route for; it is not queried again
+NO_ROUTE = -2
+
+
+def packed_index(rows: np.ndarray, cols: np.ndarray, size: int) -> np.ndarray:
+    """
+    Position of (row, col) in a row-major packed upper triangle (diagonal included)
+    of a symmetric size x size matrix
+    """
+    i = np.minimum(rows, cols).astype(np.int64)
+    j = np.maximum(rows, cols).astype(np.int64)
+    return i * size - (i * (i - 1)) // 2 + (j - i)
+
+
+class MatrixStore:
+    """
+    On-disk store of the duration and distance matrices as .npy files opened
+    with np.memmap, so opening is O(1) and extracting a submatrix only reads
+    the pages it touches.
+
+    Layout of the store directory:
+        meta.json               size, dtype, packing and current version
+        locations.<v>.npy       float64 (size, 2) latitude/longitude per row
+        duration.<v>.npy        int32 seconds, (size, size) or packed upper triangle
+        distance.<v>.npy        int32 metres, same layout as duration
+        location_keys.<v>.npy   quantised coordinate key per row, see LocationIndex
+        postal_codes.<v>.json   postal code to row mapping
+
+    Pairs that could not be fetched hold MISSING and pairs OneMap has no route
+    for hold NO_ROUTE in both matrices; neither is stored as a zero travel time.
+
+    A write produces a new version and swaps meta.json atomically; readers
+    holding the previous version keep a consistent view. Adding locations with
+    extend() streams the stored rows into the new version, so the stored
+    matrices are never loaded as a whole.
+    """
+
+    def __init__(
+            self,
+            directory: Path,
+            packed: bool = True,
+            dtype=np.int32,
+            legacy_pickle_path: Optional[Path] = None):
+        """
+        Args:
+            directory: Directory holding the store files
+            packed: Store only the upper triangle of the (symmetric) matrices
+            dtype: Integer dtype of stored seconds/metres
+            legacy_pickle_path: matrices_data.pkl.gz imported once if the store is empty
+        """
+        self._directory = Path(directory)
+        self._packed = packed
+        self._dtype = np.dtype(dtype)
+        self._legacy_pickle_path = Path(legacy_pickle_path) if legacy_pickle_path else None
+        self._meta = None
+        self._arrays = None
+        self._index = None
+
+    @property
+    def _meta_path(self) -> Path:
+        return self._directory/'meta.json'
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._meta_path, 'r') as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+
+    def _open(self) -> Optional[dict]:
+        """Memory-map the current version, re-opening only if another writer replaced it"""
+        meta = self._read_meta()
+        if meta is None and self._legacy_pickle_path is not None and self._legacy_pickle_path.exists():
+            self._import_legacy_pickle()
+            meta = self._read_meta()
+        if meta is None:
+            return None
+
+        if self._meta is None or meta['version'] != self._meta['version']:
+            version = meta['version']
+            self._arrays = {
+                name: np.load(self._directory/f'{name}.{version}.npy', mmap_mode='r')
+                for name in ('locations', 'duration', 'distance')
+            }
+            self._meta = meta
+            self._index = None
+        return self._meta
+
+    def _import_legacy_pickle(self) -> None:
+        """Convert the old gzipped pickle of nested lists into the store format"""
+        print(f"Converting {self._legacy_pickle_path} to matrix store...")
+        try:
+            with gzip.open(self._legacy_pickle_path, 'rb') as fp:
+                matrices_data = pickle.load(fp)
+        except EOFError:
+            return
+        self.write(
+            matrices_data['locations'],
+            np.asarray(matrices_data['duration_matrix']),
+            np.asarray(matrices_data['distance_matrix'])
+        )
+
+    def exists(self) -> bool:
+        return self._open() is not None
+
+    @property
+    def version(self) -> int:
+        """Version of the stored matrices, increases with every write"""
+        meta = self._open()
+        return meta['version'] if meta else 0
+
+    @property
+    def size(self) -> int:
+        meta = self._open()
+        return meta['size'] if meta else 0
+
+    @property
+    def locations(self) -> np.ndarray:
+        """Memory-mapped (size, 2) array of stored (latitude, longitude)"""
+        if self._open() is None:
+            return np.empty((0, 2))
+        return self._arrays['locations']
+
+    @property
+    def index(self) -> LocationIndex:
+        """Location index of the current version, loaded once per version"""
+        meta = self._open()
+        if meta is None:
+            return LocationIndex(np.empty(0, dtype=np.int64))
+        if self._index is None:
+            version = meta['version']
+            keys_path = self._directory/f'location_keys.{version}.npy'
+            if keys_path.exists():
+                self._index = LocationIndex.load(keys_path, self._directory/f'postal_codes.{version}.json')
+            else:
+                self._index = LocationIndex.build(self._arrays['locations'])
+        return self._index
+
+    def lookup(self, latlongs) -> np.ndarray:
+        """
+        Store row of each (latitude, longitude), -1 where it is not stored;
+        the result can be passed straight to submatrices()
+        """
+        return self.index.lookup(latlongs)
+
+    def submatrices(self, indices) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Extract the duration and distance matrices for the given store rows
+        Args:
+            indices: Store row of each requested location
+        Returns:
+            Tuple of (duration_matrix, distance_matrix) of shape (len(indices), len(indices))
+        """
+        meta = self._open()
+        if meta is None:
+            raise FileNotFoundError(f"No matrix store in {self._directory}")
+
+        indices = np.asarray(indices, dtype=np.int64)
+        if meta['packed']:
+            positions = packed_index(indices[:, None], indices[None, :], meta['size'])
+            return self._arrays['duration'][positions], self._arrays['distance'][positions]
+
+        rows_cols = np.ix_(indices, indices)
+        return self._arrays['duration'][rows_cols], self._arrays['distance'][rows_cols]
+
+    def pair_values(self, rows, cols) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Element-wise duration and distance of (rows[k], cols[k]) pairs
+        Returns:
+            Tuple of (durations, distances) with the shape of rows
+        """
+        meta = self._open()
+        if meta is None:
+            raise FileNotFoundError(f"No matrix store in {self._directory}")
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if meta['packed']:
+            positions = packed_index(rows, cols, meta['size'])
+            return self._arrays['duration'][positions], self._arrays['distance'][positions]
+        return self._arrays['duration'][rows, cols], self._arrays['distance'][rows, cols]
+
+    def full_matrices(self) -> tuple[np.ndarray, np.ndarray]:
+        """Load the complete duration and distance matrices"""
+        return self.submatrices(np.arange(self.size))
+
+    def write(self, locations, duration_matrix: np.ndarray, distance_matrix: np.ndarray,
+              postal_codes: Optional[Sequence[Optional[str]]] = None) -> None:
+        """
+        Replace the store content with a new version
+        Args:
+            locations: Sequence of (latitude, longitude) per matrix row
+            duration_matrix: Square matrix of seconds
+            distance_matrix: Square matrix of metres
+            postal_codes: Optional postal code per matrix row (None where unknown)
+        """
+        self._directory.mkdir(parents=True, exist_ok=True)
+        old_meta = self._read_meta()
+        version = old_meta['version'] + 1 if old_meta else 1
+        size = len(locations)
+
+        locations = np.asarray(locations, dtype=np.float64).reshape(size, 2)
+        np.save(self._directory/f'locations.{version}.npy', locations)
+        LocationIndex.build(locations, postal_codes).save(
+            self._directory/f'location_keys.{version}.npy',
+            self._directory/f'postal_codes.{version}.json'
+        )
+        for name, matrix in (('duration', duration_matrix), ('distance', distance_matrix)):
+            matrix = self._stored_values(matrix)
+            if self._packed:
+                matrix = np.concatenate([matrix[i, i:] for i in range(size)]) if size else matrix.ravel()
+            np.save(self._directory/f'{name}.{version}.npy', matrix)
+        self._commit(old_meta, version, size, self._packed)
+
+    def extend(self, new_locations, duration_rows: np.ndarray, distance_rows: np.ndarray,
+               postal_codes: Optional[Sequence[Optional[str]]] = None) -> None:
+        """
+        Append locations as a new version without loading the stored matrices:
+        stored rows are copied into the new files as they are, in the stored dtype,
+        and only the added rows and columns are written
+        Args:
+            new_locations: Sequence of (latitude, longitude) per added row
+            duration_rows: (added, size + added) seconds from every added location to every
+                stored and added location, NaN where the pair could not be fetched
+            distance_rows: Metres, same shape as duration_rows
+            postal_codes: Optional postal code per added row (None where unknown)
+        """
+        meta = self._open()
+        if meta is None:
+            self.write(new_locations, duration_rows, distance_rows, postal_codes)
+            return
+
+        old_size, added = meta['size'], len(new_locations)
+        version, size = meta['version'] + 1, meta['size'] + len(new_locations)
+        new_locations = np.asarray(new_locations, dtype=np.float64).reshape(added, 2)
+
+        np.save(self._directory/f'locations.{version}.npy',
+                np.concatenate([self._arrays['locations'], new_locations]))
+        index = self.index
+        postal_rows = dict(index.postal_codes)
+        for offset, code in enumerate(postal_codes or []):
+            if code:
+                postal_rows[code] = old_size + offset
+        LocationIndex(np.concatenate([index.keys, location_keys(new_locations)]), postal_rows).save(
+            self._directory/f'location_keys.{version}.npy',
+            self._directory/f'postal_codes.{version}.json'
+        )
+
+        for name, rows in (('duration', duration_rows), ('distance', distance_rows)):
+            stored = self._arrays[name]
+            rows = self._stored_values(rows, stored.dtype)
+            path = self._directory/f'{name}.{version}.npy'
+            if meta['packed']:
+                matrix = np.lib.format.open_memmap(path, mode='w+', dtype=stored.dtype, shape=(size * (size + 1) // 2,))
+                for i in range(size):
+                    start = int(packed_index(i, i, size))
+                    if i < old_size:
+                        # Stored part of row i, then its columns to the added locations
+                        old_start = int(packed_index(i, i, old_size))
+                        matrix[start:start + old_size - i] = stored[old_start:old_start + old_size - i]
+                        matrix[start + old_size - i:start + size - i] = rows[:, i]
+                    else:
+                        matrix[start:start + size - i] = rows[i - old_size, i:]
+            else:
+                matrix = np.lib.format.open_memmap(path, mode='w+', dtype=stored.dtype, shape=(size, size))
+                matrix[:old_size, :old_size] = stored
+                matrix[:old_size, old_size:] = rows[:, :old_size].T
+                matrix[old_size:] = rows
+            matrix.flush()
+            del matrix
+        self._commit(meta, version, size, meta['packed'])
+
+    def update_pairs(self, rows, cols, durations, distances) -> None:
+        """
+        Store new values of existing pairs (both directions) as a new version,
+        used to fill in pairs that were MISSING
+        Args:
+            rows: Store row of the start of each pair
+            cols: Store row of the end of each pair
+            durations: Seconds of each pair, NaN leaves the pair MISSING
+            distances: Metres of each pair
+        """
+        meta = self._open()
+        if meta is None:
+            raise FileNotFoundError(f"No matrix store in {self._directory}")
+
+        old_version, version, size = meta['version'], meta['version'] + 1, meta['size']
+        for file_name in ('locations.{}.npy', 'location_keys.{}.npy', 'postal_codes.{}.json'):
+            if (self._directory/file_name.format(old_version)).exists():
+                shutil.copyfile(self._directory/file_name.format(old_version), self._directory/file_name.format(version))
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        for name, values in (('duration', durations), ('distance', distances)):
+            path = self._directory/f'{name}.{version}.npy'
+            shutil.copyfile(self._directory/f'{name}.{old_version}.npy', path)
+            matrix = np.load(path, mmap_mode='r+')
+            values = self._stored_values(values, matrix.dtype)
+            if meta['packed']:
+                matrix[packed_index(rows, cols, size)] = values
+            else:
+                matrix[rows, cols] = matrix[cols, rows] = values
+            matrix.flush()
+            del matrix
+        self._commit(meta, version, size, meta['packed'])
+
+    def _stored_values(self, values, dtype=None) -> np.ndarray:
+        """Round to the stored integer dtype, NaN becomes MISSING"""
+        values = np.asarray(values)
+        if np.issubdtype(values.dtype, np.floating):
+            values = np.where(np.isnan(values), MISSING, np.rint(values))
+        return values.astype(dtype or self._dtype)
+
+    def _commit(self, old_meta: Optional[dict], version: int, size: int, packed: bool) -> None:
+        """Make the written version current and remove the files of the old one"""
+        meta = {'version': version, 'size': size, 'packed': packed, 'dtype': self._dtype.name}
+        tmp_meta_path = self._directory/'meta.json.tmp'
+        with open(tmp_meta_path, 'w') as fp:
+            json.dump(meta, fp)
+        os.replace(tmp_meta_path, self._meta_path)
+
+        if old_meta:
+            old_version = old_meta['version']
+            for file_name in ('locations', 'duration', 'distance', 'location_keys'):
+                self._remove(self._directory/f'{file_name}.{old_version}.npy')
+            self._remove(self._directory/f'postal_codes.{old_version}.json')
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,26 +1,36 @@
 from pathlib import Path
-import yaml
 import requests
-import json
 from datetime import datetime
-import gc
-import gzip
-import pickle
-from tqdm import tqdm
 import numpy as np
 import time
-import pandas as pd
 import os
-from dotenv import load_dotenv
-import folium
-import polyline
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Union
 import random
-
-load_dotenv()
+import threading
+from helper.geo import haversine_pairs, k_nearest, simplify_polyline
+from helper.location_index import location_keys
+from helper.travel_model import SparseMatrixStats, TravelModel
+from helper.matrix_journal import MatrixJournal
+from helper.matrix_store import MISSING, NO_ROUTE, MatrixStore
+from helper.matrix_builder import ProgressCallback, RouteMatrixBuilder, print_progress
+from helper.http_client import OneMapHttpClient
+from helper.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, get_rate_limiter
+from helper.geocode_cache import GeocodeCache, GeocodeRecord, normalise_postal_code
+from helper.route_geometry_cache import RouteGeometryCache
+
+# folium, polyline, yaml and dotenv are imported where they are used, so that
+# importing this module stays cheap for solve-only runs
+if TYPE_CHECKING:
+    import folium
 
 folder_path = Path("store")
 
+ROUTE_TYPE = "drive"
+
+# Refresh the access token this many seconds before OneMap's expiry_timestamp
+TOKEN_REFRESH_MARGIN = 3600
+
 ROUTE_COLORS = [
     '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEEAD',
     '#D4A5A5', '#9B59B6', '#3498DB', '#E74C3C', '#2ECC71',
@@ -44,47 +54,50 @@ def convert_second_to_time_with_s(x):
     return str(hours) + ":" + str(minutes) + ":" + str(seconds)
 
 
-def save_pickle_quick(file_to_save, file_saving_path):
-    gc.disable()
-    try:
-        gc.collect()
-        with gzip.open(file_saving_path, "wb") as fp:
-            pickle.dump(file_to_save, fp)
-    finally:
-        gc.enable()
-
 class OneMapQuery:
     def __init__(
-            self):
+            self,
+            capture_geometry: bool = True):
+        """
+        Args:
+            capture_geometry: Keep the route geometry of every pair fetched for a matrix,
+                so plotting a solution needs no further routing requests
+        """
         self.token = None
-        self.api_call_count = 0
-        self.api_call_start_time = time.time()
-
-    def _check_rate_limit(self):
-        # Check if 1 minute has passed since the start of the API call window
-        if time.time() - self.api_call_start_time >= 60:
-            self.api_call_count = 0
-            self.api_call_start_time = time.time()
-
-        # If the API call count exceeds the limit, wait until the minute is over
-        if self.api_call_count >= 150:
-            time_to_wait = 60 - (time.time() - self.api_call_start_time)
-            print(f"Rate limit reached. Waiting for {time_to_wait:.2f} seconds.")
-            time.sleep(time_to_wait)
-            self.api_call_count = 0
-            self.api_call_start_time = time.time()
-
-    def get_postal_latlong(
-            self, postal_code: str = None
-    ) -> tuple[float, float] | None:
+        self.token_expiry = 0.0
+        self._token_lock = threading.RLock()
+        self._refresh_timer = None
+        self.capture_geometry = capture_geometry
+        self.rate_limiter = get_rate_limiter()
+        self.http = OneMapHttpClient(self.rate_limiter, token_provider=self._get_token)
+        self.matrix_store = MatrixStore(
+            folder_path/'matrices',
+            legacy_pickle_path=folder_path/'matrices_data.pkl.gz'
+        )
+        self.matrix_journal = MatrixJournal(folder_path/'matrix_journal.bin')
+        # Pairs fetched by sparse and sub-problem matrices, which are not added to the matrix store
+        self.pair_cache = MatrixJournal(folder_path/'sparse_pairs.bin')
+        self.geometry_cache = RouteGeometryCache(folder_path/'route_geometry.sqlite')
+        self.geocode_cache = GeocodeCache(
+            folder_path/'geocode_cache.sqlite',
+            legacy_dict_path=folder_path/'postal_dict.yaml'
+        )
+
+    def search_postal(self, postal_code: str, require_address: bool = False) -> GeocodeRecord:
         """
-        Get latitude and longitude for a given postal code
-        Returns tuple of (latitude, longitude) or None if not found
+        Search OneMap for a postal code, consulting the geocode cache first
+        Args:
+            postal_code: The postal code to search
+            require_address: Search again if the cached record has no address
+        Returns:
+            GeocodeRecord holding coordinates and address (both None if not found)
+        Raises:
+            requests.exceptions.RequestException if the search request fails
         """
-        self._check_rate_limit()
-        self.api_call_count += 1
-        with open(folder_path/'postal_dict.yaml', 'r') as yaml_file:
-            postal_dict = yaml.load(yaml_file, Loader=yaml.Loader)
+        postal_code = normalise_postal_code(postal_code)
+        record = self.geocode_cache.get(postal_code)
+        if record is not None and not (require_address and record.found and record.address is None):
+            return record
 
         url = f'https://www.onemap.gov.sg/api/common/elastic/search?' \
               f'searchVal={postal_code}&' \
@@ -92,100 +105,238 @@ class OneMapQuery:
               f'getAddrDetails=Y' \
               f'&pageNum=1'
 
-        try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            content = resp.json()
-            
-            if content['found'] == 0:
-                print(f"This postal: '{postal_code}' lat long is not found from onemap")
-                return None
+        content = self.http.get(url, priority=PRIORITY_INTERACTIVE).json()
 
+        if content['found'] == 0:
+            record = GeocodeRecord(postal_code, None, None, None, time.time())
+        else:
             result = content['results'][0]
-            latlon = (float(result['LATITUDE']), float(result['LONGITUDE']))
-            postal_dict[postal_code] = latlon
-
-            with open(folder_path / 'postal_dict.yaml', 'w') as yaml_file:
-                yaml.dump(postal_dict, yaml_file)
+            record = GeocodeRecord(
+                postal_code,
+                float(result['LATITUDE']),
+                float(result['LONGITUDE']),
+                result['ADDRESS'],
+                time.time()
+            )
 
-            return latlon
+        self.geocode_cache.put(record)
+        return record
 
+    def get_postal_latlong(
+            self, postal_code: str = None
+    ) -> tuple[float, float] | None:
+        """
+        Get latitude and longitude for a given postal code
+        Returns tuple of (latitude, longitude) or None if not found
+        """
+        try:
+            record = self.search_postal(postal_code)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data from OneMap: {e}")
             return None
 
-    def get_onemap_token(self):
-        # Create store folder if it doesn't exist
-        folder_path.mkdir(exist_ok=True)
-        token_file = folder_path/'onemap_token.yaml'
+        if not record.found:
+            print(f"This postal: '{postal_code}' lat long is not found from onemap")
+            return None
 
-        try:
-            # Try to load existing token
-            if token_file.exists():
-                with open(token_file, 'r') as yaml_file:
-                    content = yaml.load(yaml_file, Loader=yaml.FullLoader)
-                    
-                # Check if token is still valid (less than 3 days old)
-                if content and (datetime.today() - datetime.fromtimestamp(int(content['expiry_timestamp']))).days < 3:
-                    self.token = content['access_token']
-                    return content['access_token']
-        except Exception as e:
-            print(f"Error reading token file: {e}")
-
-        # Request new token if file doesn't exist or token expired
-        url = 'https://www.onemap.gov.sg/api/auth/post/getToken'
-        payload = {
-            'email': os.getenv('ONEMAP_USERNAME'),
-            'password': os.getenv('ONEMAP_PASSWORD')
-        }
-        
-        try:
-            resp = requests.post(url, json=payload)
-            resp.raise_for_status()
-            
-            content = resp.json()
-            self.token = content['access_token']
-            
-            # Save new token
+        return record.latlong
+
+    def get_onemap_token(self, force_refresh: bool = False) -> str:
+        """
+        Get a valid OneMap access token. The token is held in memory with its real
+        expiry; the token file is only read when no token is held yet, and a
+        background timer refreshes the token shortly before it expires.
+        Args:
+            force_refresh: Request a new token even if the current one is still valid
+        Returns:
+            The access token
+        """
+        with self._token_lock:
+            if not force_refresh and self._token_is_fresh():
+                return self.token
+
+            import yaml
+            from dotenv import load_dotenv
+
+            token_file = folder_path/'onemap_token.yaml'
+            if not force_refresh and self.token is None:
+                try:
+                    # Try to load the token saved by an earlier run
+                    if token_file.exists():
+                        with open(token_file, 'r') as yaml_file:
+                            content = yaml.load(yaml_file, Loader=yaml.FullLoader)
+                        if content:
+                            self._set_token(content)
+                        if self._token_is_fresh():
+                            return self.token
+                except Exception as e:
+                    print(f"Error reading token file: {e}")
+
+            # Request new token if file doesn't exist or token expired
+            load_dotenv()
+            url = 'https://www.onemap.gov.sg/api/auth/post/getToken'
+            payload = {
+                'email': os.getenv('ONEMAP_USERNAME'),
+                'password': os.getenv('ONEMAP_PASSWORD')
+            }
+
+            try:
+                content = self.http.post(url, priority=PRIORITY_INTERACTIVE, json=payload).json()
+            except requests.exceptions.RequestException as e:
+                raise Exception(f'Failed to get token. Error: {str(e)}')
+            self._set_token(content)
+
+            # Save new token for the next run
+            folder_path.mkdir(exist_ok=True)
             with open(token_file, 'w') as yaml_file:
                 yaml.dump(content, yaml_file)
-                
+
             return self.token
-            
-        except requests.exceptions.RequestException as e:
-            raise Exception(f'Failed to get token. Error: {str(e)}')
+
+    def _set_token(self, content: dict) -> None:
+        """Hold a token response in memory and schedule its refresh"""
+        self.token = content['access_token']
+        try:
+            self.token_expiry = float(content['expiry_timestamp'])
+        except (KeyError, TypeError, ValueError):
+            # Unknown expiry: treat the token as expired so it is replaced on next use
+            self.token_expiry = 0.0
+
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+        if self._token_is_fresh():
+            delay = self.token_expiry - TOKEN_REFRESH_MARGIN - time.time()
+            self._refresh_timer = threading.Timer(delay, self._refresh_token_in_background)
+            self._refresh_timer.daemon = True
+            self._refresh_timer.start()
+
+    def _token_is_fresh(self) -> bool:
+        return self.token is not None and self.token_expiry - time.time() > TOKEN_REFRESH_MARGIN
+
+    def _refresh_token_in_background(self) -> None:
+        try:
+            self.get_onemap_token(force_refresh=True)
+        except Exception as e:
+            # The next authorised call requests a token on demand
+            print(f"Background token refresh failed: {e}")
+
+    def _get_token(self, force_refresh: bool = False) -> str:
+        """Token provider for the HTTP client"""
+        return self.get_onemap_token(force_refresh=force_refresh)
+
+    def get_route(self, start_latlong: tuple, end_latlong: tuple, priority: int = PRIORITY_BULK) -> dict:
+        """
+        Query the OneMap driving route between two points
+        Args:
+            start_latlong: Tuple of (latitude, longitude) for start point
+            end_latlong: Tuple of (latitude, longitude) for end point
+            priority: Rate limiter priority class
+        Returns:
+            The routing response, with 'status', 'route_summary' and 'route_geometry'
+        Raises:
+            requests.exceptions.RequestException once all retries are exhausted
+        """
+        start_coord = f"{start_latlong[0]},{start_latlong[1]}"
+        end_coord = f"{end_latlong[0]},{end_latlong[1]}"
+
+        url = f"https://www.onemap.gov.sg/api/public/routingsvc/route?" \
+              f"start={start_coord}&end={end_coord}&routeType={ROUTE_TYPE}"
+
+        return self.http.get(url, priority=priority, auth=True).json()
+
+    def get_route_geometry(self, start_latlong: tuple, end_latlong: tuple,
+                           priority: int = PRIORITY_INTERACTIVE) -> str | None:
+        """
+        Get the encoded route polyline between two points, from the geometry cache if possible
+        Args:
+            start_latlong: Tuple of (latitude, longitude) for start point
+            end_latlong: Tuple of (latitude, longitude) for end point
+            priority: Rate limiter priority class used on a cache miss
+        Returns:
+            The encoded polyline, or None if OneMap found no route
+        Raises:
+            requests.exceptions.RequestException once all retries are exhausted
+        """
+        geometry = self.geometry_cache.get(start_latlong, end_latlong, ROUTE_TYPE)
+        if geometry is not None:
+            return geometry
+
+        route_data = self.get_route(start_latlong, end_latlong, priority=priority)
+        if route_data['status'] != 0:
+            return None
+
+        geometry = route_data['route_geometry']
+        self.geometry_cache.put(start_latlong, end_latlong, geometry, ROUTE_TYPE)
+        return geometry
+
+    def get_route_geometries(
+        self,
+        legs: Iterable[tuple[tuple, tuple]],
+        max_workers: int = 8,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> tuple[Dict[tuple[tuple, tuple], str], Dict[tuple[tuple, tuple], str]]:
+        """
+        Get the encoded polylines of many legs. Cached legs are read in one pass,
+        the rest are fetched concurrently under the OneMap rate limit.
+        Args:
+            legs: Iterable of (start_latlong, end_latlong)
+            max_workers: Maximum number of concurrent routing requests
+            priority: Rate limiter priority class
+        Returns:
+            Tuple of (geometries, errors), both keyed by (start_latlong, end_latlong)
+        """
+        import polyline
+
+        legs = list(dict.fromkeys((tuple(start), tuple(end)) for start, end in legs))
+        geometries = self.geometry_cache.get_many(legs, ROUTE_TYPE)
+        errors = {}
+
+        # Matrices are built from one direction of each pair, draw the other direction reversed
+        reversed_legs = [(end, start) for start, end in legs if (start, end) not in geometries]
+        for (end, start), geometry in self.geometry_cache.get_many(reversed_legs, ROUTE_TYPE).items():
+            geometries[(start, end)] = polyline.encode(polyline.decode(geometry)[::-1])
+
+        misses = [leg for leg in legs if leg not in geometries]
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+                futures = {
+                    executor.submit(self.get_route_geometry, start, end, priority): (start, end)
+                    for start, end in misses
+                }
+                for future in as_completed(futures):
+                    leg = futures[future]
+                    try:
+                        geometry = future.result()
+                    except requests.exceptions.RequestException as e:
+                        errors[leg] = str(e)
+                        continue
+                    if geometry is None:
+                        errors[leg] = "no route found"
+                    else:
+                        geometries[leg] = geometry
+            self.geometry_cache.flush()
+
+        return geometries, errors
 
     def get_address_by_postal(self, postal_code: str = None) -> str | None:
         """
         Get full address string for a given postal code
         Returns address string or None if not found
         """
-        self._check_rate_limit()
-        self.api_call_count += 1
-        url = f'https://www.onemap.gov.sg/api/common/elastic/search?' \
-              f'searchVal={postal_code}&' \
-              f'returnGeom=Y&' \
-              f'getAddrDetails=Y' \
-              f'&pageNum=1'
-
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            content = resp.json()
-            
-            if content['found'] == 0:
-                print(f"No address found for postal code: '{postal_code}'")
-                return None
-
-            result = content['results'][0]
-            address = result['ADDRESS']
-            return address
-
+            record = self.search_postal(postal_code, require_address=True)
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data from OneMap: {e}")
             return None
 
-    def plot_routes(self, start_latlong: tuple, end_latlong: tuple, map_obj: folium.Map, 
+        if not record.found:
+            print(f"No address found for postal code: '{postal_code}'")
+            return None
+
+        return record.address
+
+    def plot_routes(self, start_latlong: tuple, end_latlong: tuple, map_obj: "folium.Map", 
                     color_index: Union[int, None] = None, sequence: tuple[int, int] = None) -> None:
         """
         Plot a route between two points on a Folium map
@@ -196,9 +347,35 @@ class OneMapQuery:
             color_index: Optional index for color selection (1-based index)
             sequence: Tuple of (start_sequence, end_sequence) numbers
         """
-        # Ensure we have a valid token
-        if not self.token:
-            self.get_onemap_token()
+        try:
+            geometry = self.get_route_geometry(start_latlong, end_latlong)
+            
+            if geometry is not None:  # Success
+                self.draw_route(start_latlong, end_latlong, geometry, map_obj, color_index, sequence)
+            else:
+                print("Failed to get route data")
+                
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching route data: {e}")
+
+    def draw_route(self, start_latlong: tuple, end_latlong: tuple, geometry: str, map_obj: "folium.Map",
+                   color_index: Union[int, None] = None, sequence: tuple[int, int] = None,
+                   tolerance_m: float = 0.0, lines: Optional[list] = None) -> None:
+        """
+        Draw an already fetched route between two points on a Folium map
+        Args:
+            start_latlong: Tuple of (latitude, longitude) for start point
+            end_latlong: Tuple of (latitude, longitude) for end point
+            geometry: Encoded route polyline
+            map_obj: Folium map object to plot the route on
+            color_index: Optional index for color selection (1-based index)
+            sequence: Tuple of (start_sequence, end_sequence) numbers
+            tolerance_m: Douglas-Peucker tolerance of the route line in meters, 0 keeps all points
+            lines: Decoded lines to draw instead of the whole geometry, e.g. the part of the leg
+                left by helper.route_map.deduplicate_segments
+        """
+        import folium
+        import polyline
 
         # Color selection logic
         if color_index is not None:
@@ -206,288 +383,451 @@ class OneMapQuery:
         else:
             color = random.choice(ROUTE_COLORS)
 
-        # Format the coordinates for the URL
-        start_coord = f"{start_latlong[0]},{start_latlong[1]}"
-        end_coord = f"{end_latlong[0]},{end_latlong[1]}"
+        # Decode and simplify the route geometry and add to map
+        if lines is None:
+            lines = [polyline.decode(geometry)]
+        for line in lines:
+            route_coords = simplify_polyline(line, tolerance_m).tolist()
+            folium.PolyLine(locations=route_coords, color=color, weight=2).add_to(map_obj)
         
-        url = f"https://www.onemap.gov.sg/api/public/routingsvc/route?" \
-              f"start={start_coord}&end={end_coord}&routeType=drive"
+        # Add markers for start and end points with sequence numbers
+        start_seq = f"Stop {sequence[0]}" if sequence else "Start"
+        end_seq = f"Stop {sequence[1]}" if sequence else "End"
         
-        headers = {"Authorization": self.token}
+        folium.CircleMarker(
+            location=start_latlong,
+            popup=start_seq,
+            tooltip=start_seq,  # Add tooltip for hover effect
+            color=color,
+            fill=True,
+            fillColor=color,
+            radius=8
+        ).add_to(map_obj)
         
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            route_data = response.json()
-            
-            if route_data['status'] == 0:  # Success
-                # Decode the route geometry and add to map
-                geometry = route_data['route_geometry']
-                route_coords = polyline.decode(geometry)
-                folium.PolyLine(locations=route_coords, color=color, weight=2).add_to(map_obj)
-                
-                # Add markers for start and end points with sequence numbers
-                start_seq = f"Stop {sequence[0]}" if sequence else "Start"
-                end_seq = f"Stop {sequence[1]}" if sequence else "End"
-                
-                folium.CircleMarker(
-                    location=start_latlong,
-                    popup=start_seq,
-                    tooltip=start_seq,  # Add tooltip for hover effect
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    radius=8
-                ).add_to(map_obj)
-                
-                # Add a text label for the sequence number
-                if sequence:
-                    folium.map.Marker(
-                        start_latlong,
-                        icon=folium.DivIcon(
-                            html=f'<div style="font-size: 12pt; color: {color}; text-align: center;">{sequence[0]}</div>'
-                        )
-                    ).add_to(map_obj)
-                
-                folium.CircleMarker(
-                    location=end_latlong,
-                    popup=end_seq,
-                    tooltip=end_seq,  # Add tooltip for hover effect
-                    color=color,
-                    fill=True,
-                    fillColor=color,
-                    radius=8
-                ).add_to(map_obj)
-                
-                # Add a text label for the sequence number
-                if sequence:
-                    folium.map.Marker(
-                        end_latlong,
-                        icon=folium.DivIcon(
-                            html=f'<div style="font-size: 12pt; color: {color}; text-align: center;">{sequence[1]}</div>'
-                        )
-                    ).add_to(map_obj)
-                
-            else:
-                print("Failed to get route data")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching route data: {e}")
+        # Add a text label for the sequence number
+        if sequence:
+            folium.map.Marker(
+                start_latlong,
+                icon=folium.DivIcon(
+                    html=f'<div style="font-size: 12pt; color: {color}; text-align: center;">{sequence[0]}</div>'
+                )
+            ).add_to(map_obj)
+        
+        folium.CircleMarker(
+            location=end_latlong,
+            popup=end_seq,
+            tooltip=end_seq,  # Add tooltip for hover effect
+            color=color,
+            fill=True,
+            fillColor=color,
+            radius=8
+        ).add_to(map_obj)
+        
+        # Add a text label for the sequence number
+        if sequence:
+            folium.map.Marker(
+                end_latlong,
+                icon=folium.DivIcon(
+                    html=f'<div style="font-size: 12pt; color: {color}; text-align: center;">{sequence[1]}</div>'
+                )
+            ).add_to(map_obj)
 
-    def save_matrices(self, locations: list[tuple[float, float]], duration_matrix: np.ndarray, distance_matrix: np.ndarray):
+    def save_matrices(self, locations: list[tuple[float, float]], duration_matrix: np.ndarray, distance_matrix: np.ndarray,
+                      postal_codes: Optional[list[Optional[str]]] = None):
         """
         Save duration and distance matrices along with their corresponding locations
+        (and optionally postal codes) for the location index
         """
-        matrices_data = {
-            'locations': locations,
-            'duration_matrix': duration_matrix.tolist(),
-            'distance_matrix': distance_matrix.tolist()
-        }
-        
-        save_pickle_quick(matrices_data, folder_path/'matrices_data.pkl.gz')
+        self.matrix_store.write(locations, duration_matrix, distance_matrix, postal_codes)
 
     def load_matrices(self) -> tuple[list[tuple[float, float]], np.ndarray, np.ndarray] | None:
         """
         Load existing matrices and their corresponding locations
         Returns:
-            Tuple of (locations, duration_matrix, distance_matrix) or None if file doesn't exist
+            Tuple of (locations, duration_matrix, distance_matrix) or None if no store exists
         """
-        try:
-            with gzip.open(folder_path/'matrices_data.pkl.gz', 'rb') as fp:
-                matrices_data = pickle.load(fp)
-                return (
-                    matrices_data['locations'],
-                    np.array(matrices_data['duration_matrix']),
-                    np.array(matrices_data['distance_matrix'])
-                )
-        except (FileNotFoundError, EOFError):
+        if not self.matrix_store.exists():
             return None
+        duration_matrix, distance_matrix = self.matrix_store.full_matrices()
+        return (
+            [tuple(loc) for loc in self.matrix_store.locations.tolist()],
+            duration_matrix,
+            distance_matrix
+        )
+
+    def _matrix_builder(self, progress_callback: Optional[ProgressCallback] = None) -> RouteMatrixBuilder:
+        return RouteMatrixBuilder(
+            self.get_route,
+            progress_callback=progress_callback if progress_callback is not None else print_progress(),
+            journal=self.matrix_journal,
+            geometry_cache=self.geometry_cache if self.capture_geometry else None,
+            route_type=ROUTE_TYPE
+        )
 
     def expand_matrices(
         self,
-        new_locations: list[tuple[float, float]]
-    ) -> tuple[np.ndarray, np.ndarray]:
+        new_locations: list[tuple[float, float]],
+        progress_callback: Optional[ProgressCallback] = None,
+        postal_codes: Optional[list[Optional[str]]] = None
+    ) -> int:
         """
-        Load existing matrices and expand them with new locations
+        Add new locations to the matrix store. Only the pairs of the new locations are
+        queried, and the store is extended without loading the stored matrices.
         Args:
-            new_locations: List of new (latitude, longitude) tuples to add
+            new_locations: List of (latitude, longitude) tuples, stored ones are skipped
+            progress_callback: Called with (completed, total) as route pairs finish
+            postal_codes: Optional postal code of each new location, added to the location index
         Returns:
-            Updated (duration_matrix, distance_matrix)
+            Number of locations added to the store
+        Raises:
+            RoutePairsFailed if some pairs could not be fetched; they are stored as MISSING
+            and queried again on the next request. Pairs OneMap has no route for are
+            stored as NO_ROUTE and not queried again
         """
-        # Load existing matrices
-        existing_data = self.load_matrices()
-        
-        if existing_data is None:
+        if not self.matrix_store.exists():
             # If no existing matrices, create new ones from scratch
-            return self.get_route_matrices(new_locations)
+            self.get_route_matrices(new_locations, progress_callback, postal_codes)
+            return self.matrix_store.size
         
-        existing_locations, duration_matrix, distance_matrix = existing_data
-        
-        # Find truly new locations (not already in matrix)
-        new_locations_set = set(new_locations)
-        existing_locations_set = set(existing_locations)
-        locations_to_add = list(new_locations_set - existing_locations_set)
+        # Find truly new locations (not already in matrix), once per quantised coordinate
+        rows = self.matrix_store.lookup(new_locations)
+        keys = location_keys(new_locations)
+        missing_positions = np.flatnonzero(rows < 0)
+        _, first_positions = np.unique(keys[missing_positions], return_index=True)
+        add_positions = missing_positions[np.sort(first_positions)].tolist()
+        locations_to_add = [tuple(new_locations[p]) for p in add_positions]
         
         if not locations_to_add:
-            return duration_matrix, distance_matrix
+            return 0
         
         # Calculate size of expanded matrices
-        old_size = len(existing_locations)
-        new_size = old_size + len(locations_to_add)
-        
-        # Create expanded matrices
-        new_duration_matrix = np.zeros((new_size, new_size))
-        new_distance_matrix = np.zeros((new_size, new_size))
+        old_size = self.matrix_store.size
+        added = len(locations_to_add)
+        new_size = old_size + added
+        all_locations = [tuple(loc) for loc in self.matrix_store.locations.tolist()] + locations_to_add
         
-        # Copy existing matrices to new matrices
-        new_duration_matrix[:old_size, :old_size] = duration_matrix
-        new_distance_matrix[:old_size, :old_size] = distance_matrix
+        # The first requested location (the depot) is queried first
+        added_rows = {keys[p]: old_size + i for i, p in enumerate(add_positions)}
+        depot_row = int(rows[0]) if rows[0] >= 0 else added_rows[keys[0]]
         
         # Calculate new routes for new locations
-        print(f"Calculating routes for {len(locations_to_add)} new locations...")
+        print(f"Calculating routes for {added} new locations...")
         
-        # First, calculate routes between new locations and existing locations
-        with tqdm(total=len(locations_to_add) * old_size) as pbar:
-            for i, new_loc in enumerate(locations_to_add):
-                for j, existing_loc in enumerate(existing_locations):
-                    self._check_rate_limit()
-                    self.api_call_count += 1
-                    
-                    # Calculate route from new location to existing location
-                    start_coord = f"{new_loc[0]},{new_loc[1]}"
-                    end_coord = f"{existing_loc[0]},{existing_loc[1]}"
-                    
-                    url = f"https://www.onemap.gov.sg/api/public/routingsvc/route?" \
-                          f"start={start_coord}&end={end_coord}&routeType=drive"
-                    
-                    try:
-                        response = requests.get(url, headers={"Authorization": self.token})
-                        response.raise_for_status()
-                        route_data = response.json()
-                        
-                        if route_data['status'] == 0:  # Success
-                            # Add values to both directions (matrix is symmetric)
-                            new_duration_matrix[old_size + i, j] = route_data['route_summary']['total_time']
-                            new_duration_matrix[j, old_size + i] = new_duration_matrix[old_size + i, j]
-                            
-                            new_distance_matrix[old_size + i, j] = route_data['route_summary']['total_distance']
-                            new_distance_matrix[j, old_size + i] = new_distance_matrix[old_size + i, j]
-                    except Exception as e:
-                        print(f"Error calculating route: {e}")
-                    
-                    pbar.update(1)
-                    time.sleep(0.5)  # Add delay to avoid hitting rate limits
+        # Routes from new locations to existing locations, then between new locations
+        pair_array = np.concatenate([
+            np.column_stack((np.repeat(np.arange(old_size, new_size), old_size), np.tile(np.arange(old_size), added))),
+            np.column_stack(np.triu_indices(added, k=1)) + old_size
+        ]).astype(np.int64)
+        builder = self._matrix_builder(progress_callback)
+        durations, distances = builder.fetch(
+            all_locations,
+            [tuple(pair) for pair in pair_array.tolist()],
+            priority_indices=(depot_row,),
+            no_route_value=NO_ROUTE
+        )
         
-        # Calculate routes between new locations
-        with tqdm(total=(len(locations_to_add) * (len(locations_to_add) - 1)) // 2) as pbar:
-            for i in range(len(locations_to_add)):
-                for j in range(i + 1, len(locations_to_add)):
-                    self._check_rate_limit()
-                    self.api_call_count += 1
-                    
-                    start_coord = f"{locations_to_add[i][0]},{locations_to_add[i][1]}"
-                    end_coord = f"{locations_to_add[j][0]},{locations_to_add[j][1]}"
-                    
-                    url = f"https://www.onemap.gov.sg/api/public/routingsvc/route?" \
-                          f"start={start_coord}&end={end_coord}&routeType=drive"
-                    
-                    try:
-                        response = requests.get(url, headers={"Authorization": self.token})
-                        response.raise_for_status()
-                        route_data = response.json()
-                        
-                        if route_data['status'] == 0:  # Success
-                            # Add values to both directions (matrix is symmetric)
-                            new_duration_matrix[old_size + i, old_size + j] = route_data['route_summary']['total_time']
-                            new_duration_matrix[old_size + j, old_size + i] = new_duration_matrix[old_size + i, old_size + j]
-                            
-                            new_distance_matrix[old_size + i, old_size + j] = route_data['route_summary']['total_distance']
-                            new_distance_matrix[old_size + j, old_size + i] = new_distance_matrix[old_size + i, old_size + j]
-                    except Exception as e:
-                        print(f"Error calculating route: {e}")
-                    
-                    pbar.update(1)
-                    time.sleep(0.5)  # Add delay to avoid hitting rate limits
+        # Rows of the new locations, pairs that could not be fetched stay NaN and are stored as MISSING
+        duration_rows = np.full((added, new_size), np.nan)
+        distance_rows = np.full((added, new_size), np.nan)
+        duration_rows[np.arange(added), np.arange(old_size, new_size)] = 0
+        distance_rows[np.arange(added), np.arange(old_size, new_size)] = 0
+        starts, ends = pair_array.T
+        duration_rows[starts - old_size, ends] = durations
+        distance_rows[starts - old_size, ends] = distances
+        between_new = ends >= old_size
+        duration_rows[ends[between_new] - old_size, starts[between_new]] = durations[between_new]
+        distance_rows[ends[between_new] - old_size, starts[between_new]] = distances[between_new]
         
-        # Save expanded matrices
-        all_locations = existing_locations + locations_to_add
-        self.save_matrices(all_locations, new_duration_matrix, new_distance_matrix)
+        # Extend the store, the journaled pairs are now part of it
+        self.matrix_store.extend(
+            locations_to_add,
+            duration_rows,
+            distance_rows,
+            [postal_codes[p] for p in add_positions] if postal_codes is not None else None
+        )
+        self.matrix_journal.clear()
+        builder.raise_on_failed_pairs()
         
-        return new_duration_matrix, new_distance_matrix
+        return added
 
-    def get_route_matrices(self, locations: list[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
+    def get_route_matrices(
+        self,
+        locations: list[tuple[float, float]],
+        progress_callback: Optional[ProgressCallback] = None,
+        postal_codes: Optional[list[Optional[str]]] = None,
+        query_missing: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
         """
-        Get duration and distance matrices for a list of locations, using cached data when possible
+        Get duration and distance matrices for a list of locations, using cached data when possible.
+        Missing route pairs are queried concurrently, the first location's (depot) pairs first.
+        Pairs OneMap has no route for are estimated with the travel model.
+        Args:
+            locations: List of (latitude, longitude) tuples
+            progress_callback: Called with (completed, total) as route pairs finish
+            postal_codes: Optional postal code of each location, recorded in the location index
+            query_missing: Query the stored pairs an earlier run could not fetch; if False
+                they are estimated with the travel model
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        Raises:
+            RoutePairsFailed if some pairs could not be fetched; they are stored as MISSING
+            and queried again on the next request
         """
-        # Ensure we have a valid token before starting
-        if not self.token:
-            self.get_onemap_token()
-
-        # Try to load existing matrices and expand if needed
-        existing_data = self.load_matrices()
-        
-        if existing_data is not None:
-            existing_locations, duration_matrix, distance_matrix = existing_data
-            existing_locations_set = set(existing_locations)
-            new_locations_set = set(locations)
+        # Use the existing matrix store, expanding it first if needed
+        if self.matrix_store.exists():
+            location_indices = self.matrix_store.lookup(locations)
             
             # If we have new locations, expand the matrices
-            if not new_locations_set.issubset(existing_locations_set):
-                return self.expand_matrices(locations)
+            if (location_indices < 0).any():
+                self.expand_matrices(locations, progress_callback, postal_codes)
+                location_indices = self.matrix_store.lookup(locations)
             
-            # If all locations exist in current matrices, create view matrices
-            location_indices = [existing_locations.index(loc) for loc in locations]
-            return (
-                duration_matrix[np.ix_(location_indices, location_indices)],
-                distance_matrix[np.ix_(location_indices, location_indices)]
-            )
+            # Extract the submatrices of the requested locations, querying pairs an earlier run missed
+            duration_matrix, distance_matrix = self.matrix_store.submatrices(location_indices)
+            if query_missing and (duration_matrix == MISSING).any():
+                self._fill_missing_pairs(locations, location_indices, duration_matrix, progress_callback)
+                duration_matrix, distance_matrix = self.matrix_store.submatrices(location_indices)
+            return self._estimate_unrouted(locations, duration_matrix, distance_matrix, duration_matrix < 0)
         
-        # If no existing matrices, calculate from scratch
-        n = len(locations)
-        duration_matrix = np.zeros((n, n))
-        distance_matrix = np.zeros((n, n))
-        
-        # Create progress bar for total number of calculations
-        total_calculations = (n * n - n) // 2  # Only need to calculate upper triangle
-        with tqdm(total=total_calculations, desc="Calculating matrices") as pbar:
-            for i in range(n):
-                for j in range(i + 1, n):  # Only calculate upper triangle
-                    self._check_rate_limit()
-                    self.api_call_count += 1
-                    
-                    start_coord = f"{locations[i][0]},{locations[i][1]}"
-                    end_coord = f"{locations[j][0]},{locations[j][1]}"
-                    
-                    url = f"https://www.onemap.gov.sg/api/public/routingsvc/route?" \
-                          f"start={start_coord}&end={end_coord}&routeType=drive"
-                    
-                    try:
-                        response = requests.get(url, headers={"Authorization": self.token})
-                        response.raise_for_status()
-                        route_data = response.json()
-                        
-                        if route_data['status'] == 0:  # Success
-                            duration_matrix[i, j] = route_data['route_summary']['total_time']
-                            duration_matrix[j, i] = duration_matrix[i, j]  # Matrix is symmetric
-                            
-                            distance_matrix[i, j] = route_data['route_summary']['total_distance']
-                            distance_matrix[j, i] = distance_matrix[i, j]  # Matrix is symmetric
-                        else:
-                            print(f"Failed to get route data for points {i} to {j}")
-                            
-                    except requests.exceptions.RequestException as e:
-                        print(f"Error fetching route data for points {i} to {j}: {e}")
-                    
-                    pbar.update(1)
-                    time.sleep(0.5)  # Add delay to avoid hitting rate limits
+        # If no existing matrices, calculate from scratch (upper triangle only, matrix is symmetric)
+        builder = self._matrix_builder(progress_callback)
+        duration_matrix, distance_matrix = builder.build(locations, no_route_value=NO_ROUTE)
         
-        # Save matrices
-        self.save_matrices(locations, duration_matrix, distance_matrix)
+        # Save matrices, the journaled pairs are now part of the store
+        self.save_matrices(locations, duration_matrix, distance_matrix, postal_codes)
+        self.matrix_journal.clear()
+        builder.raise_on_failed_pairs()
         
-        return duration_matrix, distance_matrix
+        # Same integer seconds and meters as matrices read back from the store
+        duration_matrix, distance_matrix = self.matrix_store.submatrices(self.matrix_store.lookup(locations))
+        return self._estimate_unrouted(locations, duration_matrix, distance_matrix, duration_matrix < 0)
+
+    def _fill_missing_pairs(
+        self,
+        locations: list[tuple[float, float]],
+        location_indices: np.ndarray,
+        duration_matrix: np.ndarray,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> None:
+        """
+        Query the pairs of the requested locations that are MISSING from the store and store them
+        Args:
+            locations: Requested (latitude, longitude) tuples
+            location_indices: Store row of each requested location
+            duration_matrix: Stored durations of the requested locations
+            progress_callback: Called with (completed, total) as route pairs finish
+        """
+        missing = np.argwhere(np.triu(duration_matrix == MISSING, k=1))
+        # Query each stored pair once, even if several requested locations share a row
+        _, first_positions = np.unique(np.sort(location_indices[missing], axis=1), axis=0, return_index=True)
+        missing = missing[np.sort(first_positions)]
+        print(f"Querying {len(missing)} route pairs missing from the matrix store...")
+
+        builder = self._matrix_builder(progress_callback)
+        durations, distances = builder.fetch(
+            locations, [tuple(pair) for pair in missing.tolist()], no_route_value=NO_ROUTE)
+        self.matrix_store.update_pairs(
+            location_indices[missing[:, 0]], location_indices[missing[:, 1]], durations, distances)
+        self.matrix_journal.clear()
+        builder.raise_on_failed_pairs()
+
+    def get_local_route_matrices(
+        self,
+        locations: list[tuple[float, float]],
+        progress_callback: Optional[ProgressCallback] = None,
+        query_missing: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get duration and distance matrices of a sub-problem without adding its locations
+        to the matrix store. Pairs are taken from the store where both ends are stored, the
+        rest are routed through the pair cache, so only pairs among these locations are queried.
+        Pairs OneMap has no route for are estimated with the travel model.
+        Args:
+            locations: List of (latitude, longitude) tuples, the first one (depot) is queried first
+            progress_callback: Called with (completed, total) as route pairs finish
+            query_missing: Query the pairs that are neither stored nor cached; if False
+                they are estimated with the travel model
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        Raises:
+            RoutePairsFailed if some pairs could not be fetched; the fetched ones stay in
+            the pair cache and only the failed ones are queried on the next request
+        """
+        n = len(locations)
+        latlongs = np.asarray(locations, dtype=np.float64).reshape(n, 2)
+        pair_array = np.column_stack(np.triu_indices(n, k=1)).astype(np.int64)
+
+        duration_matrix = np.full((n, n), np.nan)
+        distance_matrix = np.full((n, n), np.nan)
+        np.fill_diagonal(duration_matrix, 0)
+        np.fill_diagonal(distance_matrix, 0)
+
+        stored = self._take_stored_pairs(latlongs, pair_array, duration_matrix, distance_matrix)
+        builder = self._pair_cache_builder(progress_callback)
+        builder.build(
+            locations,
+            [tuple(pair) for pair in pair_array[~stored].tolist()],
+            duration_matrix,
+            distance_matrix,
+            query=query_missing
+        )
+        if query_missing:
+            builder.raise_on_failed_pairs()
+        return self._estimate_unrouted(locations, duration_matrix, distance_matrix, np.isnan(duration_matrix))
+
+    def _estimate_unrouted(
+        self,
+        locations: list[tuple[float, float]],
+        duration_matrix: np.ndarray,
+        distance_matrix: np.ndarray,
+        unrouted: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Fill the pairs without a OneMap route with the travel model calibrated on the matrix store
+        Args:
+            locations: List of (latitude, longitude) tuples
+            duration_matrix: Duration matrix of the locations
+            distance_matrix: Distance matrix of the locations
+            unrouted: Boolean mask of the entries to estimate
+        Returns:
+            Tuple of int32 (duration_matrix, distance_matrix)
+        """
+        if unrouted.any():
+            print(f"Estimating {int(np.triu(unrouted, k=1).sum())} route pairs without a OneMap route")
+            model, _ = TravelModel.fit(self.matrix_store)
+            estimated_durations, estimated_distances = model.estimate_matrices(locations)
+            duration_matrix = np.where(unrouted, estimated_durations, duration_matrix)
+            distance_matrix = np.where(unrouted, estimated_distances, distance_matrix)
+        return np.rint(duration_matrix).astype(np.int32), np.rint(distance_matrix).astype(np.int32)
+
+    def _take_stored_pairs(
+        self,
+        latlongs: np.ndarray,
+        pair_array: np.ndarray,
+        duration_matrix: np.ndarray,
+        distance_matrix: np.ndarray
+    ) -> np.ndarray:
+        """
+        Fill in the pairs whose both ends are in the matrix store, without expanding it
+        Returns:
+            Boolean mask of the pairs taken from the store
+        """
+        n = len(latlongs)
+        rows = self.matrix_store.lookup(latlongs) if self.matrix_store.exists() else np.full(n, -1)
+        stored = (rows[pair_array[:, 0]] >= 0) & (rows[pair_array[:, 1]] >= 0)
+        if stored.any():
+            i, j = pair_array[stored].T
+            durations, distances = self.matrix_store.pair_values(rows[i], rows[j])
+            # Pairs MISSING from the store are routed by the caller, NO_ROUTE pairs stay NaN
+            stored[np.flatnonzero(stored)[durations == MISSING]] = False
+            routed = durations >= 0
+            i, j = i[routed], j[routed]
+            duration_matrix[i, j] = duration_matrix[j, i] = durations[routed]
+            distance_matrix[i, j] = distance_matrix[j, i] = distances[routed]
+        return stored
+
+    def _pair_cache_builder(self, progress_callback: Optional[ProgressCallback] = None) -> RouteMatrixBuilder:
+        """Builder journaling to the pair cache, which keeps pairs that are not in the matrix store"""
+        return RouteMatrixBuilder(
+            self.get_route,
+            progress_callback=progress_callback if progress_callback is not None else print_progress(),
+            journal=self.pair_cache,
+            geometry_cache=self.geometry_cache if self.capture_geometry else None,
+            route_type=ROUTE_TYPE
+        )
+
+    def get_sparse_route_matrices(
+        self,
+        locations: list[tuple[float, float]],
+        k: int = 10,
+        depot_index: int = 0,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> tuple[np.ndarray, np.ndarray, SparseMatrixStats]:
+        """
+        Get duration and distance matrices routing only each location's k nearest
+        neighbours and the depot pairs; all other entries are estimated with a travel
+        model calibrated on the routed pairs. OneMap calls grow with n * k instead of n^2.
+        Args:
+            locations: List of (latitude, longitude) tuples
+            k: Number of nearest neighbours routed per location
+            depot_index: Index of the depot, whose pairs are always routed
+            progress_callback: Called with (completed, total) as route pairs finish
+        Returns:
+            Tuple of (duration_matrix, distance_matrix, stats)
+        """
+        n = len(locations)
+        latlongs = np.asarray(locations, dtype=np.float64).reshape(n, 2)
+
+        # Pairs to route: k nearest neighbours of every location and every depot pair
+        neighbours = k_nearest(latlongs, k)
+        starts = np.concatenate([np.repeat(np.arange(n), neighbours.shape[1]), np.full(n, depot_index)])
+        ends = np.concatenate([neighbours.ravel(), np.arange(n)])
+        pair_array = np.unique(np.sort(np.column_stack((starts, ends)), axis=1), axis=0)
+        pair_array = pair_array[pair_array[:, 0] != pair_array[:, 1]]
+
+        duration_matrix = np.full((n, n), np.nan)
+        distance_matrix = np.full((n, n), np.nan)
+        np.fill_diagonal(duration_matrix, 0)
+        np.fill_diagonal(distance_matrix, 0)
+
+        # Take pairs already in the matrix store, route the rest reusing pairs fetched by earlier runs
+        stored = self._take_stored_pairs(latlongs, pair_array, duration_matrix, distance_matrix)
+        builder = self._pair_cache_builder(progress_callback)
+        builder.build(
+            locations,
+            [tuple(pair) for pair in pair_array[~stored].tolist()],
+            duration_matrix,
+            distance_matrix,
+            priority_indices=(depot_index,)
+        )
+
+        # Calibrate the estimate on this instance's routed pairs, in random order for the holdout
+        real = ~np.isnan(duration_matrix)
+        i, j = np.nonzero(np.triu(real, k=1))
+        order = np.random.default_rng(0).permutation(len(i))
+        i, j = i[order], j[order]
+        model, error_stats = TravelModel.fit_pairs(
+            haversine_pairs(latlongs[i], latlongs[j]), duration_matrix[i, j], distance_matrix[i, j]
+        )
+        if error_stats is None:
+            model, error_stats = TravelModel.fit(self.matrix_store)
+
+        estimated_durations, estimated_distances = model.estimate_matrices(latlongs)
+        duration_matrix = np.where(real, duration_matrix, estimated_durations)
+        distance_matrix = np.where(real, distance_matrix, estimated_distances)
+
+        stats = SparseMatrixStats(
+            real_pairs=len(i),
+            estimated_pairs=n * (n - 1) // 2 - len(i),
+            api_calls=builder.queried_pairs,
+            error_stats=error_stats
+        )
+        return (
+            np.rint(duration_matrix).astype(np.int32),
+            np.rint(distance_matrix).astype(np.int32),
+            stats
+        )
+
+
+_shared_query: Optional[OneMapQuery] = None
+_shared_query_lock = threading.Lock()
+
+
+def get_onemap_query() -> OneMapQuery:
+    """
+    Get the OneMap client shared by the whole process, so the token, caches and
+    matrix store are loaded once
+    """
+    global _shared_query
+    with _shared_query_lock:
+        if _shared_query is None:
+            _shared_query = OneMapQuery()
+        return _shared_query
 
 
 if __name__ == "__main__":
+    import folium
+
     om = OneMapQuery()
     om.get_onemap_token()
     om.get_postal_latlong(338729)
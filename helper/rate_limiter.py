@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl, fall back to per-process limiting
+    fcntl = None
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BULK: "bulk",
+}
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a token could not be acquired within the requested timeout"""
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket shared by every thread of the process and, through a locked
+    state file, by every process on the host using the same state_path.
+
+    Lower priority classes keep a reserve of tokens untouched and step aside
+    while higher priority callers in the same process are waiting, so
+    interactive geocoding is not starved by a bulk matrix fill.
+    """
+
+    def __init__(
+            self,
+            calls_per_minute: int = 150,
+            burst: int = 10,
+            state_path: Optional[Path] = None,
+            reserve: Optional[Dict[int, float]] = None):
+        """
+        Args:
+            calls_per_minute: Hard budget for any 60 second window
+            burst: Bucket capacity; the refill rate is lowered so that burst
+                plus one minute of refill never exceeds calls_per_minute
+            state_path: File shared between processes, None for in-process only
+            reserve: Tokens each priority class must leave in the bucket
+        """
+        self.capacity = float(burst)
+        self.rate = (calls_per_minute - burst) / 60.0
+        self.reserve = reserve if reserve is not None else {
+            PRIORITY_INTERACTIVE: 0.0,
+            PRIORITY_BULK: 2.0,
+        }
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = time.time()
+        self._waiting = {priority: 0 for priority in self.reserve}
+        self._metrics = {
+            priority: {"acquired": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in self.reserve
+        }
+
+        self._state_fd = None
+        if state_path is not None and fcntl is not None:
+            Path(state_path).parent.mkdir(parents=True, exist_ok=True)
+            self._state_fd = os.open(state_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def acquire(self, priority: int = PRIORITY_BULK, timeout: Optional[float] = None) -> float:
+        """
+        Block until a token is available for the given priority class
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BULK
+            timeout: Maximum seconds to wait, None to wait indefinitely
+        Returns:
+            Seconds spent waiting
+        Raises:
+            RateLimitTimeout if no token became available within timeout
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._waiting[priority] += 1
+
+        try:
+            while True:
+                wait = self._try_consume(priority)
+                if wait <= 0:
+                    break
+                waited = time.monotonic() - started
+                if timeout is not None and waited + wait > timeout:
+                    raise RateLimitTimeout(
+                        f"No OneMap rate limit token within {timeout:.2f} seconds"
+                    )
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting[priority] -= 1
+
+        waited = time.monotonic() - started
+        with self._lock:
+            stats = self._metrics[priority]
+            stats["acquired"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+        return waited
+
+    def _try_consume(self, priority: int) -> float:
+        """Take one token if allowed; otherwise return the seconds to wait before retrying"""
+        with self._lock:
+            if any(count > 0 for p, count in self._waiting.items() if p < priority):
+                return 1.0 / self.rate
+
+            if self._state_fd is not None:
+                fcntl.flock(self._state_fd, fcntl.LOCK_EX)
+            try:
+                self._load_state()
+                now = time.time()
+                elapsed = max(now - self._updated_at, 0.0)
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated_at = now
+
+                needed = min(1.0 + self.reserve[priority], self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= 1.0
+                    wait = 0.0
+                else:
+                    wait = (needed - self._tokens) / self.rate
+                self._save_state()
+                return wait
+            finally:
+                if self._state_fd is not None:
+                    fcntl.flock(self._state_fd, fcntl.LOCK_UN)
+
+    def _load_state(self) -> None:
+        if self._state_fd is None:
+            return
+        os.lseek(self._state_fd, 0, os.SEEK_SET)
+        content = os.read(self._state_fd, 64).decode().split()
+        if len(content) == 2:
+            self._tokens, self._updated_at = float(content[0]), float(content[1])
+
+    def _save_state(self) -> None:
+        if self._state_fd is None:
+            return
+        os.lseek(self._state_fd, 0, os.SEEK_SET)
+        os.ftruncate(self._state_fd, 0)
+        os.write(self._state_fd, f"{self._tokens:.6f} {self._updated_at:.6f}".encode())
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns:
+            Per priority class: tokens acquired, total and maximum wait in seconds
+        """
+        with self._lock:
+            return {
+                PRIORITY_NAMES.get(priority, str(priority)): dict(stats)
+                for priority, stats in self._metrics.items()
+            }
+
+
+_shared_limiter: Optional[TokenBucketRateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucketRateLimiter:
+    """
+    Get the limiter shared by all OneMap calls of this host
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = TokenBucketRateLimiter(state_path=Path("store")/'.onemap_rate_limit')
+        return _shared_limiter
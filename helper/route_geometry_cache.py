@@ -0,0 +1,123 @@
+import atexit
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from helper.location_index import location_keys
+
+
+class RouteGeometryCache:
+    """
+    SQLite backed cache of OneMap route geometries (encoded polylines) keyed by
+    the quantised start and end coordinates and the route type. Geometries are
+    stored zlib compressed; writes are buffered like the geocode cache.
+    """
+
+    def __init__(self, db_path: Path, batch_size: int = 50):
+        """
+        Args:
+            db_path: Path of the SQLite database file
+            batch_size: Number of pending geometries that triggers a commit
+        """
+        self._db_path = Path(db_path)
+        self._batch_size = batch_size
+        self._pending: Dict[tuple[int, int, str], bytes] = {}
+        self._lock = threading.Lock()
+
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS route_geometry ("
+            "start_key INTEGER NOT NULL, "
+            "end_key INTEGER NOT NULL, "
+            "route_type TEXT NOT NULL, "
+            "geometry BLOB NOT NULL, "
+            "fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (start_key, end_key, route_type)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _key(start_latlong: tuple, end_latlong: tuple, route_type: str) -> tuple[int, int, str]:
+        start_key, end_key = location_keys([start_latlong, end_latlong]).tolist()
+        return start_key, end_key, route_type
+
+    def get(self, start_latlong: tuple, end_latlong: tuple, route_type: str = "drive") -> Optional[str]:
+        """
+        Look up the geometry of one leg
+        Returns:
+            The encoded polyline, or None on a miss
+        """
+        return self.get_many([(start_latlong, end_latlong)], route_type).get(
+            (tuple(start_latlong), tuple(end_latlong))
+        )
+
+    def get_many(
+            self,
+            legs: Iterable[tuple[tuple, tuple]],
+            route_type: str = "drive") -> Dict[tuple[tuple, tuple], str]:
+        """
+        Look up several legs with as few queries as possible
+        Args:
+            legs: Iterable of (start_latlong, end_latlong)
+            route_type: OneMap route type
+        Returns:
+            Dict of (start_latlong, end_latlong) to encoded polyline, containing only hits
+        """
+        legs = list(dict.fromkeys((tuple(start), tuple(end)) for start, end in legs))
+        keys = {self._key(start, end, route_type): (start, end) for start, end in legs}
+        found: Dict[tuple[int, int, str], bytes] = {}
+
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._pending:
+                    found[key] = self._pending[key]
+                else:
+                    missing.append(key)
+
+            # Two bound parameters per leg, stay well below SQLite's limit
+            for start in range(0, len(missing), 250):
+                chunk = missing[start:start + 250]
+                placeholders = ",".join(["(?, ?)"] * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT start_key, end_key, geometry FROM route_geometry "
+                    f"WHERE route_type = ? AND (start_key, end_key) IN (VALUES {placeholders})",
+                    [route_type] + [value for key in chunk for value in key[:2]]
+                ).fetchall()
+                for start_key, end_key, geometry in rows:
+                    found[(start_key, end_key, route_type)] = geometry
+
+        return {keys[key]: zlib.decompress(geometry).decode('utf-8') for key, geometry in found.items()}
+
+    def put(self, start_latlong: tuple, end_latlong: tuple, geometry: str, route_type: str = "drive") -> None:
+        """Queue a geometry for writing; commits once the batch is full"""
+        key = self._key(start_latlong, end_latlong, route_type)
+        with self._lock:
+            self._pending[key] = zlib.compress(geometry.encode('utf-8'))
+            if len(self._pending) >= self._batch_size:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        """Commit all pending geometries"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO route_geometry VALUES (?, ?, ?, ?, ?)",
+            [
+                (start_key, end_key, route_type, geometry, now)
+                for (start_key, end_key, route_type), geometry in self._pending.items()
+            ]
+        )
+        self._conn.commit()
+        self._pending.clear()
@@ -0,0 +1,169 @@
+from typing import List, Optional, Sequence
+
+import folium
+import numpy as np
+from folium.plugins import FastMarkerCluster
+
+from helper.geo import simplify_polyline
+from helper.location_index import location_keys
+
+SINGAPORE_CENTER = [1.352083, 103.819839]
+
+# Builds each clustered stop marker in the browser from its [lat, lon, label] row
+_CLUSTER_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 6});
+    marker.bindTooltip(row[2]);
+    return marker;
+}
+"""
+
+
+def vehicle_feature_collection(
+        vehicle_index: int,
+        stops: Sequence[tuple[float, float]],
+        legs: Sequence[Optional[Sequence[tuple[float, float]]]],
+        include_stops: bool = True) -> dict:
+    """
+    Build the GeoJSON FeatureCollection of one vehicle: one MultiLineString
+    for all legs and one Point per distinct stop
+    Args:
+        vehicle_index: 1-based vehicle number, used in the labels
+        stops: (latitude, longitude) of every stop in visiting order
+        legs: Decoded (latitude, longitude) points of each leg, None for legs without geometry
+        include_stops: Whether to add the stop points
+    Returns:
+        GeoJSON FeatureCollection dict
+    """
+    lines = [[[lon, lat] for lat, lon in leg] for leg in legs if leg is not None and len(leg)]
+    features = []
+    if lines:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "MultiLineString", "coordinates": lines},
+            "properties": {"label": f"Vehicle {vehicle_index}"},
+        })
+
+    if include_stops:
+        for (lat, lon), sequences in _distinct_stops(stops).items():
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"label": f"Vehicle {vehicle_index}, stop {', '.join(sequences)}"},
+            })
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def _distinct_stops(stops: Sequence[tuple[float, float]]) -> dict:
+    """Group stop sequence numbers by location, so a revisited depot is drawn once"""
+    distinct = {}
+    for sequence, latlong in enumerate(stops):
+        distinct.setdefault(tuple(latlong), []).append(str(sequence))
+    return distinct
+
+
+def deduplicate_segments(
+        legs: Sequence[Optional[Sequence[tuple[float, float]]]]) -> List[List[list]]:
+    """
+    Draw every road segment once. Segments are compared by their quantised end
+    points in either direction, so this runs on the decoded legs before they are
+    simplified. Legs are taken in drawing order: a segment driven again, by the
+    same vehicle (out and back to the depot) or a later one, is dropped and the
+    road keeps the colour of the first leg that drives it.
+    Args:
+        legs: Decoded (latitude, longitude) points of each leg in drawing order, None for legs without geometry
+    Returns:
+        Per leg, the lines left to draw, each a list of points
+    """
+    drawn = set()
+    result: List[List[list]] = []
+    for leg in legs:
+        lines: List[list] = []
+        if leg is not None and len(leg):
+            points = np.asarray(leg, dtype=np.float64).reshape(-1, 2)
+            keys = location_keys(points).tolist()
+            # Consecutive new segments are joined into one line
+            current = None
+            for index, (a, b) in enumerate(zip(keys[:-1], keys[1:])):
+                if a == b:
+                    if current is not None:
+                        current.append(tuple(points[index + 1]))
+                    continue
+                key = (a, b) if a < b else (b, a)
+                if key in drawn:
+                    current = None
+                    continue
+                drawn.add(key)
+                if current is None:
+                    current = [tuple(points[index])]
+                    lines.append(current)
+                current.append(tuple(points[index + 1]))
+        result.append(lines)
+    return result
+
+
+def render_geojson_map(
+        vehicles: Sequence[tuple[Sequence[tuple[float, float]], Sequence[Optional[Sequence[tuple[float, float]]]]]],
+        output_file: str,
+        colors: Sequence[str],
+        cluster_stops: bool = False,
+        hidden_layers: bool = False,
+        tolerance_m: float = 0.0,
+        deduplicate: bool = True) -> None:
+    """
+    Render routes as one GeoJSON layer per vehicle and save to an HTML file.
+    The output grows with the number of stops and route points instead of
+    one folium object per marker and label.
+    Args:
+        vehicles: Per vehicle, a tuple of (stops, legs) as for vehicle_feature_collection
+        output_file: Path to the output HTML file
+        colors: Route colors, cycled over the vehicles
+        cluster_stops: Draw stops with client-side marker clustering
+        hidden_layers: Start with the vehicle layers switched off in the layer control. The
+            browser only draws the vehicles switched on, but every layer is still embedded in the file
+        tolerance_m: Douglas-Peucker tolerance in meters applied to every leg, 0 keeps all points
+        deduplicate: Draw road segments shared by several legs once, in the first vehicle's colour
+    """
+    map_obj = folium.Map(location=SINGAPORE_CENTER, zoom_start=12, tiles="cartodbpositron")
+
+    all_legs = [leg for _, legs in vehicles for leg in legs]
+    if deduplicate:
+        leg_lines = deduplicate_segments(all_legs)
+    else:
+        leg_lines = [[leg] if leg else [] for leg in all_legs]
+
+    # Simplify after deduplication, which needs the unsimplified points to match shared roads
+    vehicle_lines = []
+    first_leg = 0
+    for _, legs in vehicles:
+        vehicle_lines.append([
+            simplify_polyline(line, tolerance_m)
+            for lines in leg_lines[first_leg:first_leg + len(legs)] for line in lines
+        ])
+        first_leg += len(legs)
+
+    for vehicle_index, ((stops, _), lines) in enumerate(zip(vehicles, vehicle_lines), start=1):
+        color = colors[(vehicle_index - 1) % len(colors)]
+        layer = folium.FeatureGroup(name=f"Vehicle {vehicle_index}", show=not hidden_layers)
+
+        collection = vehicle_feature_collection(vehicle_index, stops, lines, include_stops=not cluster_stops)
+        if collection["features"]:
+            folium.GeoJson(
+                collection,
+                style_function=lambda feature, color=color: {"color": color, "weight": 2},
+                marker=folium.CircleMarker(radius=6, color=color, fill=True, fill_color=color, fill_opacity=0.9),
+                tooltip=folium.GeoJsonTooltip(fields=["label"], labels=False),
+            ).add_to(layer)
+
+        if cluster_stops and len(stops):
+            FastMarkerCluster(
+                [[lat, lon, f"Vehicle {vehicle_index}, stop {', '.join(sequences)}"]
+                 for (lat, lon), sequences in _distinct_stops(stops).items()],
+                callback=_CLUSTER_MARKER_CALLBACK,
+            ).add_to(layer)
+
+        layer.add_to(map_obj)
+
+    folium.LayerControl(collapsed=len(vehicles) > 10).add_to(map_obj)
+    map_obj.save(output_file)
@@ -0,0 +1,174 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from helper.geo import haversine_matrix, haversine_pairs
+from helper.matrix_store import MatrixStore
+
+
+@dataclass(frozen=True)
+class TravelModelErrorStats:
+    """
+    Error of the estimates against held-out cached OneMap pairs
+    """
+    samples: int
+    duration_mae: float
+    duration_mape: float
+    distance_mae: float
+    distance_mape: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.samples} held-out pairs: "
+            f"duration MAE {self.duration_mae:.0f}s ({self.duration_mape:.1%}), "
+            f"distance MAE {self.distance_mae:.0f}m ({self.distance_mape:.1%})"
+        )
+
+
+@dataclass(frozen=True)
+class SparseMatrixStats:
+    """
+    Composition of a sparse matrix: routed pairs versus estimated pairs
+    """
+    real_pairs: int
+    estimated_pairs: int
+    api_calls: int
+    error_stats: Optional[TravelModelErrorStats]
+
+    def __str__(self) -> str:
+        total = self.real_pairs + self.estimated_pairs
+        real_share = self.real_pairs / total if total else 1.0
+        text = (
+            f"{self.real_pairs} routed pairs ({real_share:.1%}), "
+            f"{self.estimated_pairs} estimated pairs, {self.api_calls} OneMap calls"
+        )
+        if self.error_stats is not None:
+            text += f"; estimate error on {self.error_stats}"
+        return text
+
+
+@dataclass(frozen=True)
+class TravelModel:
+    """
+    Linear detour and speed model on top of great-circle distance:
+        road_distance = detour_factor * great_circle + distance_offset
+        duration = seconds_per_metre * road_distance + base_seconds
+    """
+    detour_factor: float = 1.35
+    distance_offset: float = 0.0
+    seconds_per_metre: float = 0.12  # about 30 km/h door to door
+    base_seconds: float = 60.0
+
+    @classmethod
+    def fit(
+            cls,
+            store: MatrixStore,
+            max_samples: int = 200_000,
+            holdout: float = 0.2,
+            seed: int = 0) -> tuple["TravelModel", Optional[TravelModelErrorStats]]:
+        """
+        Fit the model to a random sample of the pairs in the matrix store
+        Args:
+            store: Matrix store holding the OneMap ground truth
+            max_samples: Maximum number of pairs sampled from the store
+            holdout: Fraction of the sample kept aside for the error statistics
+            seed: Seed of the pair sampling
+        Returns:
+            Tuple of (model, error_stats); the default model and None if the store has too few pairs
+        """
+        size = store.size
+        if size < 3:
+            return cls(), None
+
+        rng = np.random.default_rng(seed)
+        if size * (size - 1) // 2 <= max_samples:
+            # Small store: use every pair once so train and holdout stay disjoint
+            rows, cols = np.triu_indices(size, k=1)
+            order = rng.permutation(len(rows))
+            rows, cols = rows[order], cols[order]
+        else:
+            rows = rng.integers(0, size, max_samples)
+            cols = rng.integers(0, size, max_samples)
+            keep = rows != cols
+            rows, cols = rows[keep], cols[keep]
+
+        durations, distances = store.pair_values(rows, cols)
+        locations = np.asarray(store.locations)
+        great_circle = haversine_pairs(locations[rows], locations[cols])
+        return cls.fit_pairs(great_circle, durations, distances, holdout)
+
+    @classmethod
+    def fit_pairs(
+            cls,
+            great_circle: np.ndarray,
+            durations: np.ndarray,
+            distances: np.ndarray,
+            holdout: float = 0.2) -> tuple["TravelModel", Optional[TravelModelErrorStats]]:
+        """
+        Fit the model to known pairs, given in random order
+        Args:
+            great_circle: Great-circle distance of each pair in meters
+            durations: OneMap duration of each pair in seconds
+            distances: OneMap road distance of each pair in meters
+            holdout: Fraction of the pairs kept aside for the error statistics
+        Returns:
+            Tuple of (model, error_stats); the default model and None if there are too few pairs
+        """
+        great_circle = np.asarray(great_circle, dtype=np.float64)
+        durations = np.asarray(durations, dtype=np.float64)
+        distances = np.asarray(distances, dtype=np.float64)
+
+        # Zero entries are failed or coincident pairs and carry no information
+        valid = (durations > 0) & (distances > 0) & (great_circle > 0)
+        durations = durations[valid]
+        distances = distances[valid]
+        great_circle = great_circle[valid]
+        if len(great_circle) < 20:
+            return cls(), None
+
+        n_test = max(int(len(great_circle) * holdout), 1)
+        train, test = slice(n_test, None), slice(0, n_test)
+
+        ones = np.ones_like(great_circle[train])
+        (detour_factor, distance_offset), *_ = np.linalg.lstsq(
+            np.column_stack((great_circle[train], ones)), distances[train], rcond=None
+        )
+        (seconds_per_metre, base_seconds), *_ = np.linalg.lstsq(
+            np.column_stack((distances[train], ones)), durations[train], rcond=None
+        )
+        model = cls(
+            float(detour_factor), float(distance_offset),
+            float(seconds_per_metre), float(base_seconds)
+        )
+
+        predicted_durations, predicted_distances = model.predict(great_circle[test])
+        stats = TravelModelErrorStats(
+            samples=n_test,
+            duration_mae=float(np.mean(np.abs(predicted_durations - durations[test]))),
+            duration_mape=float(np.mean(np.abs(predicted_durations - durations[test]) / durations[test])),
+            distance_mae=float(np.mean(np.abs(predicted_distances - distances[test]))),
+            distance_mape=float(np.mean(np.abs(predicted_distances - distances[test]) / distances[test])),
+        )
+        return model, stats
+
+    def predict(self, great_circle: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate (duration, road distance) from great-circle distances in meters
+        """
+        distances = np.maximum(self.detour_factor * great_circle + self.distance_offset, great_circle)
+        durations = np.maximum(self.seconds_per_metre * distances + self.base_seconds, 0.0)
+        return durations, distances
+
+    def estimate_matrices(self, latlongs) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate the full duration and distance matrices with one broadcast
+        Args:
+            latlongs: Array-like of shape (n, 2)
+        Returns:
+            Tuple of int32 (duration_matrix, distance_matrix), zero on the diagonal
+        """
+        durations, distances = self.predict(haversine_matrix(latlongs))
+        np.fill_diagonal(durations, 0)
+        np.fill_diagonal(distances, 0)
+        return np.rint(durations).astype(np.int32), np.rint(distances).astype(np.int32)
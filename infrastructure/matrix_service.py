@@ -1,16 +1,79 @@
-from typing import List, Tuple
+from typing import List, Literal, Optional, Tuple
 import numpy as np
 from domain.travelling_salesman.entities.location import Location
+from helper.matrix_builder import RoutePairsFailed
 from infrastructure.onemap_service import OneMapService
 
+MatrixMode = Literal["onemap", "estimated", "sparse"]
+
+
+def as_vroom_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Get a C-contiguous uint32 matrix that vroom.Input reads as a buffer, instead of
+    converting a nested list of Python numbers. The int32 matrices of the matrix
+    store are reinterpreted in place; other dtypes are rounded and converted once.
+    Args:
+        matrix: Square duration or distance matrix in whole seconds or meters
+    Returns:
+        uint32 matrix
+    """
+    matrix = np.asarray(matrix)
+    if matrix.dtype == np.uint32 and matrix.flags.c_contiguous:
+        return matrix
+    if matrix.dtype == np.int32 and matrix.flags.c_contiguous and (matrix.size == 0 or matrix.min() >= 0):
+        return matrix.view(np.uint32)
+    if np.issubdtype(matrix.dtype, np.floating):
+        matrix = np.rint(matrix)
+    return np.ascontiguousarray(np.clip(matrix, 0, np.iinfo(np.uint32).max), dtype=np.uint32)
+
+
 class MatrixService:
-    def __init__(self, onemap_service: OneMapService):
+    def __init__(self, onemap_service: OneMapService, mode: MatrixMode = "onemap", k_nearest: int = 10):
+        """
+        Args:
+            onemap_service: OneMap service providing routed or estimated matrices
+            mode: "onemap" for routed matrices, "estimated" for the calibrated great-circle estimate,
+                "sparse" to route only the k nearest neighbours and depot pairs and estimate the rest
+            k_nearest: Number of neighbours routed per location in sparse mode
+        """
         self.onemap_service = onemap_service
+        self.mode = mode
+        self.k_nearest = k_nearest
+
+    def get_matrices(self, locations: List[Location], matrix_type: str,
+                     mode: Optional[MatrixMode] = None) -> Tuple[np.ndarray, np.ndarray]:
+        mode = mode or self.mode
+        latlongs = [(loc.coordinates.latitude, loc.coordinates.longitude) for loc in locations]
 
-    def get_matrices(self, locations: List[Location], matrix_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        if mode == "estimated":
+            duration_matrix, distance_matrix = self.onemap_service.get_estimated_route_matrices(latlongs)
+        elif mode == "sparse":
+            duration_matrix, distance_matrix = self.onemap_service.get_sparse_route_matrices(latlongs, self.k_nearest)
+        else:
+            postal_codes = [loc.address.postal_code for loc in locations]
+            try:
+                duration_matrix, distance_matrix = self.onemap_service.get_route_matrices(
+                    latlongs, postal_codes=postal_codes)
+            except RoutePairsFailed as e:
+                # The fetched pairs are stored; solve with the failed ones estimated rather than not at all
+                print(f"Warning: {e}. Solving with those pairs estimated from the travel model.")
+                duration_matrix, distance_matrix = self.onemap_service.get_route_matrices(
+                    latlongs, postal_codes=postal_codes, query_missing=False)
+        return duration_matrix, distance_matrix
 
-        duration_matrix, distance_matrix = self.onemap_service.get_route_matrices(
-            [(loc.coordinates.latitude, loc.coordinates.longitude) for loc in locations]
-        )
-        print(locations)
-        return duration_matrix, distance_matrix 
\ No newline at end of file
+    def get_submatrices(self, locations: List[Location], matrix_type: str,
+                        mode: Optional[MatrixMode] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrices of a sub-problem of a larger instance. In onemap mode only the pairs among
+        these locations are routed and the locations are not added to the matrix store, which
+        would query them against every stored location; other modes are as get_matrices
+        """
+        mode = mode or self.mode
+        if mode != "onemap":
+            return self.get_matrices(locations, matrix_type, mode)
+        latlongs = [(loc.coordinates.latitude, loc.coordinates.longitude) for loc in locations]
+        try:
+            return self.onemap_service.get_local_route_matrices(latlongs)
+        except RoutePairsFailed as e:
+            print(f"Warning: {e}. Solving with those pairs estimated from the travel model.")
+            return self.onemap_service.get_local_route_matrices(latlongs, query_missing=False)
@@ -1,14 +1,53 @@
-from typing import List, Optional
-import folium
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Literal, Optional
+import requests
 from domain.travelling_salesman.entities.location import Location
 from domain.travelling_salesman.value_objects.coordinates import Coordinates
-from helper.onemap import OneMapQuery
+from helper.geocode_cache import GeocodeRecord, normalise_postal_code
+from helper.onemap import ROUTE_COLORS, OneMapQuery, get_onemap_query
+from helper.geo import tolerance_for_zoom
+from helper.travel_model import TravelModel, TravelModelErrorStats
 import numpy as np
 
+
+@dataclass
+class GeocodeResult:
+    """
+    Outcome of geocoding one postal code; error is set when coordinates is None
+    """
+    postal_code: str
+    coordinates: Optional[Coordinates]
+    error: Optional[str] = None
+
+
+@dataclass
+class RouteLegFailure:
+    """
+    A leg that could not be drawn on the route map
+    """
+    route_index: int
+    leg_index: int
+    start_location: Location
+    end_location: Location
+    error: str
+
+
+MapRenderer = Literal["folium", "geojson"]
+
+# Route lines are simplified to one pixel at this zoom level unless a tolerance is given
+MAP_DETAIL_ZOOM = 16
+
+
 class OneMapService:
-    def __init__(self):
-        self._onemap_query = OneMapQuery()
-        self._onemap_query.get_onemap_token()
+    def __init__(self, onemap_query: Optional[OneMapQuery] = None):
+        """
+        Args:
+            onemap_query: OneMap client to use, defaults to the process-wide client
+        """
+        self._onemap_query = onemap_query if onemap_query is not None else get_onemap_query()
+        self._travel_model = None
+        self._travel_model_version = None
     
     def get_coordinates(self, postal_code: str) -> Optional[Coordinates]:
         """
@@ -22,41 +61,232 @@ class OneMapService:
         if latlong:
             return Coordinates(latitude=latlong[0], longitude=latlong[1])
         return None
+
+    def get_coordinates_many(self, postal_codes: Iterable[str], max_workers: int = 8) -> List[GeocodeResult]:
+        """
+        Get coordinates for many postal codes at once. Duplicates are looked up
+        once, cache misses are searched concurrently under the OneMap rate limit.
+        Args:
+            postal_codes: Postal codes to look up
+            max_workers: Maximum number of concurrent OneMap searches
+        Returns:
+            One GeocodeResult per input postal code, in input order
+        """
+        postal_codes = [normalise_postal_code(code) for code in postal_codes]
+        unique_codes = list(dict.fromkeys(postal_codes))
+
+        cached = self._onemap_query.geocode_cache.get_many(unique_codes)
+        results: Dict[str, GeocodeResult] = {
+            code: self._to_geocode_result(record) for code, record in cached.items()
+        }
+
+        misses = [code for code in unique_codes if code not in results]
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+                futures = {
+                    executor.submit(self._onemap_query.search_postal, code): code
+                    for code in misses
+                }
+                for future in as_completed(futures):
+                    code = futures[future]
+                    try:
+                        results[code] = self._to_geocode_result(future.result())
+                    except requests.exceptions.RequestException as e:
+                        results[code] = GeocodeResult(postal_code=code, coordinates=None, error=str(e))
+            self._onemap_query.geocode_cache.flush()
+
+        return [results[code] for code in postal_codes]
+
+    @staticmethod
+    def _to_geocode_result(record: GeocodeRecord) -> GeocodeResult:
+        if not record.found:
+            return GeocodeResult(postal_code=record.postal_code, coordinates=None, error="not found")
+        return GeocodeResult(
+            postal_code=record.postal_code,
+            coordinates=Coordinates(latitude=record.latitude, longitude=record.longitude)
+        )
     
-    def plot_routes(self, routes: List[List[Location]], output_file: str) -> None:
+    def plot_routes(self, routes: List[List[Location]], output_file: str,
+                    max_workers: int = 8, renderer: MapRenderer = "folium",
+                    large_plan_stops: int = 500,
+                    simplify_tolerance_m: Optional[float] = None) -> List[RouteLegFailure]:
         """
-        Plot routes on a map and save to an HTML file
+        Plot routes on a map and save to an HTML file. All leg geometries are
+        fetched concurrently first, then the map is assembled from the results.
         Args:
             routes: List of routes, each route is a list of Location entities
             output_file: Path to the output HTML file
+            max_workers: Maximum number of concurrent routing requests
+            renderer: "folium" draws markers and labels per leg, "geojson" draws one
+                GeoJSON layer per vehicle and stays small for large plans
+            large_plan_stops: With the geojson renderer, plans with more stops cluster
+                the stop markers and start with the vehicle layers hidden (still embedded in the file)
+            simplify_tolerance_m: Douglas-Peucker tolerance of the route lines in meters,
+                defaults to one pixel at MAP_DETAIL_ZOOM; 0 draws the full geometry
+        Returns:
+            The legs that could not be drawn, with the reason
         """
-        # Initialize map centered around Singapore
-        map_obj = folium.Map(location=[1.352083, 103.819839], zoom_start=12, tiles="cartodbpositron")
-        
-        # Plot each route
+        import folium
+        import polyline
+        from helper.route_map import SINGAPORE_CENTER, deduplicate_segments
+
+        failures: List[RouteLegFailure] = []
+
+        # Phase 1: collect the legs and fetch their geometries
+        legs = []
         for color_index, route in enumerate(routes, start=1):
             for i in range(len(route) - 1):
                 start_location = route[i]
                 end_location = route[i + 1]
                 
-                if start_location.coordinates and end_location.coordinates:
-                    self._onemap_query.plot_routes(
-                        start_latlong=(start_location.coordinates.latitude, start_location.coordinates.longitude),
-                        end_latlong=(end_location.coordinates.latitude, end_location.coordinates.longitude),
-                        map_obj=map_obj,
-                        color_index=color_index,
-                        sequence=(i, i+1)
-                    )
+                if not (start_location.coordinates and end_location.coordinates):
+                    failures.append(RouteLegFailure(color_index, i, start_location, end_location, "missing coordinates"))
+                    continue
+                legs.append((color_index, i, start_location, end_location))
+
+        geometries, errors = self._onemap_query.get_route_geometries(
+            [(self._latlong(start), self._latlong(end)) for _, _, start, end in legs],
+            max_workers=max_workers
+        )
+
+        # Phase 2: assemble the map
+        for color_index, i, start_location, end_location in legs:
+            leg = (self._latlong(start_location), self._latlong(end_location))
+            if leg in errors:
+                failures.append(RouteLegFailure(color_index, i, start_location, end_location, errors[leg]))
+
+        if simplify_tolerance_m is None:
+            simplify_tolerance_m = tolerance_for_zoom(SINGAPORE_CENTER[0], MAP_DETAIL_ZOOM)
+
+        if renderer == "geojson":
+            self._render_geojson(routes, geometries, output_file, large_plan_stops, simplify_tolerance_m)
+            return failures
+
+        # Initialize map centered around Singapore
+        map_obj = folium.Map(location=[1.352083, 103.819839], zoom_start=12, tiles="cartodbpositron")
+        drawn_legs = [
+            (color_index, i, (self._latlong(start_location), self._latlong(end_location)))
+            for color_index, i, start_location, end_location in legs
+        ]
+        drawn_legs = [(color_index, i, leg) for color_index, i, leg in drawn_legs if leg not in errors]
+        # Road segments shared by several legs are drawn once, in the colour of the first vehicle
+        leg_lines = deduplicate_segments([polyline.decode(geometries[leg]) for _, _, leg in drawn_legs])
+        for (color_index, i, leg), lines in zip(drawn_legs, leg_lines):
+            self._onemap_query.draw_route(
+                start_latlong=leg[0],
+                end_latlong=leg[1],
+                geometry=geometries[leg],
+                map_obj=map_obj,
+                color_index=color_index,
+                sequence=(i, i+1),
+                tolerance_m=simplify_tolerance_m,
+                lines=lines
+            )
         
         # Save map to HTML
-        map_obj.save(output_file) 
+        map_obj.save(output_file)
+        return failures
+
+    def _render_geojson(self, routes: List[List[Location]], geometries: Dict[tuple, str],
+                        output_file: str, large_plan_stops: int, tolerance_m: float) -> None:
+        """Render fetched leg geometries with one GeoJSON layer per vehicle"""
+        import polyline
+        from helper.route_map import render_geojson_map
+
+        vehicles = []
+        for route in routes:
+            stops = [self._latlong(location) for location in route if location.coordinates]
+            legs = [
+                polyline.decode(geometries[leg]) if leg in geometries else None
+                for leg in zip(stops[:-1], stops[1:])
+            ]
+            vehicles.append((stops, legs))
+
+        large_plan = sum(len(stops) for stops, _ in vehicles) > large_plan_stops
+        render_geojson_map(
+            vehicles,
+            output_file,
+            colors=ROUTE_COLORS,
+            cluster_stops=large_plan,
+            hidden_layers=large_plan,
+            tolerance_m=tolerance_m
+        )
+
+    @staticmethod
+    def _latlong(location: Location) -> tuple[float, float]:
+        return location.coordinates.latitude, location.coordinates.longitude
     
-    def get_route_matrices(self, locations: List[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
+    def get_route_matrices(self, locations: List[tuple[float, float]],
+                           postal_codes: Optional[List[Optional[str]]] = None,
+                           query_missing: bool = True) -> tuple[np.ndarray, np.ndarray]:
         """
         Get duration and distance matrices for a list of locations
+        Args:
+            locations: List of (latitude, longitude) tuples
+            postal_codes: Optional postal code of each location, recorded in the location index
+            query_missing: Query the pairs an earlier run could not fetch; if False they are estimated
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        Raises:
+            RoutePairsFailed if some pairs could not be fetched
+        """
+        return self._onemap_query.get_route_matrices(
+            locations, postal_codes=postal_codes, query_missing=query_missing)
+
+    def get_local_route_matrices(self, locations: List[tuple[float, float]],
+                                 query_missing: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get duration and distance matrices of a sub-problem, routing only the pairs among
+        these locations and leaving the matrix store unchanged
+        Args:
+            locations: List of (latitude, longitude) tuples
+            query_missing: Query the pairs that are not stored or cached; if False they are estimated
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        Raises:
+            RoutePairsFailed if some pairs could not be fetched
+        """
+        return self._onemap_query.get_local_route_matrices(locations, query_missing=query_missing)
+
+    def get_sparse_route_matrices(self, locations: List[tuple[float, float]],
+                                  k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get duration and distance matrices routing only each location's k nearest
+        neighbours and the depot (first location); the other entries are estimated
+        Args:
+            locations: List of (latitude, longitude) tuples
+            k: Number of nearest neighbours routed per location
+        Returns:
+            Tuple of (duration_matrix, distance_matrix)
+        """
+        duration_matrix, distance_matrix, stats = self._onemap_query.get_sparse_route_matrices(locations, k)
+        print(f"Sparse matrices: {stats}")
+        return duration_matrix, distance_matrix
+
+    def get_travel_model(self) -> tuple[TravelModel, Optional[TravelModelErrorStats]]:
+        """
+        Get the travel model calibrated on the cached matrices, refitted when the store changes
+        Returns:
+            Tuple of (model, error_stats against held-out cached pairs)
+        """
+        matrix_store = self._onemap_query.matrix_store
+        if self._travel_model is None or self._travel_model_version != matrix_store.version:
+            self._travel_model = TravelModel.fit(matrix_store)
+            self._travel_model_version = matrix_store.version
+        return self._travel_model
+
+    def get_estimated_route_matrices(self, locations: List[tuple[float, float]]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Estimate duration and distance matrices from great-circle distances without any
+        OneMap routing call
         Args:
             locations: List of (latitude, longitude) tuples
         Returns:
             Tuple of (duration_matrix, distance_matrix)
         """
-        return self._onemap_query.get_route_matrices(locations)
\ No newline at end of file
+        model, error_stats = self.get_travel_model()
+        if error_stats is not None:
+            print(f"Estimated matrices, model error on {error_stats}")
+        else:
+            print("Estimated matrices with the default travel model (not enough cached pairs to calibrate)")
+        return model.estimate_matrices(locations)
\ No newline at end of file
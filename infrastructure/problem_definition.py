@@ -0,0 +1,203 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import vroom
+from infrastructure.matrix_service import as_vroom_matrix
+
+
+# A vroom.Vehicle with every optional attribute left at its default
+_DEFAULT_VEHICLE = vroom.Vehicle(id=0, start=0)
+
+
+@dataclass(frozen=True)
+class BreakDefinition:
+    id: int
+    time_windows: tuple[tuple[int, int], ...]
+    service: int = 0
+    description: str = ""
+
+
+@dataclass(frozen=True)
+class VehicleDefinition:
+    id: int
+    start: Optional[int]
+    end: Optional[int]
+    time_window: tuple[int, int]
+    capacity: tuple[int, ...] = ()
+    skills: frozenset = frozenset()
+    profile: str = "car"
+    breaks: tuple[BreakDefinition, ...] = ()
+    description: str = ""
+    speed_factor: float = 1.0
+    # None keeps vroom's default
+    max_tasks: Optional[int] = None
+    max_travel_time: Optional[int] = None
+    max_distance: Optional[int] = None
+    # Job ids of an initial route the solver starts from
+    steps: tuple[int, ...] = ()
+
+
+@dataclass(frozen=True)
+class JobDefinition:
+    id: int
+    location: int
+    default_service: int = 0
+    default_setup: int = 0
+    delivery: tuple[int, ...] = ()
+    pickup: tuple[int, ...] = ()
+    skills: frozenset = frozenset()
+    priority: int = 0
+    time_windows: tuple[tuple[int, int], ...] = ()
+    description: str = ""
+
+
+def _optional_limit(value: int, default: int) -> Optional[int]:
+    return None if value == default else int(value)
+
+
+@dataclass
+class ProblemDefinition:
+    """
+    Picklable description of the vehicles and jobs of a vroom problem, so the
+    same problem can be rebuilt in worker processes. It takes vehicles and jobs
+    through add_vehicle and add_job like vroom.Input, so the vehicle and job
+    services can fill it in. Every attribute the services can set is carried
+    over; attributes that cannot be rebuilt are rejected instead of dropped.
+    """
+    vehicles: List[VehicleDefinition] = field(default_factory=list)
+    jobs: List[JobDefinition] = field(default_factory=list)
+
+    def add_vehicle(self, vehicle) -> None:
+        """
+        Args:
+            vehicle: vroom.Vehicle or a list of them
+        Raises:
+            ValueError for attributes that cannot be carried over: custom costs and
+            initial steps (use seed_routes instead)
+        """
+        for item in vehicle if isinstance(vehicle, (list, tuple)) else [vehicle]:
+            costs, default_costs = item.costs, _DEFAULT_VEHICLE.costs
+            if (costs.fixed, costs.per_hour, costs.per_km) != (default_costs.fixed, default_costs.per_hour, default_costs.per_km):
+                raise ValueError(f"Vehicle {item.id}: custom costs are not supported by ProblemDefinition")
+            if len(item.steps):
+                raise ValueError(f"Vehicle {item.id}: steps are not supported by ProblemDefinition, use seed_routes")
+            if any(vehicle_break.max_load is not None for vehicle_break in item.breaks):
+                raise ValueError(f"Vehicle {item.id}: break max_load is not supported by ProblemDefinition")
+
+            self.vehicles.append(VehicleDefinition(
+                id=int(item.id),
+                start=None if item.start is None else int(item.start.index),
+                end=None if item.end is None else int(item.end.index),
+                time_window=(int(item.time_window.start), int(item.time_window.end)),
+                capacity=tuple(int(amount) for amount in item.capacity),
+                skills=frozenset(int(skill) for skill in item.skills),
+                profile=str(item.profile),
+                breaks=tuple(
+                    BreakDefinition(
+                        id=int(vehicle_break.id),
+                        time_windows=tuple((int(window.start), int(window.end)) for window in vehicle_break.time_windows),
+                        service=int(vehicle_break.service),
+                        description=str(vehicle_break.description)
+                    )
+                    for vehicle_break in item.breaks
+                ),
+                description=str(item.description),
+                speed_factor=float(item.speed_factor),
+                max_tasks=_optional_limit(item.max_tasks, _DEFAULT_VEHICLE.max_tasks),
+                max_travel_time=_optional_limit(item.max_travel_time, _DEFAULT_VEHICLE.max_travel_time),
+                max_distance=_optional_limit(item.max_distance, _DEFAULT_VEHICLE.max_distance)
+            ))
+
+    def add_job(self, job) -> None:
+        """
+        Args:
+            job: vroom.Job or a list of them
+        """
+        for item in job if isinstance(job, (list, tuple)) else [job]:
+            self.jobs.append(JobDefinition(
+                id=int(item.id),
+                location=int(item.location.index),
+                default_service=int(item.default_service),
+                default_setup=int(item.default_setup),
+                delivery=tuple(int(amount) for amount in item.delivery),
+                pickup=tuple(int(amount) for amount in item.pickup),
+                skills=frozenset(int(skill) for skill in item.skills),
+                priority=int(item.priority),
+                time_windows=tuple((int(window.start), int(window.end)) for window in item.time_windows),
+                description=str(item.description)
+            ))
+
+    def seed_routes(self, routes: Dict[int, Sequence[int]]) -> None:
+        """
+        Give vehicles an initial route; the solver then improves these routes
+        locally instead of building new ones
+        Args:
+            routes: Vehicle id to the job ids it visits, in order. Job ids that are
+                not in the problem are dropped
+        """
+        job_ids = {job.id for job in self.jobs}
+        self.vehicles = [
+            replace(vehicle, steps=tuple(job_id for job_id in routes[vehicle.id] if job_id in job_ids))
+            if vehicle.id in routes else vehicle
+            for vehicle in self.vehicles
+        ]
+
+    def to_input(self, duration_matrix: np.ndarray, job_order: Optional[Sequence[int]] = None) -> vroom.Input:
+        """
+        Build the vroom problem
+        Args:
+            duration_matrix: Matrix the solver minimises, in the units of the time windows
+            job_order: Optional order in which the jobs are added; the solver's
+                heuristics depend on it, so different orders give different solutions
+        Returns:
+            vroom.Input
+        """
+        problem_instance = vroom.Input()
+        matrix = as_vroom_matrix(duration_matrix)
+        for profile in sorted({"car"} | {vehicle.profile for vehicle in self.vehicles}):
+            problem_instance.set_durations_matrix(profile=profile, matrix_input=matrix)
+
+        for vehicle in self.vehicles:
+            kwargs = {
+                "time_window": vehicle.time_window,
+                "profile": vehicle.profile,
+                "description": vehicle.description,
+                "speed_factor": vehicle.speed_factor
+            }
+            if vehicle.capacity:
+                kwargs["capacity"] = list(vehicle.capacity)
+            if vehicle.skills:
+                kwargs["skills"] = set(vehicle.skills)
+            if vehicle.breaks:
+                kwargs["breaks"] = [
+                    vroom.Break(id=vehicle_break.id, time_windows=list(vehicle_break.time_windows),
+                                service=vehicle_break.service, description=vehicle_break.description)
+                    for vehicle_break in vehicle.breaks
+                ]
+            for limit in ("max_tasks", "max_travel_time", "max_distance"):
+                if getattr(vehicle, limit) is not None:
+                    kwargs[limit] = getattr(vehicle, limit)
+            if vehicle.steps:
+                kwargs["steps"] = (
+                    [vroom.VehicleStepStart()]
+                    + [vroom.VehicleStepSingle(job_id) for job_id in vehicle.steps]
+                    + [vroom.VehicleStepEnd()]
+                )
+            problem_instance.add_vehicle(vroom.Vehicle(id=vehicle.id, start=vehicle.start, end=vehicle.end, **kwargs))
+
+        jobs = self.jobs if job_order is None else [self.jobs[index] for index in job_order]
+        for job in jobs:
+            kwargs = {}
+            if job.delivery:
+                kwargs["delivery"] = list(job.delivery)
+            if job.pickup:
+                kwargs["pickup"] = list(job.pickup)
+            if job.skills:
+                kwargs["skills"] = set(job.skills)
+            if job.time_windows:
+                kwargs["time_windows"] = list(job.time_windows)
+            problem_instance.add_job(vroom.Job(
+                id=job.id, location=job.location, default_service=job.default_service,
+                default_setup=job.default_setup, priority=job.priority, description=job.description, **kwargs
+            ))
+        return problem_instance
@@ -0,0 +1,250 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+import numpy as np
+from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
+
+
+@dataclass
+class RouteCost:
+    """
+    Travel legs and totals of one route, from the depot back to the depot
+    """
+    leg_durations: np.ndarray
+    leg_distances: np.ndarray
+    total_duration: int
+    total_distance: int
+    end_time: int
+    feasible: bool
+
+
+@dataclass(frozen=True)
+class MoveDelta:
+    """
+    Change in total duration and distance if a move were applied
+    """
+    duration_delta: int
+    distance_delta: int
+    feasible: bool
+
+
+class _RouteState:
+    """Loaded route with prefix sums of forward and backward leg costs"""
+
+    def __init__(self, path: np.ndarray, matrices: Sequence[np.ndarray], service: int,
+                 time_window: Optional[TimeWindow]):
+        self.path = path
+        self.time_window = time_window
+        self.service = service
+        # prefix[m][k]: cost of the legs path[0] -> ... -> path[k] under matrix m,
+        # reverse_prefix[m][k]: the same legs driven in the opposite direction
+        self.prefix = []
+        self.reverse_prefix = []
+        for matrix in matrices:
+            self.prefix.append(np.concatenate(([0], np.cumsum(matrix[path[:-1], path[1:]], dtype=np.int64))))
+            self.reverse_prefix.append(np.concatenate(([0], np.cumsum(matrix[path[1:], path[:-1]], dtype=np.int64))))
+        self.duration = int(self.prefix[0][-1])
+        self.distance = int(self.prefix[1][-1])
+
+
+class RouteEvaluationService:
+    """
+    Evaluates routes over the duration and distance matrices. Route totals are
+    computed for all routes in one vectorised pass; once routes are loaded,
+    relocate, swap and 2-opt moves are priced in constant time, including the
+    vehicle time window check.
+
+    Routes are lists of matrix indices of the jobs only; every route starts and
+    ends at the depot. Positions passed to the move methods index these lists.
+    """
+
+    def __init__(self, duration_matrix: np.ndarray, distance_matrix: np.ndarray,
+                 depot_index: int = 0, service_times: Optional[np.ndarray] = None):
+        """
+        Args:
+            duration_matrix: Travel time in seconds between matrix indices
+            distance_matrix: Travel distance in meters between matrix indices
+            depot_index: Matrix index of the depot
+            service_times: Optional service time in seconds per matrix index
+        """
+        self._matrices = (np.asarray(duration_matrix), np.asarray(distance_matrix))
+        self._depot_index = depot_index
+        size = len(self._matrices[0])
+        self._service_times = (
+            np.zeros(size, dtype=np.int64) if service_times is None
+            else np.asarray(service_times, dtype=np.int64)
+        )
+        self._routes: List[_RouteState] = []
+
+    def evaluate_paths(self, paths: Sequence[Sequence[int]],
+                       time_windows: Optional[Sequence[Optional[TimeWindow]]] = None) -> List[RouteCost]:
+        """
+        Compute per-leg and total duration and distance of complete paths in one pass
+        Args:
+            paths: Matrix indices of each route including its start and end
+            time_windows: Optional vehicle time window per path
+        Returns:
+            One RouteCost per path
+        """
+        paths = [np.asarray(path, dtype=np.int64) for path in paths]
+        lengths = np.array([max(len(path) - 1, 0) for path in paths], dtype=np.int64)
+        nodes = np.concatenate(paths) if paths else np.empty(0, dtype=np.int64)
+
+        # Legs are consecutive nodes within a path; drop the pairs that span two paths.
+        # Empty paths put a boundary before the first or after the last node, which spans nothing
+        path_ends = np.cumsum([len(path) for path in paths], dtype=np.int64)
+        is_leg = np.ones(max(len(nodes) - 1, 0), dtype=bool)
+        boundaries = path_ends[:-1]
+        is_leg[boundaries[(boundaries > 0) & (boundaries < len(nodes))] - 1] = False
+        starts, ends = nodes[:-1][is_leg], nodes[1:][is_leg]
+        leg_durations = self._matrices[0][starts, ends]
+        leg_distances = self._matrices[1][starts, ends]
+        services = self._service_times[nodes]
+
+        leg_offsets = np.concatenate(([0], np.cumsum(lengths)))
+        node_offsets = np.concatenate(([0], path_ends))
+        costs = []
+        for index, path in enumerate(paths):
+            legs = slice(leg_offsets[index], leg_offsets[index + 1])
+            total_duration = int(leg_durations[legs].sum())
+            total_service = int(services[node_offsets[index] + 1:node_offsets[index + 1] - 1].sum())
+            time_window = time_windows[index] if time_windows is not None else None
+            start_time = time_window.start if time_window is not None else 0
+            end_time = start_time + total_duration + total_service
+            costs.append(RouteCost(
+                leg_durations=leg_durations[legs],
+                leg_distances=leg_distances[legs],
+                total_duration=total_duration,
+                total_distance=int(leg_distances[legs].sum()),
+                end_time=end_time,
+                feasible=time_window is None or end_time <= time_window.end
+            ))
+        return costs
+
+    def load_routes(self, routes: Sequence[Sequence[int]],
+                    time_windows: Optional[Sequence[Optional[TimeWindow]]] = None) -> List[RouteCost]:
+        """
+        Load routes for move evaluation
+        Args:
+            routes: Matrix indices of the jobs of each route, without the depot
+            time_windows: Optional vehicle time window per route
+        Returns:
+            The current cost of each route
+        """
+        depot = [self._depot_index]
+        paths = [np.asarray(depot + list(route) + depot, dtype=np.int64) for route in routes]
+        self._routes = [
+            _RouteState(
+                path,
+                self._matrices,
+                int(self._service_times[path[1:-1]].sum()),
+                time_windows[index] if time_windows is not None else None
+            )
+            for index, path in enumerate(paths)
+        ]
+        return self.evaluate_paths(paths, time_windows)
+
+    def relocate_delta(self, from_route: int, from_position: int, to_route: int, to_position: int) -> MoveDelta:
+        """
+        Price moving the job at from_position so it becomes job to_position of to_route
+        """
+        source = self._routes[from_route]
+        # Path index of the job is its position + 1 because of the leading depot
+        node = source.path[from_position + 1]
+        before, after = source.path[from_position], source.path[from_position + 2]
+
+        if from_route == to_route:
+            # Insert into the route as it is once the job is removed
+            def path_without_node(k: int) -> int:
+                return source.path[k] if k <= from_position else source.path[k + 1]
+            insert_before, insert_after = path_without_node(to_position), path_without_node(to_position + 1)
+            deltas = [
+                matrix[before, after] - matrix[before, node] - matrix[node, after]
+                + matrix[insert_before, node] + matrix[node, insert_after] - matrix[insert_before, insert_after]
+                for matrix in self._matrices
+            ]
+            return self._delta({from_route: (deltas[0], 0)}, deltas)
+
+        target = self._routes[to_route]
+        insert_before, insert_after = target.path[to_position], target.path[to_position + 1]
+        removal = [matrix[before, after] - matrix[before, node] - matrix[node, after] for matrix in self._matrices]
+        insertion = [
+            matrix[insert_before, node] + matrix[node, insert_after] - matrix[insert_before, insert_after]
+            for matrix in self._matrices
+        ]
+        service = int(self._service_times[node])
+        return self._delta(
+            {from_route: (removal[0], -service), to_route: (insertion[0], service)},
+            [removal[0] + insertion[0], removal[1] + insertion[1]]
+        )
+
+    def swap_delta(self, first_route: int, first_position: int, second_route: int, second_position: int) -> MoveDelta:
+        """
+        Price exchanging two jobs, in the same route or in two routes
+        """
+        if first_route == second_route and first_position > second_position:
+            first_position, second_position = second_position, first_position
+        first, second = self._routes[first_route], self._routes[second_route]
+        a, b = first.path[first_position + 1], second.path[second_position + 1]
+
+        if first_route == second_route and second_position == first_position + 1:
+            # Adjacent jobs: before, a, b, after becomes before, b, a, after
+            before, after = first.path[first_position], first.path[second_position + 2]
+            deltas = [
+                matrix[before, b] + matrix[b, a] + matrix[a, after]
+                - matrix[before, a] - matrix[a, b] - matrix[b, after]
+                for matrix in self._matrices
+            ]
+            return self._delta({first_route: (deltas[0], 0)}, deltas)
+
+        def replace(state: _RouteState, position: int, old: int, new: int, matrix: np.ndarray) -> int:
+            before, after = state.path[position], state.path[position + 2]
+            return matrix[before, new] + matrix[new, after] - matrix[before, old] - matrix[old, after]
+
+        first_deltas = [replace(first, first_position, a, b, matrix) for matrix in self._matrices]
+        second_deltas = [replace(second, second_position, b, a, matrix) for matrix in self._matrices]
+        totals = [first_deltas[0] + second_deltas[0], first_deltas[1] + second_deltas[1]]
+        if first_route == second_route:
+            return self._delta({first_route: (totals[0], 0)}, totals)
+
+        service = int(self._service_times[b]) - int(self._service_times[a])
+        return self._delta(
+            {first_route: (first_deltas[0], service), second_route: (second_deltas[0], -service)},
+            totals
+        )
+
+    def two_opt_delta(self, route: int, start_position: int, end_position: int) -> MoveDelta:
+        """
+        Price reversing the jobs from start_position to end_position (inclusive) of a route
+        """
+        if start_position > end_position:
+            start_position, end_position = end_position, start_position
+        state = self._routes[route]
+        first, last = start_position + 1, end_position + 1
+        before, a, b, after = state.path[first - 1], state.path[first], state.path[last], state.path[last + 1]
+
+        deltas = []
+        for matrix, prefix, reverse_prefix in zip(self._matrices, state.prefix, state.reverse_prefix):
+            # The reversed segment is driven backwards, which differs on asymmetric matrices
+            forward = prefix[last] - prefix[first]
+            backward = reverse_prefix[last] - reverse_prefix[first]
+            deltas.append(
+                matrix[before, b] + matrix[a, after] - matrix[before, a] - matrix[b, after]
+                + backward - forward
+            )
+        return self._delta({route: (deltas[0], 0)}, deltas)
+
+    def _delta(self, route_changes: dict, deltas: Sequence[int]) -> MoveDelta:
+        """
+        Build the move result, checking the time window of every changed route
+        Args:
+            route_changes: Route index to (duration change, service time change)
+            deltas: Total (duration, distance) change
+        """
+        feasible = True
+        for route, (duration_change, service_change) in route_changes.items():
+            state = self._routes[route]
+            if state.time_window is None:
+                continue
+            end_time = state.time_window.start + state.duration + state.service + duration_change + service_change
+            feasible = feasible and end_time <= state.time_window.end
+        return MoveDelta(duration_delta=int(deltas[0]), distance_delta=int(deltas[1]), feasible=feasible)
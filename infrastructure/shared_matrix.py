@@ -0,0 +1,62 @@
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Sequence
+import numpy as np
+from infrastructure.matrix_service import as_vroom_matrix
+from infrastructure.problem_definition import ProblemDefinition
+from infrastructure.solution_processor_service import route_step_columns
+from infrastructure.solve_policy import SolveParameters, SolvePolicy
+
+
+class SharedMatrix:
+    """
+    A uint32 solver matrix in a shared memory block, written once by the parent
+    and read by worker processes instead of each receiving a pickled copy.
+    Use as a context manager; the block is removed on exit.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        matrix = as_vroom_matrix(matrix)
+        self.shape = matrix.shape
+        self._shared = SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        np.ndarray(self.shape, dtype=np.uint32, buffer=self._shared.buf)[:] = matrix
+
+    @property
+    def name(self) -> str:
+        return self._shared.name
+
+    def __enter__(self) -> "SharedMatrix":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._shared.close()
+        self._shared.unlink()
+
+
+def solve_on_shared_matrix(shm_name: str, shape: tuple, definition: ProblemDefinition,
+                           parameters: SolveParameters, job_order: Optional[Sequence[int]] = None) -> tuple:
+    """
+    Solve a problem against a SharedMatrix; runs in a worker process
+    Args:
+        shm_name: SharedMatrix.name
+        shape: SharedMatrix.shape
+        definition: Vehicles and jobs of the problem
+        parameters: Solver settings
+        job_order: Optional order in which the jobs are added
+    Returns:
+        Tuple of (route steps as returned by route_step_columns, vroom summary, unassigned count, seconds)
+    """
+    start = time.perf_counter()
+    # Pool workers share the parent's resource tracker, so attaching does not hand
+    # them ownership; the parent unlinks the block
+    shared = SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.uint32, buffer=shared.buf)
+        problem_instance = definition.to_input(matrix, job_order)
+        del matrix
+
+        solution = problem_instance.solve(**SolvePolicy.solve_arguments(problem_instance, parameters))
+        summary = {"cost": int(solution.summary.cost), "duration": int(solution.summary.duration)}
+        return route_step_columns(solution), summary, len(solution.unassigned), time.perf_counter() - start
+    finally:
+        shared.close()
@@ -1,64 +1,185 @@
+from importlib.metadata import PackageNotFoundError, version
 from typing import List, Optional
+import numpy as np
 from domain.travelling_salesman.entities.location import Location
 from application.travelling_salesman.interfaces.route_optimizer_interface import OptimizedRoute
-import pandas as pd
+from infrastructure.route_evaluation_service import RouteEvaluationService
+
+STEP_COLUMNS = ("vehicle_id", "type", "arrival", "duration", "service", "waiting_time", "location_index", "id")
+
+# pyvroom (major, minor) releases whose private Solution._routes_numpy was checked to
+# return the structured array Solution.routes is built from; others use the public frame
+ROUTES_NUMPY_VERSIONS = {(1, 15)}
+
+# Value of missing ids in the _routes_numpy array
+ROUTES_NUMPY_NA = 4293967297
+
+
+def _pyvroom_version() -> Optional[tuple[int, ...]]:
+    try:
+        return tuple(int(part) for part in version("pyvroom").split(".")[:3] if part.isdigit())
+    except PackageNotFoundError:
+        return None
+
+
+def _routes_numpy_supported() -> bool:
+    pyvroom_version = _pyvroom_version()
+    return pyvroom_version is not None and pyvroom_version[:2] in ROUTES_NUMPY_VERSIONS
+
+
+def route_step_columns(solution) -> dict:
+    """
+    Get the route steps of a vroom solution as column arrays. pyvroom builds
+    Solution.routes as a pandas frame from a structured array; on the releases
+    in ROUTES_NUMPY_VERSIONS that array is read directly, otherwise the public
+    frame is converted.
+    Args:
+        solution: vroom.Solution
+    Returns:
+        Dict of column name to numpy array; type holds bytes such as b'job'
+    """
+    routes_numpy = getattr(solution, "_routes_numpy", None)
+    if routes_numpy is not None and _routes_numpy_supported():
+        steps = np.asarray(routes_numpy())
+        if steps.dtype.names is not None and set(STEP_COLUMNS) <= set(steps.dtype.names):
+            columns = {column: steps[column] for column in STEP_COLUMNS}
+            # Steps without an id (start, end) hold pyvroom's NA placeholder, the frame reports them as NA
+            columns["id"] = np.where(columns["id"] == ROUTES_NUMPY_NA, -1, columns["id"]).astype(np.int64)
+            return columns
+
+    frame = solution.routes
+    columns = {column: frame[column].to_numpy() for column in STEP_COLUMNS if column != "id"}
+    columns["type"] = columns["type"].astype("S9")
+    columns["id"] = frame["id"].fillna(-1).to_numpy(dtype=np.int64)
+    return columns
+
+
+class LocationLookup:
+    """
+    Vectorised job id to position in the locations list. Compact ids use a dense
+    array indexed by id, sparse or negative ids a sorted search.
+    """
+
+    def __init__(self, locations: List[Location]):
+        ids = np.fromiter((loc.id for loc in locations), dtype=np.int64, count=len(locations))
+        positions = np.arange(len(locations), dtype=np.int64)
+
+        # Assign in reverse so the first location with a duplicated id wins
+        self._dense = None
+        if len(ids) and ids.min() >= 0 and ids.max() < 4 * len(ids) + 1024:
+            self._dense = np.full(ids.max() + 1, -1, dtype=np.int64)
+            self._dense[ids[::-1]] = positions[::-1]
+        else:
+            order = np.argsort(ids, kind="stable")
+            self._sorted_ids = ids[order]
+            self._sorted_positions = positions[order]
+
+    def positions(self, job_ids: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            Position of each job id in the locations list, -1 where unknown
+        """
+        job_ids = np.asarray(job_ids, dtype=np.int64)
+        result = np.full(len(job_ids), -1, dtype=np.int64)
+        if self._dense is not None:
+            known = (job_ids >= 0) & (job_ids < len(self._dense))
+            result[known] = self._dense[job_ids[known]]
+        elif len(self._sorted_ids):
+            index = np.searchsorted(self._sorted_ids, job_ids, side="left")
+            index = np.minimum(index, len(self._sorted_ids) - 1)
+            known = self._sorted_ids[index] == job_ids
+            result[known] = self._sorted_positions[index[known]]
+        return result
+
 
 class SolutionProcessorService:
-    def process_solution(self, solution, locations: List[Location], depot_location: Optional[Location] = None) -> List[OptimizedRoute]:
+    def process_solution(self, solution, locations: List[Location], depot_location: Optional[Location] = None,
+                         duration_matrix: Optional[np.ndarray] = None,
+                         distance_matrix: Optional[np.ndarray] = None) -> List[OptimizedRoute]:
+        """
+        Decode a vroom solution into one OptimizedRoute per vehicle
+        Args:
+            solution: vroom.Solution
+            locations: Locations whose ids were used as job ids
+            depot_location: Optional depot added at the start and end of every route
+            duration_matrix: Optional matrix the totals are read from, in seconds
+            distance_matrix: Optional matrix the totals are read from, in meters
+        Returns:
+            List of optimized routes, ordered by vehicle id
+        """
+        return self.process_steps(
+            route_step_columns(solution), locations, depot_location, duration_matrix, distance_matrix)
+
+    def process_steps(self, steps: dict, locations: List[Location], depot_location: Optional[Location] = None,
+                      duration_matrix: Optional[np.ndarray] = None,
+                      distance_matrix: Optional[np.ndarray] = None) -> List[OptimizedRoute]:
+        """
+        Decode route steps, as returned by route_step_columns, into one OptimizedRoute
+        per vehicle; see process_solution
+        """
+        # One stable sort by (vehicle, arrival) instead of a groupby and a sort per vehicle
+        order = np.lexsort((steps["arrival"], steps["vehicle_id"]))
+        vehicle_ids = steps["vehicle_id"][order]
+        arrivals = steps["arrival"][order]
+        durations = steps["duration"][order]
+        services = steps["service"][order]
+        waiting_times = steps["waiting_time"][order]
+
+        # Job steps whose id is one of the locations
+        is_job = steps["type"][order] == b"job"
+        positions = np.where(is_job, LocationLookup(locations).positions(steps["id"][order]), -1)
+        visited = positions >= 0
+
+        # Each vehicle is one contiguous slice of the sorted steps
+        boundaries = np.flatnonzero(np.diff(vehicle_ids)) + 1
+        slice_starts = np.concatenate(([0], boundaries)).tolist()
+        slice_ends = np.concatenate((boundaries, [len(vehicle_ids)])).tolist()
+
+        # Totals are the legs actually driven, read from the matrices in one pass
+        route_costs = None
+        if duration_matrix is not None and distance_matrix is not None:
+            is_stop = np.isin(steps["type"][order], (b"start", b"job", b"end"))
+            location_indices = steps["location_index"][order]
+            paths = [location_indices[start:end][is_stop[start:end]] for start, end in zip(slice_starts, slice_ends)]
+            route_costs = RouteEvaluationService(duration_matrix, distance_matrix).evaluate_paths(paths)
+
         optimized_routes = []
-        fulfilled_job_ids = set()
-        
-        # Convert solution.routes to DataFrame
-        vehicle_groups = pd.DataFrame(solution.routes).groupby('vehicle_id')
-        print(solution.routes)
-        
-        for vehicle_id, vehicle_steps in vehicle_groups:
-            route_locations = []
-            arrival_times = []
-            service_times = []
-            waiting_times = []
-            
-            # Add depot location at start if provided
-            if depot_location:
-                route_locations.append(depot_location)
-            
-            # Sort steps by arrival time to ensure correct order
-            sorted_steps = vehicle_steps.sort_values('arrival')
-            
-            # Add locations based on job IDs
-            for _, step in sorted_steps.iterrows():
-                if step['type'] == 'job':
-                    location_index = step['id'] - 1
-                    if 0 <= location_index < len(locations):
-                        route_locations.append(locations[location_index])
-                        arrival_times.append(step['arrival'])
-                        service_times.append(step['service'])
-                        waiting_times.append(step['waiting_time'])
-                        fulfilled_job_ids.add(step['id'])
-            
-            # Add depot location at end if provided
+        for route_number, (start, end) in enumerate(zip(slice_starts, slice_ends)):
+            if start == end:
+                continue
+            visits = np.flatnonzero(visited[start:end]) + start
+
+            route_locations = [locations[position] for position in positions[visits].tolist()]
             if depot_location:
-                route_locations.append(depot_location)
-            
-            # Calculate total duration and distance from the last step
-            total_time = sorted_steps['duration'].sum()
-            total_distance = sorted_steps['duration'].sum() * 10  # Example calculation
-            
+                route_locations = [depot_location] + route_locations + [depot_location]
+
+            # Without matrices only the travel time of the last step is known
+            if route_costs is not None:
+                total_time = route_costs[route_number].total_duration
+                total_distance = route_costs[route_number].total_distance
+            else:
+                total_time = int(durations[end - 1])
+                total_distance = None
+
             optimized_routes.append(OptimizedRoute(
-                vehicle_id=vehicle_id,
+                vehicle_id=int(vehicle_ids[start]),
                 locations=route_locations,
                 total_distance=total_distance,
                 total_time=total_time,
-                arrival_times=arrival_times,
-                service_times=service_times,
-                waiting_times=waiting_times
+                arrival_times=arrivals[visits].tolist(),
+                service_times=services[visits].tolist(),
+                waiting_times=waiting_times[visits].tolist()
             ))
-        
+
         # Determine unfulfilled jobs
-        all_job_ids = set(range(1, len(locations)))  # Assuming job IDs are 1-indexed
-        unfulfilled_job_ids = all_job_ids - fulfilled_job_ids
-        
+        fulfilled_positions = np.zeros(len(locations), dtype=bool)
+        fulfilled_positions[positions[visited]] = True
+        unfulfilled_job_ids = {
+            loc.id for loc, fulfilled in zip(locations, fulfilled_positions.tolist())
+            if not fulfilled and not (depot_location and loc.id == depot_location.id)
+        }
+
         # Output unfulfilled jobs
         print("Unfulfilled Job IDs:", unfulfilled_job_ids)
-        
-        return optimized_routes 
\ No newline at end of file
+
+        return optimized_routes
@@ -0,0 +1,133 @@
+import inspect
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+MIN_EXPLORATION_LEVEL = 1
+MAX_EXPLORATION_LEVEL = 5
+
+# Largest number of jobs each exploration level is used for when there is no budget
+LEVEL_SIZE_LIMITS = ((100, MAX_EXPLORATION_LEVEL), (400, 4), (1500, 3), (4000, 2))
+
+# Below this many jobs per thread, extra threads cost more than they save
+MIN_JOBS_PER_THREAD = 20
+
+# Single-threaded seconds of a level 1 solve of 100 jobs, and how the solve
+# time grows with the number of jobs; measured on random instances, rough only
+BASE_SECONDS = 0.6
+SIZE_EXPONENT = 2.5
+
+# Relative work of each exploration level compared to level 1
+LEVEL_WORK = {1: 1.0, 2: 1.7, 3: 3.0, 4: 5.0, 5: 9.0}
+
+
+def search_count(exploration_level: int) -> int:
+    """
+    Number of parallel local searches vroom runs for an exploration level;
+    threads beyond this number stay idle
+    """
+    searches = 4 * (exploration_level + 1)
+    if exploration_level >= 4:
+        searches += 4
+    if exploration_level == 5:
+        searches += 4
+    return searches
+
+
+def available_cores() -> int:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class SolveParameters:
+    """
+    Arguments for vroom.Input.solve
+    """
+    exploration_level: int
+    nb_threads: int
+    timeout: Optional[timedelta] = None
+
+
+class SolvePolicy:
+    """
+    Chooses the vroom exploration level and thread count from the number of jobs,
+    the available cores and an optional wall-clock budget. The budget is also
+    passed to vroom as a hard timeout.
+    """
+
+    def __init__(self, time_budget: Optional[float] = None, threads: Optional[int] = None):
+        """
+        Args:
+            time_budget: Optional wall-clock budget for the solve in seconds
+            threads: Optional thread count, defaults to the available cores
+        """
+        self.time_budget = time_budget
+        self.threads = threads
+
+    def parameters(self, num_jobs: int) -> SolveParameters:
+        """
+        Args:
+            num_jobs: Number of jobs in the problem
+        Returns:
+            Solve parameters for the problem
+        """
+        cores = max(1, min(self.threads or available_cores(), -(-num_jobs // MIN_JOBS_PER_THREAD)))
+
+        exploration_level = MIN_EXPLORATION_LEVEL
+        for size_limit, level in LEVEL_SIZE_LIMITS:
+            if num_jobs <= size_limit:
+                exploration_level = level
+                break
+
+        # Step down until the estimated solve time fits the budget
+        if self.time_budget is not None:
+            while (exploration_level > MIN_EXPLORATION_LEVEL
+                   and self.estimate_seconds(num_jobs, exploration_level, cores) > self.time_budget):
+                exploration_level -= 1
+
+        return SolveParameters(
+            exploration_level=exploration_level,
+            nb_threads=min(cores, search_count(exploration_level)),
+            timeout=timedelta(seconds=self.time_budget) if self.time_budget is not None else None
+        )
+
+    @staticmethod
+    def estimate_seconds(num_jobs: int, exploration_level: int, threads: int) -> float:
+        """
+        Rough wall-clock estimate of a solve
+        """
+        threads = max(1, min(threads, search_count(exploration_level)))
+        single_threaded = BASE_SECONDS * (max(num_jobs, 1) / 100) ** SIZE_EXPONENT * LEVEL_WORK[exploration_level]
+        return single_threaded / threads
+
+    def solve(self, problem_instance, num_jobs: int):
+        """
+        Solve a vroom problem with the parameters for its size
+        Args:
+            problem_instance: vroom.Input
+            num_jobs: Number of jobs in the problem
+        Returns:
+            vroom.Solution
+        """
+        parameters = self.parameters(num_jobs)
+        print(f"Solving {num_jobs} jobs with exploration level {parameters.exploration_level} "
+              f"on {parameters.nb_threads} threads")
+        return problem_instance.solve(**self.solve_arguments(problem_instance, parameters))
+
+    @staticmethod
+    def solve_arguments(problem_instance, parameters: SolveParameters) -> dict:
+        """
+        Keyword arguments for problem_instance.solve; the timeout is only passed
+        to vroom versions whose solve accepts it
+        """
+        kwargs = {"exploration_level": parameters.exploration_level, "nb_threads": parameters.nb_threads}
+        if parameters.timeout is not None:
+            if "timeout" in inspect.signature(problem_instance.solve).parameters:
+                kwargs["timeout"] = parameters.timeout
+            else:
+                print("This vroom version does not support a solve timeout; solving without it")
+        return kwargs
@@ -0,0 +1,174 @@
+import multiprocessing
+import threading
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import List, Optional
+import numpy as np
+from infrastructure.problem_definition import ProblemDefinition
+from infrastructure.shared_matrix import SharedMatrix, solve_on_shared_matrix
+from infrastructure.solve_policy import (
+    MAX_EXPLORATION_LEVEL, MIN_EXPLORATION_LEVEL, SolveParameters, SolvePolicy, available_cores
+)
+
+# Seconds to wait past the time budget for workers to return their solutions
+DEADLINE_GRACE_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class PortfolioConfig:
+    """
+    Solver settings of one portfolio worker; seed 0 keeps the original job order
+    """
+    worker: int
+    exploration_level: int
+    seed: int
+    nb_threads: int
+
+
+@dataclass
+class PortfolioWorkerStats:
+    config: PortfolioConfig
+    cost: Optional[int] = None
+    unassigned: Optional[int] = None
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class PortfolioResult:
+    """
+    Route steps of the best solution, as returned by route_step_columns, and the stats of every worker
+    """
+    steps: dict
+    cost: int
+    unassigned: int
+    best_worker: int
+    stats: List[PortfolioWorkerStats]
+
+
+class SolverPortfolio:
+    """
+    Runs several differently configured vroom solves in parallel processes and
+    keeps the best solution. Workers vary the exploration level and the order in
+    which jobs are added, and read the matrix from one shared memory block
+    instead of each receiving a pickled copy.
+    """
+
+    def __init__(self, workers: Optional[int] = None, solve_policy: Optional[SolvePolicy] = None):
+        """
+        Args:
+            workers: Number of parallel solves, defaults to the available cores
+            solve_policy: Policy giving the base exploration level, the cores and the time budget
+        """
+        self.workers = workers
+        self.solve_policy = solve_policy or SolvePolicy()
+
+    def configs(self, num_jobs: int) -> List[PortfolioConfig]:
+        """
+        Worker settings: the first worker runs the policy's parameters on the original
+        job order, the others alternate levels around it with shuffled job orders
+        """
+        base = self.solve_policy.parameters(num_jobs)
+        cores = self.solve_policy.threads or available_cores()
+        workers = max(1, self.workers or cores)
+        nb_threads = max(1, cores // workers)
+
+        offsets = [0, -1, 1, -2, 2]
+        configs = []
+        for worker in range(workers):
+            level = base.exploration_level + offsets[worker % len(offsets)]
+            level = min(max(level, MIN_EXPLORATION_LEVEL), MAX_EXPLORATION_LEVEL)
+            configs.append(PortfolioConfig(worker=worker, exploration_level=level, seed=worker, nb_threads=nb_threads))
+        return configs
+
+    def solve(self, definition: ProblemDefinition, duration_matrix: np.ndarray) -> Optional[PortfolioResult]:
+        """
+        Solve the problem with every configuration and keep the solution with the fewest
+        unassigned jobs, then the lowest cost. With a time budget, workers still running
+        after it (plus a grace period) are terminated, so no solver process outlives the call;
+        if none has finished after a second grace period, every worker is terminated.
+        Args:
+            definition: Vehicles and jobs of the problem
+            duration_matrix: Matrix the solver minimises
+        Returns:
+            PortfolioResult, or None if every worker failed or ran out of time
+        """
+        configs = self.configs(len(definition.jobs))
+        time_budget = self.solve_policy.time_budget
+        stats = [PortfolioWorkerStats(config=config) for config in configs]
+        results = {}
+
+        with SharedMatrix(duration_matrix) as shared:
+            # A Pool rather than a ProcessPoolExecutor: its workers can be terminated mid-solve
+            pool = multiprocessing.get_context().Pool(processes=len(configs))
+            finished = threading.Condition()
+            done = set()
+
+            def on_done(worker: int) -> None:
+                with finished:
+                    done.add(worker)
+                    finished.notify_all()
+
+            try:
+                pending = {}
+                for config in configs:
+                    parameters = SolveParameters(
+                        exploration_level=config.exploration_level,
+                        nb_threads=config.nb_threads,
+                        timeout=None if time_budget is None else timedelta(seconds=time_budget)
+                    )
+                    job_order = np.random.default_rng(config.seed).permutation(len(definition.jobs)) if config.seed else None
+                    pending[config.worker] = pool.apply_async(
+                        solve_on_shared_matrix,
+                        (shared.name, shared.shape, definition, parameters, job_order),
+                        callback=lambda _, worker=config.worker: on_done(worker),
+                        error_callback=lambda _, worker=config.worker: on_done(worker)
+                    )
+
+                deadline = None if time_budget is None else time_budget + DEADLINE_GRACE_SECONDS
+                with finished:
+                    if not finished.wait_for(lambda: len(done) == len(pending), timeout=deadline):
+                        # Out of time: keep what finished, or give the first solution one more grace period
+                        finished.wait_for(lambda: len(done) > 0, timeout=DEADLINE_GRACE_SECONDS)
+                    finished_workers = set(done)
+
+                for worker, result in pending.items():
+                    if worker not in finished_workers:
+                        stats[worker].error = "deadline exceeded"
+                        continue
+                    try:
+                        steps, summary, unassigned, seconds = result.get()
+                    except Exception as e:
+                        stats[worker].error = str(e)
+                        continue
+                    results[worker] = steps
+                    stats[worker].cost, stats[worker].unassigned, stats[worker].seconds = summary["cost"], unassigned, seconds
+            finally:
+                # Stop stragglers still solving; join so none outlives the call or blocks exit
+                pool.terminate()
+                pool.join()
+
+        self.print_stats(stats)
+        if not results:
+            print("Every portfolio worker failed")
+            return None
+
+        best = min(results, key=lambda worker: (stats[worker].unassigned, stats[worker].cost))
+        return PortfolioResult(
+            steps=results[best],
+            cost=stats[best].cost,
+            unassigned=stats[best].unassigned,
+            best_worker=best,
+            stats=stats
+        )
+
+    @staticmethod
+    def print_stats(stats: List[PortfolioWorkerStats]) -> None:
+        print(f"{'worker':>6} {'level':>5} {'seed':>4} {'threads':>7} {'cost':>10} {'unassigned':>10} {'seconds':>8}")
+        for stat in stats:
+            config = stat.config
+            if stat.error:
+                outcome = f"{stat.error:>30}"
+            else:
+                outcome = f"{stat.cost:>10} {stat.unassigned:>10} {stat.seconds:>8.2f}"
+            print(f"{config.worker:>6} {config.exploration_level:>5} {config.seed:>4} {config.nb_threads:>7} {outcome}")
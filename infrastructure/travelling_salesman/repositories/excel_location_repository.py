@@ -1,5 +1,4 @@
-import pandas as pd
-from typing import List
+from typing import List, Optional
 import re
 from domain.travelling_salesman.entities.location import Location
 from domain.travelling_salesman.repositories.location_repository_interface import LocationRepositoryInterface
@@ -8,9 +7,14 @@ from infrastructure.onemap_service import OneMapService
 
 
 class ExcelLocationRepository(LocationRepositoryInterface):
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, onemap_service: Optional[OneMapService] = None):
+        """
+        Args:
+            file_path: Path of the Excel file with job_id and address columns
+            onemap_service: OneMap service used for geocoding, shared with the rest of the run
+        """
         self._file_path = file_path
-        self._onemap_service = OneMapService()
+        self._onemap_service = onemap_service if onemap_service is not None else OneMapService()
     
     def get_all_locations(self) -> List[Location]:
         """
@@ -18,12 +22,12 @@ class ExcelLocationRepository(LocationRepositoryInterface):
         Returns:
             List of Location entities
         """
+        import pandas as pd
+
         df = pd.read_excel(self._file_path)
-        locations = []
+        rows = []
         
-        for index, row in df.iterrows():
-            full_address = row['address']
-            
+        for job_id, full_address in zip(df['job_id'], df['address']):
             # Extract postal code using regex
             postal_code_match = re.search(r'\b\d{6}\b', full_address)
             if postal_code_match:
@@ -32,13 +36,20 @@ class ExcelLocationRepository(LocationRepositoryInterface):
                 print(f"Warning: Could not extract postal code from address: {full_address}")
                 continue
             
+            rows.append((int(job_id), postal_code, full_address))
+        
+        # Get coordinates from OneMap service in one bulk call
+        results = self._onemap_service.get_coordinates_many([postal_code for _, postal_code, _ in rows])
+        
+        locations = []
+        for (job_id, postal_code, full_address), result in zip(rows, results):
             address = Address(postal_code=postal_code, full_address=full_address)
-            location = Location(id=row['job_id'], address=address)
+            location = Location(id=job_id, address=address)
             
-            # Get coordinates from OneMap service
-            coordinates = self._onemap_service.get_coordinates(postal_code)
-            if coordinates:
-                location.coordinates = coordinates
+            if result.coordinates:
+                location.coordinates = result.coordinates
+            else:
+                print(f"Warning: Could not geocode postal code {postal_code}: {result.error}")
             
             locations.append(location)
         
@@ -48,6 +59,8 @@ class ExcelLocationRepository(LocationRepositoryInterface):
         """
         Save locations to the Excel file
         """
+        import pandas as pd
+
         data = [{'job_id': loc.id, 'address': loc.address.full_address} for loc in locations]
         df = pd.DataFrame(data)
         df.to_excel(self._file_path, index=False) 
\ No newline at end of file
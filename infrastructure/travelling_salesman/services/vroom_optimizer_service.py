@@ -1,26 +1,24 @@
 from typing import List, Optional, Literal
-import vroom
 from domain.travelling_salesman.entities.location import Location
 from application.travelling_salesman.interfaces.route_optimizer_interface import RouteOptimizerInterface, OptimizedRoute
 from infrastructure.matrix_service import MatrixService
+from infrastructure.problem_definition import ProblemDefinition
 from infrastructure.vehicle_service import VehicleService
 from infrastructure.job_service import JobService
-from infrastructure.onemap_service import OneMapService
 from infrastructure.solution_processor_service import SolutionProcessorService
-# Initialize services
-onemap_service = OneMapService()
-matrix_service = MatrixService(onemap_service)
-vehicle_service = VehicleService()
-job_service = JobService()
-solution_processor_service = SolutionProcessorService()
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.solver_portfolio import SolverPortfolio
 
 class VroomOptimizerService(RouteOptimizerInterface):
     def __init__(self, matrix_service: MatrixService, vehicle_service: VehicleService, 
-                 job_service: JobService, solution_processor_service: SolutionProcessorService):
+                 job_service: JobService, solution_processor_service: SolutionProcessorService,
+                 solve_policy: Optional[SolvePolicy] = None, portfolio: Optional[SolverPortfolio] = None):
         self.matrix_service = matrix_service
         self.vehicle_service = vehicle_service
         self.job_service = job_service
         self.solution_processor_service = solution_processor_service
+        self.solve_policy = solve_policy or SolvePolicy()
+        self.portfolio = portfolio
 
     def optimize_routes(self, locations: List[Location], max_vehicles: Optional[int] = None, 
                        depot_location: Optional[Location] = None, 
@@ -29,31 +27,31 @@ class VroomOptimizerService(RouteOptimizerInterface):
             # Step 1: Get matrices
             duration_matrix, distance_matrix = self.matrix_service.get_matrices(locations, matrix_type)
 
-            # Step 2: Initialize VROOM problem
-            problem_instance = vroom.Input()
+            # Step 2: Describe the problem; it is built into vroom.Input once per solve
+            problem_definition = ProblemDefinition()
+            solver_matrix = duration_matrix if matrix_type == "duration" else distance_matrix
 
-            # Step 3: Set matrix
-            if matrix_type == "duration":
-                problem_instance.set_durations_matrix(profile="car", matrix_input=duration_matrix.tolist())
-            else:
-                problem_instance.set_durations_matrix(profile="car", matrix_input=distance_matrix.tolist())
+            # Step 3: Add vehicles
+            self.vehicle_service.add_vehicles(problem_definition, max_vehicles)
 
-            # Step 4: Add vehicles
-            self.vehicle_service.add_vehicles(problem_instance, max_vehicles)
-
-            # Step 5: Add jobs
+            # Step 4: Add jobs
             unique_coords = {(loc.coordinates.latitude, loc.coordinates.longitude): idx 
                             for idx, loc in enumerate(locations)}
-            self.job_service.add_jobs(problem_instance, locations, unique_coords)
+            self.job_service.add_jobs(problem_definition, locations, unique_coords)
+
+            # Step 5: Solve, in parallel with several configurations when a portfolio is set
+            if self.portfolio:
+                result = self.portfolio.solve(problem_definition, solver_matrix)
+                if result is None:
+                    return []
+                return self.solution_processor_service.process_steps(
+                    result.steps, locations, depot_location, duration_matrix, distance_matrix)
 
-            # Step 6: Solve and process solution
-            solution = problem_instance.solve(exploration_level=5, nb_threads=4)
-            return self.solution_processor_service.process_solution(solution, locations, depot_location)
+            problem_instance = problem_definition.to_input(solver_matrix)
+            solution = self.solve_policy.solve(problem_instance, len(locations))
+            return self.solution_processor_service.process_solution(
+                solution, locations, depot_location, duration_matrix, distance_matrix)
 
         except Exception as e:
             # Handle exceptions
             raise
-
-# Initialize VroomOptimizerService with new services
-route_optimizer = VroomOptimizerService(matrix_service, vehicle_service, job_service, solution_processor_service)
-
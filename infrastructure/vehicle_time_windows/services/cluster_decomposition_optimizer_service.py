@@ -0,0 +1,335 @@
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import timedelta
+from typing import Dict, List, Optional, Literal
+import numpy as np
+from domain.travelling_salesman.entities.location import Location
+from domain.vehicle_time_windows.entities.vehicle import Vehicle
+from application.vehicle_time_windows.interfaces.route_optimizer_interface import RouteOptimizerInterface, OptimizedRoute
+from helper.geo import haversine_pairs, k_nearest, kmeans
+from infrastructure.matrix_service import MatrixService
+from infrastructure.problem_definition import ProblemDefinition
+from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
+from infrastructure.job_service import JobService
+from infrastructure.solution_processor_service import SolutionProcessorService, route_step_columns
+from infrastructure.solve_policy import SolveParameters, SolvePolicy, available_cores
+from infrastructure.vehicle_time_windows.services.vroom_time_window_optimizer_service import (
+    VroomTimeWindowOptimizerService
+)
+
+# Repair starts from the cluster routes and only improves them locally
+REPAIR_EXPLORATION_LEVEL = 1
+
+# Number of nearest clusters considered as repair partners of each cluster
+REPAIR_NEIGHBOURS = 2
+
+# Share of the time budget given to the cluster solves, the rest is left for the repair
+CLUSTER_BUDGET_SHARE = 0.8
+
+# Repair is skipped when less of the time budget than this is left
+MIN_REPAIR_SECONDS = 1.0
+
+
+@dataclass
+class ClusterPlan:
+    """
+    Solved sub-problem: the depot and the jobs of one cluster, or of two merged
+    clusters, with its own submatrices and the vehicles allocated to it
+    """
+    locations: List[Location]
+    vehicles: List[Vehicle]
+    duration_matrix: np.ndarray
+    distance_matrix: np.ndarray
+    solver_matrix: np.ndarray
+    steps: Optional[dict] = None
+    cost: int = 0
+    unassigned: int = 0
+
+    def routes(self) -> Dict[int, List[int]]:
+        """Job ids visited by every vehicle, in order"""
+        is_job = self.steps["type"] == b"job"
+        order = np.lexsort((self.steps["arrival"], self.steps["vehicle_id"]))
+        routes = {vehicle.id: [] for vehicle in self.vehicles}
+        for vehicle_id, job_id in zip(self.steps["vehicle_id"][order][is_job[order]].tolist(),
+                                      self.steps["id"][order][is_job[order]].tolist()):
+            routes[vehicle_id].append(job_id)
+        return routes
+
+
+def _solve_definition(definition: ProblemDefinition, solver_matrix: np.ndarray, parameters: SolveParameters) -> tuple:
+    """Solve one sub-problem; runs in a worker process"""
+    problem_instance = definition.to_input(solver_matrix)
+    solution = problem_instance.solve(**SolvePolicy.solve_arguments(problem_instance, parameters))
+    return route_step_columns(solution), int(solution.summary.cost), len(solution.unassigned)
+
+
+def allocate_vehicles(workloads: np.ndarray, vehicle_count: int) -> np.ndarray:
+    """
+    Split vehicles over clusters in proportion to their workload, at least one each,
+    rounding by largest remainder
+    Args:
+        workloads: Workload of every cluster
+        vehicle_count: Number of vehicles, at least the number of clusters
+    Returns:
+        int64 number of vehicles per cluster
+    """
+    workloads = np.asarray(workloads, dtype=np.float64)
+    counts = np.ones(len(workloads), dtype=np.int64)
+    remaining = vehicle_count - len(workloads)
+    if remaining <= 0 or workloads.sum() <= 0:
+        return counts
+
+    quotas = workloads / workloads.sum() * remaining
+    counts += np.floor(quotas).astype(np.int64)
+    leftover = vehicle_count - counts.sum()
+    counts[np.argsort(-(quotas - np.floor(quotas)), kind="stable")[:leftover]] += 1
+    return counts
+
+
+def neighbour_pairs(centres: np.ndarray) -> List[tuple[int, int]]:
+    """
+    Disjoint pairs of neighbouring clusters, closest centres first, so the pairs
+    can be repaired in parallel
+    """
+    if len(centres) < 2:
+        return []
+    neighbours = k_nearest(centres, REPAIR_NEIGHBOURS)
+    candidates = {tuple(sorted((a, int(b)))) for a, row in enumerate(neighbours) for b in row}
+    candidates = sorted(candidates, key=lambda pair: float(haversine_pairs(centres[pair[0]], centres[pair[1]])))
+
+    paired = set()
+    pairs = []
+    for a, b in candidates:
+        if a not in paired and b not in paired:
+            pairs.append((a, b))
+            paired.update((a, b))
+    return pairs
+
+
+class ClusterDecompositionOptimizerService(RouteOptimizerInterface):
+    """
+    Solves large instances by clustering the jobs geographically, allocating the
+    vehicles over the clusters in proportion to their number of jobs and solving
+    every cluster in a separate process on its own submatrices. A repair pass
+    then re-solves pairs of neighbouring clusters together, starting from their
+    routes, so jobs near a cluster boundary can move to the better vehicle.
+
+    With a fixed cluster size, the work grows linearly with the number of jobs,
+    and no matrix larger than two clusters is ever requested. Sub-problem
+    matrices come from MatrixService.get_submatrices, so in onemap mode only
+    the pairs inside a cluster or a repaired pair of clusters are routed.
+
+    A time budget is split between the cluster solves and the repair. If a
+    cluster cannot be solved, the whole instance is solved with
+    VroomTimeWindowOptimizerService in the time that is left.
+    """
+
+    def __init__(
+        self,
+        matrix_service: MatrixService,
+        vehicle_service: VehicleTimeWindowService,
+        job_service: JobService,
+        solution_processor_service: SolutionProcessorService,
+        solve_policy: Optional[SolvePolicy] = None,
+        cluster_size: int = 300,
+        workers: Optional[int] = None
+    ):
+        """
+        Args:
+            cluster_size: Target number of jobs per cluster
+            workers: Number of parallel solves, defaults to the available cores
+        """
+        self.matrix_service = matrix_service
+        self.vehicle_service = vehicle_service
+        self.job_service = job_service
+        self.solution_processor_service = solution_processor_service
+        self.solve_policy = solve_policy or SolvePolicy()
+        self.cluster_size = cluster_size
+        self.workers = workers
+
+    def optimize_routes(
+        self,
+        locations: List[Location],
+        vehicles: List[Vehicle],
+        depot_location: Optional[Location] = None,
+        matrix_type: Literal["duration", "distance"] = "duration"
+    ) -> List[OptimizedRoute]:
+        """
+        Optimize routes for given locations and vehicles with time windows;
+        locations[0] is the depot
+        """
+        start = time.perf_counter()
+        depot_location = depot_location or locations[0]
+        jobs = [location for location in locations[1:] if location.id != depot_location.id]
+        if not jobs or not vehicles:
+            return []
+
+        # Step 1: Cluster the jobs, at most one cluster per vehicle
+        cluster_count = min(max(1, math.ceil(len(jobs) / self.cluster_size)), len(vehicles))
+        latlongs = np.array([(loc.coordinates.latitude, loc.coordinates.longitude) for loc in jobs])
+        labels, centres = kmeans(latlongs, cluster_count)
+        cluster_count = len(centres)
+
+        # Step 2: Allocate vehicles by the number of jobs of every cluster
+        vehicle_counts = allocate_vehicles(np.bincount(labels, minlength=cluster_count), len(vehicles))
+        vehicle_offsets = np.concatenate(([0], np.cumsum(vehicle_counts))).tolist()
+        plans = [
+            self._plan(
+                [depot_location] + [jobs[index] for index in np.flatnonzero(labels == cluster).tolist()],
+                vehicles[vehicle_offsets[cluster]:vehicle_offsets[cluster + 1]],
+                depot_location,
+                matrix_type
+            )
+            for cluster in range(cluster_count)
+        ]
+        print(f"Decomposed {len(jobs)} jobs into {cluster_count} clusters "
+              f"(jobs {np.bincount(labels).tolist()}, vehicles {vehicle_counts.tolist()})")
+
+        # Step 3: Solve the clusters in parallel, in their share of the time budget
+        time_budget = self.solve_policy.time_budget
+        solve_start = time.perf_counter()
+        cluster_seconds = None if time_budget is None else time_budget * CLUSTER_BUDGET_SHARE
+        errors = self._solve_plans(plans, depot_location, seeded=False, timeout=cluster_seconds)
+        failed = [cluster for cluster, error in enumerate(errors) if error is not None]
+        if failed:
+            print(f"Could not solve clusters {failed} ({errors[failed[0]]}); solving the full instance instead")
+            return self._optimize_full(locations, vehicles, depot_location, matrix_type, solve_start)
+        print(f"Clusters solved in {time.perf_counter() - start:.1f}s: "
+              f"cost {sum(plan.cost for plan in plans)}, unassigned {sum(plan.unassigned for plan in plans)}")
+
+        # Step 4: Re-solve neighbouring clusters together from their routes, in the rest of the budget
+        deadline = None if time_budget is None else solve_start + time_budget
+        plans = self._repair_boundaries(plans, neighbour_pairs(centres), depot_location, matrix_type, deadline)
+        print(f"Decomposed solve finished in {time.perf_counter() - start:.1f}s: "
+              f"cost {sum(plan.cost for plan in plans)}, unassigned {sum(plan.unassigned for plan in plans)}")
+
+        optimized_routes = []
+        for plan in plans:
+            optimized_routes.extend(self.solution_processor_service.process_steps(
+                plan.steps, plan.locations, depot_location, plan.duration_matrix, plan.distance_matrix))
+        return sorted(optimized_routes, key=lambda route: route.vehicle_id)
+
+
+    def _optimize_full(self, locations: List[Location], vehicles: List[Vehicle], depot_location: Location,
+                       matrix_type: str, solve_start: float) -> List[OptimizedRoute]:
+        """Solve the whole instance without decomposition, in what is left of the time budget"""
+        time_budget = self.solve_policy.time_budget
+        if time_budget is not None:
+            time_budget = max(MIN_REPAIR_SECONDS, time_budget - (time.perf_counter() - solve_start))
+        optimizer = VroomTimeWindowOptimizerService(
+            self.matrix_service,
+            self.vehicle_service,
+            self.job_service,
+            self.solution_processor_service,
+            SolvePolicy(time_budget, self.solve_policy.threads)
+        )
+        return optimizer.optimize_routes(locations, vehicles, depot_location, matrix_type)
+
+    def _plan(self, locations: List[Location], vehicles: List[Vehicle], depot_location: Location,
+              matrix_type: str) -> ClusterPlan:
+        """Sub-problem with its own matrices; locations[0] is the depot"""
+        duration_matrix, distance_matrix = self.matrix_service.get_submatrices(locations, matrix_type)
+        return ClusterPlan(
+            locations=locations,
+            vehicles=vehicles,
+            duration_matrix=duration_matrix,
+            distance_matrix=distance_matrix,
+            solver_matrix=duration_matrix if matrix_type == "duration" else distance_matrix
+        )
+
+    def _definition(self, plan: ClusterPlan, depot_location: Location) -> ProblemDefinition:
+        problem_definition = ProblemDefinition()
+        self.vehicle_service.add_vehicles(problem_definition, plan.vehicles, depot_location)
+        unique_coords = {(loc.coordinates.latitude, loc.coordinates.longitude): idx
+                         for idx, loc in enumerate(plan.locations)}
+        self.job_service.add_jobs(problem_definition, plan.locations[1:], unique_coords)  # Skip depot
+        return problem_definition
+
+    def _solve_plans(self, plans: List[ClusterPlan], depot_location: Location, seeded: bool,
+                     seeds: Optional[List[Dict[int, List[int]]]] = None,
+                     timeout: Optional[float] = None) -> List[Optional[Exception]]:
+        """
+        Solve plans in parallel processes and store their solutions in place
+        Args:
+            timeout: Seconds all the solves may take together, instead of the policy's budget for each;
+                solves queued behind others get an equal share of it
+        Returns:
+            The error of every plan that could not be solved, None for the others
+        """
+        cores = self.solve_policy.threads or available_cores()
+        workers = max(1, min(self.workers or cores, len(plans)))
+        nb_threads = max(1, cores // workers)
+        if timeout is not None:
+            timeout /= math.ceil(len(plans) / workers)
+
+        submissions = []
+        for index, plan in enumerate(plans):
+            definition = self._definition(plan, depot_location)
+            parameters = replace(self.solve_policy.parameters(len(plan.locations) - 1), nb_threads=nb_threads)
+            if timeout is not None:
+                parameters = replace(parameters, timeout=timedelta(seconds=timeout))
+            if seeded:
+                definition.seed_routes(seeds[index])
+                parameters = replace(parameters, exploration_level=REPAIR_EXPLORATION_LEVEL)
+            submissions.append((definition, plan.solver_matrix, parameters))
+
+        errors = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_solve_definition, *submission) for submission in submissions]
+            for plan, future in zip(plans, futures):
+                try:
+                    plan.steps, plan.cost, plan.unassigned = future.result()
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+        return errors
+
+    def _repair_boundaries(self, plans: List[ClusterPlan], pairs: List[tuple[int, int]],
+                           depot_location: Location, matrix_type: str,
+                           deadline: Optional[float] = None) -> List[ClusterPlan]:
+        """
+        Re-solve every pair of neighbouring clusters as one problem seeded with both
+        clusters' routes, and keep the merged solution where it assigns more jobs or costs less.
+        With a deadline (a time.perf_counter() value), the repair solves get the time left
+        and the repair is skipped if that is less than MIN_REPAIR_SECONDS.
+        """
+        if not pairs:
+            return plans
+        if deadline is not None and deadline - time.perf_counter() < MIN_REPAIR_SECONDS:
+            print("Skipping boundary repair, the time budget is used up")
+            return plans
+
+        merged_plans = [
+            self._plan(
+                plans[a].locations + plans[b].locations[1:],
+                plans[a].vehicles + plans[b].vehicles,
+                depot_location,
+                matrix_type
+            )
+            for a, b in pairs
+        ]
+        seeds = [{**plans[a].routes(), **plans[b].routes()} for a, b in pairs]
+        timeout = None
+        if deadline is not None:
+            # Routing the merged plans may have used part of the time left
+            timeout = deadline - time.perf_counter()
+            if timeout < MIN_REPAIR_SECONDS:
+                print("Skipping boundary repair, the time budget is used up")
+                return plans
+        errors = self._solve_plans(merged_plans, depot_location, seeded=True, seeds=seeds, timeout=timeout)
+
+        replaced = set()
+        repaired = []
+        for (a, b), merged, error in zip(pairs, merged_plans, errors):
+            if error is not None:
+                print(f"Could not repair clusters {a} and {b}: {error}")
+                continue
+            before = (plans[a].unassigned + plans[b].unassigned, plans[a].cost + plans[b].cost)
+            if (merged.unassigned, merged.cost) < before:
+                replaced.update((a, b))
+                repaired.append(merged)
+
+        print(f"Boundary repair improved {len(repaired)} of {len(pairs)} cluster pairs")
+        return [plan for index, plan in enumerate(plans) if index not in replaced] + repaired
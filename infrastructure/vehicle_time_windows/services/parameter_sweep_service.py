@@ -0,0 +1,190 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from domain.travelling_salesman.entities.location import Location
+from domain.vehicle_time_windows.entities.vehicle import Vehicle
+from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
+from infrastructure.problem_definition import ProblemDefinition
+from infrastructure.shared_matrix import SharedMatrix, solve_on_shared_matrix
+from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
+from infrastructure.job_service import JobService
+from infrastructure.solve_policy import SolvePolicy, available_cores
+
+
+@dataclass
+class SweepResult:
+    num_vehicles: int
+    time_window_hours: float
+    unassigned: Optional[int] = None
+    total_time: Optional[int] = None
+    solve_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ParameterSweepService:
+    """
+    Solves one set of locations for many fleet sizes and time window lengths.
+    The jobs and the matrix are prepared once; every setting only changes the
+    vehicles, and the solves run in a process pool that reads the matrix from
+    shared memory.
+    """
+
+    def __init__(
+        self,
+        vehicle_service: VehicleTimeWindowService,
+        job_service: JobService,
+        solve_policy: Optional[SolvePolicy] = None,
+        workers: Optional[int] = None
+    ):
+        """
+        Args:
+            solve_policy: Policy giving the exploration level, the cores and the time budget of each solve
+            workers: Number of parallel solves, defaults to the available cores
+        """
+        self.vehicle_service = vehicle_service
+        self.job_service = job_service
+        self.solve_policy = solve_policy or SolvePolicy()
+        self.workers = workers
+
+    def grid(
+        self,
+        locations: List[Location],
+        depot_location: Location,
+        solver_matrix: np.ndarray,
+        fleet_sizes: Sequence[int],
+        time_window_hours: Sequence[float]
+    ) -> List[SweepResult]:
+        """
+        Solve every combination of fleet size and time window length
+        Args:
+            locations: Locations with the depot first, in matrix order
+            depot_location: Starting/ending location for vehicles
+            solver_matrix: Matrix the solver minimises
+            fleet_sizes: Numbers of vehicles
+            time_window_hours: Time window lengths in hours
+        Returns:
+            One SweepResult per setting, by window length then fleet size
+        """
+        settings = [(hours, size) for hours in time_window_hours for size in fleet_sizes]
+        jobs = self._jobs(locations)
+        with SharedMatrix(solver_matrix) as shared, self._executor(len(settings)) as executor:
+            results = self._solve(executor, shared, jobs, depot_location, settings)
+        return [results[setting] for setting in settings]
+
+    def smallest_fleet(
+        self,
+        locations: List[Location],
+        depot_location: Location,
+        solver_matrix: np.ndarray,
+        max_vehicles: int,
+        time_window_hours: Sequence[float]
+    ) -> Dict[float, Optional[SweepResult]]:
+        """
+        Search the smallest fleet that assigns every job, for every window length.
+        All windows are searched at once, and each round probes several evenly spaced
+        fleet sizes per window so the search uses all workers.
+        Args:
+            locations: Locations with the depot first, in matrix order
+            depot_location: Starting/ending location for vehicles
+            solver_matrix: Matrix the solver minimises
+            max_vehicles: Largest fleet size considered
+            time_window_hours: Time window lengths in hours
+        Returns:
+            Window length to the result of the smallest covering fleet, None where even
+            max_vehicles leaves jobs unassigned
+        """
+        jobs = self._jobs(locations)
+        workers = self._worker_count()
+        # Per window: the largest size known to fail and the smallest known to cover
+        bounds = {hours: [0, max_vehicles] for hours in time_window_hours}
+        best: Dict[float, Optional[SweepResult]] = {}
+
+        with SharedMatrix(solver_matrix) as shared, self._executor(workers) as executor:
+            results = self._solve(executor, shared, jobs, depot_location,
+                                  [(hours, max_vehicles) for hours in time_window_hours])
+            for hours in time_window_hours:
+                if self._covers(results[(hours, max_vehicles)]):
+                    best[hours] = results[(hours, max_vehicles)]
+                else:
+                    best[hours] = None
+                    del bounds[hours]
+
+            while True:
+                open_windows = [hours for hours, (low, high) in bounds.items() if high - low > 1]
+                if not open_windows:
+                    break
+                probes_per_window = max(1, workers // len(open_windows))
+                settings = []
+                for hours in open_windows:
+                    low, high = bounds[hours]
+                    sizes = np.linspace(low, high, probes_per_window + 2)[1:-1]
+                    settings.extend((hours, size) for size in sorted(set(np.rint(sizes).astype(int).tolist()))
+                                    if low < size < high)
+
+                results = self._solve(executor, shared, jobs, depot_location, settings)
+                for (hours, size), result in sorted(results.items()):
+                    low, high = bounds[hours]
+                    if self._covers(result) and size < high:
+                        bounds[hours][1] = size
+                        best[hours] = result
+                    elif not self._covers(result) and size > low:
+                        bounds[hours][0] = size
+        return best
+
+    @staticmethod
+    def print_results(results: Sequence[SweepResult]) -> None:
+        print(f"{'vehicles':>8} {'window (h)':>10} {'unassigned':>10} {'total time (s)':>14} {'solve (s)':>9}")
+        for result in results:
+            if result.error:
+                print(f"{result.num_vehicles:>8} {result.time_window_hours:>10.2f} {result.error}")
+            else:
+                print(f"{result.num_vehicles:>8} {result.time_window_hours:>10.2f} {result.unassigned:>10} "
+                      f"{result.total_time:>14} {result.solve_seconds:>9.2f}")
+
+    @staticmethod
+    def _covers(result: SweepResult) -> bool:
+        return result.error is None and result.unassigned == 0
+
+    def _worker_count(self) -> int:
+        return max(1, self.workers or self.solve_policy.threads or available_cores())
+
+    def _executor(self, settings: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=max(1, min(self._worker_count(), settings)))
+
+    def _jobs(self, locations: List[Location]) -> ProblemDefinition:
+        """The jobs shared by every setting; locations[0] is the depot"""
+        definition = ProblemDefinition()
+        unique_coords = {(loc.coordinates.latitude, loc.coordinates.longitude): idx
+                         for idx, loc in enumerate(locations)}
+        self.job_service.add_jobs(definition, locations[1:], unique_coords)  # Skip depot
+        return definition
+
+    def _solve(self, executor: ProcessPoolExecutor, shared: SharedMatrix, jobs: ProblemDefinition,
+               depot_location: Location, settings: Sequence[tuple[float, int]]) -> Dict[tuple[float, int], SweepResult]:
+        """Solve settings of (window hours, fleet size) in parallel"""
+        parallel = max(1, min(self._worker_count(), len(settings)))
+        nb_threads = max(1, (self.solve_policy.threads or available_cores()) // parallel)
+        parameters = replace(self.solve_policy.parameters(len(jobs.jobs)), nb_threads=nb_threads)
+
+        futures = {}
+        for hours, size in settings:
+            vehicles = [
+                Vehicle(id=index + 1, time_window=TimeWindow(start=0, end=int(hours * 3600)))
+                for index in range(size)
+            ]
+            definition = ProblemDefinition(jobs=jobs.jobs)
+            self.vehicle_service.add_vehicles(definition, vehicles, depot_location)
+            future = executor.submit(solve_on_shared_matrix, shared.name, shared.shape, definition, parameters)
+            futures[(hours, size)] = future
+
+        results = {}
+        for (hours, size), future in futures.items():
+            result = SweepResult(num_vehicles=size, time_window_hours=hours)
+            try:
+                _, summary, result.unassigned, result.solve_seconds = future.result()
+                result.total_time = summary["duration"]
+            except Exception as e:
+                result.error = str(e)
+            results[(hours, size)] = result
+        return results
@@ -1,13 +1,18 @@
-from typing import List, Optional, Literal
-import vroom
+from dataclasses import replace
+from typing import Collection, List, Optional, Literal
 from domain.travelling_salesman.entities.location import Location
 from domain.vehicle_time_windows.entities.vehicle import Vehicle
 from application.vehicle_time_windows.interfaces.route_optimizer_interface import RouteOptimizerInterface, OptimizedRoute
 from infrastructure.matrix_service import MatrixService
+from infrastructure.problem_definition import ProblemDefinition
 from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
 from infrastructure.job_service import JobService
 from infrastructure.solution_processor_service import SolutionProcessorService
-from infrastructure.onemap_service import OneMapService
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.solver_portfolio import SolverPortfolio
+
+# A warm start only improves the seeded routes locally, so a low level is enough
+WARM_START_EXPLORATION_LEVEL = 1
 
 class VroomTimeWindowOptimizerService(RouteOptimizerInterface):
     def __init__(
@@ -15,12 +20,16 @@ class VroomTimeWindowOptimizerService(RouteOptimizerInterface):
         matrix_service: MatrixService,
         vehicle_service: VehicleTimeWindowService,
         job_service: JobService,
-        solution_processor_service: SolutionProcessorService
+        solution_processor_service: SolutionProcessorService,
+        solve_policy: Optional[SolvePolicy] = None,
+        portfolio: Optional[SolverPortfolio] = None
     ):
         self.matrix_service = matrix_service
         self.vehicle_service = vehicle_service
         self.job_service = job_service
         self.solution_processor_service = solution_processor_service
+        self.solve_policy = solve_policy or SolvePolicy()
+        self.portfolio = portfolio
 
     def optimize_routes(
         self,
@@ -34,30 +43,110 @@ class VroomTimeWindowOptimizerService(RouteOptimizerInterface):
             # Step 1: Get matrices
             duration_matrix, distance_matrix = self.matrix_service.get_matrices(locations, matrix_type)
 
-            # Step 2: Initialize VROOM problem
-            problem_instance = vroom.Input()
+            # Steps 2-4: Describe the problem; it is built into vroom.Input once per solve
+            problem_definition = self._problem_definition(locations, vehicles, depot_location)
+            solver_matrix = duration_matrix if matrix_type == "duration" else distance_matrix
 
-            # Step 3: Set matrix
-            if matrix_type == "duration":
-                problem_instance.set_durations_matrix(profile="car", matrix_input=duration_matrix.tolist())
+            # Step 5: Solve, in parallel with several configurations when a portfolio is set
+            if self.portfolio:
+                result = self.portfolio.solve(problem_definition, solver_matrix)
+                if result is None:
+                    return []
+                optimized_routes = self.solution_processor_service.process_steps(
+                    result.steps, locations, depot_location, duration_matrix, distance_matrix)
             else:
-                problem_instance.set_durations_matrix(profile="car", matrix_input=distance_matrix.tolist())
+                problem_instance = problem_definition.to_input(solver_matrix)
+                solution = self.solve_policy.solve(problem_instance, len(locations) - 1)
+                print("Solution obtained:", solution)
+                optimized_routes = self.solution_processor_service.process_solution(
+                    solution, locations, depot_location, duration_matrix, distance_matrix)
+            print("Optimized routes:", optimized_routes)
+            return optimized_routes
 
-            # Step 4: Add vehicles with time windows
-            self.vehicle_service.add_vehicles(problem_instance, vehicles, depot_location)
+        except Exception as e:
+            print("Error during optimization:", e)
+            raise
 
-            # Step 5: Add jobs
-            unique_coords = {(loc.coordinates.latitude, loc.coordinates.longitude): idx 
-                           for idx, loc in enumerate(locations)}
-            self.job_service.add_jobs(problem_instance, locations[1:], unique_coords)  # Skip depot
+    def reoptimize_routes(
+        self,
+        previous_routes: List[OptimizedRoute],
+        vehicles: List[Vehicle],
+        added_locations: List[Location],
+        removed_location_ids: Collection[int],
+        depot_location: Location,
+        matrix_type: Literal["duration", "distance"] = "duration"
+    ) -> List[OptimizedRoute]:
+        """
+        Update a previous plan for late changes. The solver starts from the previous
+        routes, without the removed jobs, and only improves them locally while inserting
+        the added jobs, so it returns in a fraction of a full solve and keeps most jobs
+        on the vehicle and in the order they had.
+        Args:
+            previous_routes: Routes of the previous plan
+            vehicles: List of vehicles with time windows
+            added_locations: Locations of the new jobs
+            removed_location_ids: Ids of the locations whose jobs were cancelled
+            depot_location: Starting/ending location for vehicles
+            matrix_type: Type of matrix to use for optimization ("duration" or "distance")
+        Returns:
+            List of optimized routes
+        """
+        try:
+            print("Starting re-optimization...")
+            removed_location_ids = set(removed_location_ids) | {depot_location.id}
 
-            # Step 6: Solve and process solution
-            solution = problem_instance.solve(exploration_level=5, nb_threads=4)
-            print("Solution obtained:", solution)
-            optimized_routes = self.solution_processor_service.process_solution(solution, locations, depot_location)
+            # The depot stays at index 0, followed by the remaining and the added jobs
+            locations = {depot_location.id: depot_location}
+            for route in previous_routes:
+                for location in route.locations:
+                    if location.id not in removed_location_ids:
+                        locations.setdefault(location.id, location)
+            for location in added_locations:
+                locations.setdefault(location.id, location)
+            locations = list(locations.values())
+
+            duration_matrix, distance_matrix = self.matrix_service.get_matrices(locations, matrix_type)
+            solver_matrix = duration_matrix if matrix_type == "duration" else distance_matrix
+
+            problem_definition = self._problem_definition(locations, vehicles, depot_location)
+            problem_definition.seed_routes({
+                route.vehicle_id: [location.id for location in route.locations]
+                for route in previous_routes
+            })
+
+            num_jobs = len(locations) - 1
+            parameters = replace(
+                self.solve_policy.parameters(num_jobs),
+                exploration_level=WARM_START_EXPLORATION_LEVEL
+            )
+            try:
+                problem_instance = problem_definition.to_input(solver_matrix)
+                solution = problem_instance.solve(**self.solve_policy.solve_arguments(problem_instance, parameters))
+            except Exception as e:
+                # vroom rejects seeded routes that no longer fit, e.g. after a vehicle's window shrank
+                print("Could not start from the previous routes, solving from scratch:", e)
+                problem_instance = self._problem_definition(locations, vehicles, depot_location).to_input(solver_matrix)
+                solution = self.solve_policy.solve(problem_instance, num_jobs)
+
+            optimized_routes = self.solution_processor_service.process_solution(
+                solution, locations, depot_location, duration_matrix, distance_matrix)
             print("Optimized routes:", optimized_routes)
             return optimized_routes
 
         except Exception as e:
-            print("Error during optimization:", e)
-            raise 
\ No newline at end of file
+            print("Error during re-optimization:", e)
+            raise
+
+    def _problem_definition(self, locations: List[Location], vehicles: List[Vehicle],
+                            depot_location: Optional[Location]) -> ProblemDefinition:
+        """Vehicles and jobs of the problem; locations[0] is the depot"""
+        problem_definition = ProblemDefinition()
+
+        # Add vehicles with time windows
+        self.vehicle_service.add_vehicles(problem_definition, vehicles, depot_location)
+
+        # Add jobs
+        unique_coords = {(loc.coordinates.latitude, loc.coordinates.longitude): idx 
+                       for idx, loc in enumerate(locations)}
+        self.job_service.add_jobs(problem_definition, locations[1:], unique_coords)  # Skip depot
+        return problem_definition 
\ No newline at end of file
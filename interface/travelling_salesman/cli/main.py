@@ -1,13 +1,4 @@
 import argparse
-import os
-from dotenv import load_dotenv
-from infrastructure.travelling_salesman.repositories.excel_location_repository import ExcelLocationRepository
-from infrastructure.travelling_salesman.services.vroom_optimizer_service import VroomOptimizerService
-from infrastructure.onemap_service import OneMapService
-from infrastructure.matrix_service import MatrixService
-from infrastructure.vehicle_service import VehicleService
-from infrastructure.job_service import JobService
-from infrastructure.solution_processor_service import SolutionProcessorService
 from application.travelling_salesman.use_cases.load_locations_use_case import LoadLocationsUseCase
 from application.travelling_salesman.use_cases.get_optimal_routes_use_case import GetOptimalRoutesUseCase
 from application.travelling_salesman.services.route_planning_service import RoutePlanningService
@@ -17,9 +8,6 @@ from domain.travelling_salesman.entities.location import Location
 from domain.travelling_salesman.value_objects.address import Address
 from domain.travelling_salesman.value_objects.coordinates import Coordinates
 
-# Load environment variables
-load_dotenv()
-
 
 def get_args(debug: bool = False) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Traveling Salesman Problem Solver")
@@ -49,6 +37,47 @@ def get_args(debug: bool = False) -> argparse.Namespace:
         default="duration",
         help="Type of matrix to use for optimization"
     )
+    parser.add_argument(
+        "--matrix_mode",
+        type=str,
+        choices=["onemap", "estimated", "sparse"],
+        default="onemap",
+        help="Route matrices from OneMap, estimated from straight-line distances calibrated on cached routes, "
+             "or sparse (route only nearest neighbours and depot pairs, estimate the rest)"
+    )
+    parser.add_argument(
+        "--map_renderer",
+        type=str,
+        choices=["folium", "geojson"],
+        default="folium",
+        help="Map renderer: folium markers per leg, or one lightweight GeoJSON layer per vehicle for large plans. "
+             "With geojson, plans over 500 stops start with the vehicle layers hidden; this only hides them, "
+             "all route data is still embedded in the HTML file"
+    )
+    parser.add_argument(
+        "--k_nearest",
+        type=int,
+        default=10,
+        help="Number of nearest neighbours routed per location in sparse matrix mode"
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=None,
+        help="Wall-clock budget for the solve in seconds; lowers the exploration level to fit and stops the solver"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of solver threads (default: all available cores)"
+    )
+    parser.add_argument(
+        "--portfolio_workers",
+        type=int,
+        default=0,
+        help="Run this many differently configured solves in parallel processes and keep the best (0: single solve)"
+    )
     
     if debug:
         # Return default debug values
@@ -58,14 +87,29 @@ def get_args(debug: bool = False) -> argparse.Namespace:
 
 
 def main(args: argparse.Namespace) -> None:
+    # Infrastructure pulls in vroom, numpy, pandas and requests; import it only when solving
+    from dotenv import load_dotenv
+    from infrastructure.travelling_salesman.repositories.excel_location_repository import ExcelLocationRepository
+    from infrastructure.travelling_salesman.services.vroom_optimizer_service import VroomOptimizerService
+    from infrastructure.onemap_service import OneMapService
+    from infrastructure.matrix_service import MatrixService
+    from infrastructure.vehicle_service import VehicleService
+    from infrastructure.job_service import JobService
+    from infrastructure.solution_processor_service import SolutionProcessorService
+    from infrastructure.solve_policy import SolvePolicy
+    from infrastructure.solver_portfolio import SolverPortfolio
+
+    # Load environment variables
+    load_dotenv()
+
     print(f"Processing file: {args.file_path}")
     print(f"Number of vehicles: {args.num_vehicles}")
     print(f"Output file: {args.output_file}")
     
     # Initialize repository and services
-    location_repository = ExcelLocationRepository(args.file_path)
     onemap_service = OneMapService()
-    matrix_service = MatrixService(onemap_service)
+    location_repository = ExcelLocationRepository(args.file_path, onemap_service)
+    matrix_service = MatrixService(onemap_service, mode=args.matrix_mode, k_nearest=args.k_nearest)
     vehicle_service = VehicleService()
     job_service = JobService()
     solution_processor_service = SolutionProcessorService()
@@ -85,11 +129,14 @@ def main(args: argparse.Namespace) -> None:
     )
     
     # Initialize optimizer with services
+    solve_policy = SolvePolicy(time_budget=args.time_budget, threads=args.threads)
     route_optimizer = VroomOptimizerService(
         matrix_service,
         vehicle_service,
         job_service,
-        solution_processor_service
+        solution_processor_service,
+        solve_policy,
+        SolverPortfolio(args.portfolio_workers, solve_policy) if args.portfolio_workers > 0 else None
     )
     
     # Initialize use cases
@@ -140,7 +187,10 @@ def main(args: argparse.Namespace) -> None:
         routes_for_plotting.append(route.locations)
     
     # Plot all routes at once
-    onemap_service.plot_routes(routes_for_plotting, args.output_file)
+    failed_legs = onemap_service.plot_routes(routes_for_plotting, args.output_file, renderer=args.map_renderer)
+    for failure in failed_legs:
+        print(f"  Could not plot route {failure.route_index}, leg {failure.leg_index} "
+              f"({failure.start_location.id} -> {failure.end_location.id}): {failure.error}")
     
     print(f"\nRoute map has been generated: {args.output_file}")
 
@@ -1,8 +1,4 @@
 import argparse
-from dotenv import load_dotenv
-from infrastructure.travelling_salesman.repositories.excel_location_repository import ExcelLocationRepository
-from infrastructure.vehicle_time_windows.services.vroom_time_window_optimizer_service import VroomTimeWindowOptimizerService
-from infrastructure.onemap_service import OneMapService
 from application.travelling_salesman.use_cases.load_locations_use_case import LoadLocationsUseCase
 from application.vehicle_time_windows.use_cases.get_optimal_routes_with_time_windows_use_case import GetOptimalRoutesWithTimeWindowsUseCase
 from application.vehicle_time_windows.services.route_planning_service import RoutePlanningService
@@ -10,17 +6,10 @@ from interface.travelling_salesman.dto.location_dto import LocationDTO
 from interface.travelling_salesman.dto.route_dto import RouteDTO
 from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
 from domain.vehicle_time_windows.entities.vehicle import Vehicle
-from infrastructure.matrix_service import MatrixService
-from infrastructure.vehicle_variable_service import VehicleVariableService
-from infrastructure.job_service import JobService
-from infrastructure.solution_processor_service import SolutionProcessorService
 from domain.travelling_salesman.entities.location import Location
 from domain.travelling_salesman.value_objects.address import Address
 from domain.travelling_salesman.value_objects.coordinates import Coordinates
 
-# Load environment variables
-load_dotenv()
-
 def get_args(debug: bool = False) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Vehicle Routing with Time Windows Solver")
     
@@ -55,6 +44,53 @@ def get_args(debug: bool = False) -> argparse.Namespace:
         default="duration",
         help="Type of matrix to use for optimization"
     )
+    parser.add_argument(
+        "--matrix_mode",
+        type=str,
+        choices=["onemap", "estimated", "sparse"],
+        default="onemap",
+        help="Route matrices from OneMap, estimated from straight-line distances calibrated on cached routes, "
+             "or sparse (route only nearest neighbours and depot pairs, estimate the rest)"
+    )
+    parser.add_argument(
+        "--map_renderer",
+        type=str,
+        choices=["folium", "geojson"],
+        default="folium",
+        help="Map renderer: folium markers per leg, or one lightweight GeoJSON layer per vehicle for large plans. "
+             "With geojson, plans over 500 stops start with the vehicle layers hidden; this only hides them, "
+             "all route data is still embedded in the HTML file"
+    )
+    parser.add_argument(
+        "--k_nearest",
+        type=int,
+        default=10,
+        help="Number of nearest neighbours routed per location in sparse matrix mode"
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=None,
+        help="Wall-clock budget for the solve in seconds; lowers the exploration level to fit and stops the solver"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of solver threads (default: all available cores)"
+    )
+    parser.add_argument(
+        "--portfolio_workers",
+        type=int,
+        default=0,
+        help="Run this many differently configured solves in parallel processes and keep the best (0: single solve)"
+    )
+    parser.add_argument(
+        "--cluster_size",
+        type=int,
+        default=0,
+        help="Split the jobs into geographic clusters of about this many and solve them in parallel (0: no clustering)"
+    )
     
     if debug:
         # Return default debug values
@@ -67,6 +103,22 @@ def get_args(debug: bool = False) -> argparse.Namespace:
 
 
 def main(args: argparse.Namespace) -> None:
+    # Infrastructure pulls in vroom, numpy, pandas and requests; import it only when solving
+    from dotenv import load_dotenv
+    from infrastructure.travelling_salesman.repositories.excel_location_repository import ExcelLocationRepository
+    from infrastructure.vehicle_time_windows.services.vroom_time_window_optimizer_service import VroomTimeWindowOptimizerService
+    from infrastructure.vehicle_time_windows.services.cluster_decomposition_optimizer_service import ClusterDecompositionOptimizerService
+    from infrastructure.onemap_service import OneMapService
+    from infrastructure.matrix_service import MatrixService
+    from infrastructure.vehicle_variable_service import VehicleVariableService
+    from infrastructure.job_service import JobService
+    from infrastructure.solution_processor_service import SolutionProcessorService
+    from infrastructure.solve_policy import SolvePolicy
+    from infrastructure.solver_portfolio import SolverPortfolio
+
+    # Load environment variables
+    load_dotenv()
+
     print(f"Processing file: {args.file_path}")
     print(f"Number of vehicles: {args.num_vehicles}")
     print(f"Time window: {args.time_window_hours} hours")
@@ -85,9 +137,9 @@ def main(args: argparse.Namespace) -> None:
     ]
     
     # Initialize repository and services
-    location_repository = ExcelLocationRepository(args.file_path)
     onemap_service = OneMapService()
-    matrix_service = MatrixService(onemap_service)
+    location_repository = ExcelLocationRepository(args.file_path, onemap_service)
+    matrix_service = MatrixService(onemap_service, mode=args.matrix_mode, k_nearest=args.k_nearest)
     vehicle_service = VehicleVariableService()
     job_service = JobService()
     solution_processor_service = SolutionProcessorService()
@@ -107,12 +159,25 @@ def main(args: argparse.Namespace) -> None:
     )
     
     # Initialize optimizer with services
-    route_optimizer = VroomTimeWindowOptimizerService(
-        matrix_service,
-        vehicle_service,
-        job_service,
-        solution_processor_service
-    )
+    solve_policy = SolvePolicy(time_budget=args.time_budget, threads=args.threads)
+    if args.cluster_size > 0:
+        route_optimizer = ClusterDecompositionOptimizerService(
+            matrix_service,
+            vehicle_service,
+            job_service,
+            solution_processor_service,
+            solve_policy,
+            cluster_size=args.cluster_size
+        )
+    else:
+        route_optimizer = VroomTimeWindowOptimizerService(
+            matrix_service,
+            vehicle_service,
+            job_service,
+            solution_processor_service,
+            solve_policy,
+            SolverPortfolio(args.portfolio_workers, solve_policy) if args.portfolio_workers > 0 else None
+        )
     
     # Initialize use cases
     load_locations_use_case = LoadLocationsUseCase(location_repository)
@@ -162,7 +227,10 @@ def main(args: argparse.Namespace) -> None:
         routes_for_plotting.append(route.locations)
     
     # Plot all routes at once
-    onemap_service.plot_routes(routes_for_plotting, args.output_file)
+    failed_legs = onemap_service.plot_routes(routes_for_plotting, args.output_file, renderer=args.map_renderer)
+    for failure in failed_legs:
+        print(f"  Could not plot route {failure.route_index}, leg {failure.leg_index} "
+              f"({failure.start_location.id} -> {failure.end_location.id}): {failure.error}")
     
     print(f"\nRoute map has been generated: {args.output_file}")
 
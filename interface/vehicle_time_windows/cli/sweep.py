@@ -0,0 +1,159 @@
+import argparse
+from application.travelling_salesman.use_cases.load_locations_use_case import LoadLocationsUseCase
+from domain.travelling_salesman.entities.location import Location
+from domain.travelling_salesman.value_objects.address import Address
+
+def get_args(debug: bool = False) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fleet size and time window sweep for the Vehicle Routing with Time Windows Solver")
+
+    parser.add_argument(
+        "--file_path",
+        type=str,
+        default="store/data/travelling_salesman.xlsx",
+        help="Path to the Excel file containing locations"
+    )
+    parser.add_argument(
+        "--search",
+        type=str,
+        choices=["grid", "smallest_fleet"],
+        default="grid",
+        help="Solve every combination of --fleet_sizes and --time_window_hours, "
+             "or search the smallest fleet assigning every job for each window length"
+    )
+    parser.add_argument(
+        "--fleet_sizes",
+        type=int,
+        nargs="+",
+        default=[5, 10, 15, 20],
+        help="Numbers of vehicles to solve in grid search"
+    )
+    parser.add_argument(
+        "--max_vehicles",
+        type=int,
+        default=50,
+        help="Largest fleet size considered by the smallest fleet search"
+    )
+    parser.add_argument(
+        "--time_window_hours",
+        type=float,
+        nargs="+",
+        default=[2.0],
+        help="Time window lengths in hours"
+    )
+    parser.add_argument(
+        "--matrix_type",
+        type=str,
+        choices=["duration", "distance"],
+        default="duration",
+        help="Type of matrix to use for optimization"
+    )
+    parser.add_argument(
+        "--matrix_mode",
+        type=str,
+        choices=["onemap", "estimated", "sparse"],
+        default="onemap",
+        help="Route matrices from OneMap, estimated from straight-line distances calibrated on cached routes, "
+             "or sparse (route only nearest neighbours and depot pairs, estimate the rest)"
+    )
+    parser.add_argument(
+        "--k_nearest",
+        type=int,
+        default=10,
+        help="Number of nearest neighbours routed per location in sparse matrix mode"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel solves (default: all available cores)"
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        default=None,
+        help="Wall-clock budget of each solve in seconds"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Total number of solver threads shared by the parallel solves (default: all available cores)"
+    )
+
+    if debug:
+        # Return default debug values
+        return parser.parse_args([
+            "--fleet_sizes", "3", "5", "10",
+            "--time_window_hours", "1.0", "2.0"
+        ])
+
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    # Infrastructure pulls in vroom, numpy, pandas and requests; import it only when solving
+    from dotenv import load_dotenv
+    from infrastructure.travelling_salesman.repositories.excel_location_repository import ExcelLocationRepository
+    from infrastructure.vehicle_time_windows.services.parameter_sweep_service import ParameterSweepService
+    from infrastructure.onemap_service import OneMapService
+    from infrastructure.matrix_service import MatrixService
+    from infrastructure.vehicle_variable_service import VehicleVariableService
+    from infrastructure.job_service import JobService
+    from infrastructure.solve_policy import SolvePolicy
+
+    # Load environment variables
+    load_dotenv()
+
+    print(f"Processing file: {args.file_path}")
+    print(f"Time windows: {args.time_window_hours} hours")
+
+    # Initialize repository and services
+    onemap_service = OneMapService()
+    location_repository = ExcelLocationRepository(args.file_path, onemap_service)
+    matrix_service = MatrixService(onemap_service, mode=args.matrix_mode, k_nearest=args.k_nearest)
+
+    # Set default depot location
+    depot_coords = onemap_service.get_coordinates("338729")
+    if not depot_coords:
+        raise ValueError("Could not get coordinates for depot postal code 338729")
+
+    depot_location = Location(
+        id=0,  # Use 0 for depot
+        coordinates=depot_coords,  # Already a Coordinates object
+        address=Address(
+            postal_code="338729",
+            full_address="Default Depot (338729)",
+        )
+    )
+
+    # Load the locations and build the matrix once for every setting
+    delivery_locations = LoadLocationsUseCase(location_repository).execute()
+    all_locations = [depot_location] + delivery_locations
+    duration_matrix, distance_matrix = matrix_service.get_matrices(all_locations, args.matrix_type)
+    solver_matrix = duration_matrix if args.matrix_type == "duration" else distance_matrix
+
+    sweep_service = ParameterSweepService(
+        VehicleVariableService(),
+        JobService(),
+        SolvePolicy(time_budget=args.time_budget, threads=args.threads),
+        workers=args.workers
+    )
+
+    if args.search == "grid":
+        results = sweep_service.grid(
+            all_locations, depot_location, solver_matrix, args.fleet_sizes, args.time_window_hours)
+        print("\nSweep Results:")
+        sweep_service.print_results(results)
+    else:
+        smallest = sweep_service.smallest_fleet(
+            all_locations, depot_location, solver_matrix, args.max_vehicles, args.time_window_hours)
+        print("\nSmallest Fleet Assigning Every Job:")
+        sweep_service.print_results([result for result in smallest.values() if result is not None])
+        for hours, result in smallest.items():
+            if result is None:
+                print(f"  {hours} hours: {args.max_vehicles} vehicles leave jobs unassigned")
+
+
+if __name__ == "__main__":
+    args = get_args(debug=True)
+    main(args)
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+import helper.onemap as onemap
+import infrastructure.vehicle_time_windows.services.cluster_decomposition_optimizer_service as decomposition
+from domain.travelling_salesman.entities.location import Location
+from domain.travelling_salesman.value_objects.address import Address
+from domain.travelling_salesman.value_objects.coordinates import Coordinates
+from domain.vehicle_time_windows.entities.vehicle import Vehicle
+from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
+from infrastructure.job_service import JobService
+from infrastructure.matrix_service import MatrixService
+from infrastructure.onemap_service import OneMapService
+from infrastructure.solution_processor_service import SolutionProcessorService
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
+from infrastructure.vehicle_time_windows.services.cluster_decomposition_optimizer_service import (
+    ClusterDecompositionOptimizerService, allocate_vehicles, neighbour_pairs
+)
+from tests.test_matrix_builder import FakeRouter, expected_matrices
+
+LOCATIONS = [(1.30, 103.80), (1.31, 103.81), (1.32, 103.83), (1.34, 103.84)]
+
+
+def test_vehicles_follow_the_workload():
+    assert allocate_vehicles(np.array([10, 30, 60]), 10).tolist() == [2, 3, 5]
+    assert allocate_vehicles(np.array([0, 0]), 5).tolist() == [1, 1]
+
+
+def test_neighbour_pairs_are_disjoint():
+    centres = np.array([[1.30, 103.80], [1.301, 103.80], [1.40, 103.90], [1.401, 103.90]])
+    assert neighbour_pairs(centres) == [(0, 1), (2, 3)]
+    assert neighbour_pairs(centres[:1]) == []
+
+
+@pytest.fixture
+def query(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    onemap_query = onemap.OneMapQuery(capture_geometry=False)
+    onemap_query.get_route = FakeRouter()
+    return onemap_query
+
+
+def test_local_matrices_leave_the_store_unchanged(query):
+    query.get_route_matrices(LOCATIONS[:2], progress_callback=lambda done, total: None)
+    router = query.get_route
+    router.calls.clear()
+
+    duration_matrix, _ = query.get_local_route_matrices(LOCATIONS, progress_callback=lambda done, total: None)
+    assert (duration_matrix == expected_matrices(LOCATIONS)[0]).all()
+    assert len(router.calls) == 5  # every pair but the stored one
+    assert query.matrix_store.size == 2
+
+
+def two_town_instance():
+    rng = np.random.default_rng(0)
+    latlongs = [(1.35, 103.85)]
+    for centre in [(1.30, 103.70), (1.40, 104.00)]:
+        latlongs.extend(map(tuple, centre + rng.normal(0, 0.005, (6, 2))))
+    locations = [
+        Location(i, Address(f"{i:06d}", f"Address {i}"), Coordinates(latitude, longitude))
+        for i, (latitude, longitude) in enumerate(latlongs)
+    ]
+    vehicles = [Vehicle(i, TimeWindow(0, 86400)) for i in range(1, 5)]
+    return locations, vehicles
+
+
+def optimizer(query, time_budget):
+    return ClusterDecompositionOptimizerService(
+        MatrixService(OneMapService(query), mode="estimated"),
+        VehicleTimeWindowService(),
+        JobService(),
+        SolutionProcessorService(),
+        SolvePolicy(time_budget=time_budget, threads=2),
+        cluster_size=6,
+        workers=2
+    )
+
+
+def visited_jobs(routes):
+    return sorted(location.id for route in routes for location in route.locations[1:-1])
+
+
+def test_time_budget_is_split_between_clusters_and_repair(query, monkeypatch):
+    timeouts = []
+    solve_plans = ClusterDecompositionOptimizerService._solve_plans
+
+    def recording_solve_plans(self, plans, depot_location, seeded, seeds=None, timeout=None):
+        timeouts.append((seeded, timeout))
+        return solve_plans(self, plans, depot_location, seeded, seeds, timeout)
+
+    monkeypatch.setattr(ClusterDecompositionOptimizerService, "_solve_plans", recording_solve_plans)
+    locations, vehicles = two_town_instance()
+    routes = optimizer(query, time_budget=10).optimize_routes(locations, vehicles)
+
+    assert visited_jobs(routes) == list(range(1, 13))
+    assert timeouts[0] == (False, 10 * decomposition.CLUSTER_BUDGET_SHARE)
+    # The repair gets what the clusters left of the budget, never the whole budget again
+    assert timeouts[1][0] and 10 * (1 - decomposition.CLUSTER_BUDGET_SHARE) < timeouts[1][1] < 10
+
+    # Too little time left for the repair
+    timeouts.clear()
+    optimizer(query, time_budget=1).optimize_routes(locations, vehicles)
+    assert [seeded for seeded, _ in timeouts] == [False]
+
+
+def failing_solve(definition, solver_matrix, parameters):
+    raise RuntimeError("solver crashed")
+
+
+def test_failed_cluster_falls_back_to_the_full_instance(query, monkeypatch):
+    monkeypatch.setattr(decomposition, "_solve_definition", failing_solve)
+    locations, vehicles = two_town_instance()
+    routes = optimizer(query, time_budget=10).optimize_routes(locations, vehicles)
+    assert visited_jobs(routes) == list(range(1, 13))
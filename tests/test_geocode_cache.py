@@ -0,0 +1,66 @@
+import time
+import helper.onemap as onemap
+from helper.geocode_cache import GeocodeCache, GeocodeRecord, normalise_postal_code
+
+
+def test_postal_codes_are_normalised():
+    assert normalise_postal_code(18906) == normalise_postal_code(" 018906") == "018906"
+    assert normalise_postal_code("S123") == "S123"
+
+
+def test_records_are_visible_before_and_after_flush(tmp_path):
+    cache = GeocodeCache(tmp_path / "geocode.sqlite", batch_size=10)
+    cache.put(GeocodeRecord("018906", 1.28, 103.85, "10 Bayfront Avenue", time.time()))
+    assert cache.get(18906).latlong == (1.28, 103.85)
+
+    cache.flush()
+    assert GeocodeCache(tmp_path / "geocode.sqlite").get("018906").address == "10 Bayfront Avenue"
+
+
+def test_not_found_expires(tmp_path):
+    cache = GeocodeCache(tmp_path / "geocode.sqlite", not_found_ttl=60)
+    cache.put(GeocodeRecord("000001", None, None, None, time.time()))
+    cache.put(GeocodeRecord("000002", None, None, None, time.time() - 120))
+    assert not cache.get("000001").found
+    assert cache.get("000002") is None
+
+
+def test_legacy_dict_is_imported_once(tmp_path):
+    (tmp_path / "postal_dict.yaml").write_text("'18906': [1.28, 103.85]\n")
+    cache = GeocodeCache(tmp_path / "geocode.sqlite", legacy_dict_path=tmp_path / "postal_dict.yaml")
+    assert cache.get("018906").latlong == (1.28, 103.85)
+
+    (tmp_path / "postal_dict.yaml").write_text("'18906': [0.0, 0.0]\n")
+    cache = GeocodeCache(tmp_path / "geocode.sqlite", legacy_dict_path=tmp_path / "postal_dict.yaml")
+    assert cache.get("018906").latlong == (1.28, 103.85)
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self._content = content
+
+    def json(self):
+        return self._content
+
+
+class FakeHttp:
+    """OneMap search stand-in counting requests"""
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, priority=None):
+        self.urls.append(url)
+        return FakeResponse({"found": 1, "results": [
+            {"LATITUDE": "1.28", "LONGITUDE": "103.85", "ADDRESS": "10 Bayfront Avenue"}
+        ]})
+
+
+def test_search_is_answered_from_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    query = onemap.OneMapQuery(capture_geometry=False)
+    query.http = FakeHttp()
+
+    assert query.get_postal_latlong("18906") == (1.28, 103.85)
+    assert query.get_postal_latlong("018906") == (1.28, 103.85)
+    assert len(query.http.urls) == 1
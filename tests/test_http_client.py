@@ -0,0 +1,79 @@
+import pytest
+import requests
+import helper.http_client as http_client
+from helper.http_client import OneMapHttpClient
+from helper.rate_limiter import TokenBucketRateLimiter
+
+URL = "https://www.onemap.gov.sg/api/public/routingsvc/route"
+
+
+def response(status_code, headers=None):
+    result = requests.Response()
+    result.status_code = status_code
+    result.headers.update(headers or {})
+    result.url = URL
+    return result
+
+
+class ScriptedSession:
+    """Session stand-in answering requests from a list of responses or exceptions"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.headers = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.headers.append(headers)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(http_client.time, "sleep", delays.append)
+    return delays
+
+
+def client(answers, token_provider=None, max_retries=4):
+    http = OneMapHttpClient(TokenBucketRateLimiter(calls_per_minute=6000, burst=100),
+                            token_provider=token_provider, max_retries=max_retries, backoff_base=0.5)
+    http._session = ScriptedSession(answers)
+    return http
+
+
+def test_retries_honour_retry_after(sleeps):
+    http = client([response(429, {"Retry-After": "3"}), requests.exceptions.ConnectionError(), response(503),
+                   response(200)])
+    assert http.get(URL).status_code == 200
+    assert sleeps[0] == 3.0
+    # Jittered exponential backoff: half the delay plus up to the other half
+    assert 0.5 <= sleeps[1] <= 1.0 and 1.0 <= sleeps[2] <= 2.0
+
+
+def test_gives_up_after_max_retries(sleeps):
+    http = client([response(500)] * 3, max_retries=2)
+    with pytest.raises(requests.exceptions.HTTPError):
+        http.get(URL)
+    assert len(sleeps) == 2
+
+
+def test_401_refreshes_the_token_once(sleeps):
+    tokens = ["old"]
+
+    def token_provider(force_refresh):
+        if force_refresh:
+            tokens.append(f"new{len(tokens)}")
+        return tokens[-1]
+
+    http = client([response(401), response(200)], token_provider)
+    assert http.get(URL, auth=True).status_code == 200
+    assert [headers["Authorization"] for headers in http._session.headers] == ["old", "new1"]
+
+    http = client([response(401), response(401)], token_provider)
+    with pytest.raises(requests.exceptions.HTTPError):
+        http.get(URL, auth=True)
+    assert tokens == ["old", "new1", "new2"]
+    assert sleeps == []
@@ -0,0 +1,31 @@
+import numpy as np
+from helper.location_index import LocationIndex, location_keys
+
+
+def test_quantised_coordinates_share_a_row():
+    index = LocationIndex.build([(1.319728, 103.8421), (1.2997289, 103.8421581)], ["338729", None])
+    rows = index.lookup([(1.3197280, 103.84210), (1.29972894, 103.84215806), (1.3, 103.8)])
+    assert rows.tolist() == [0, 1, -1]
+    assert index.lookup_postal_codes(["338729", "000000"]).tolist() == [0, -1]
+
+
+def test_keys_are_distinct_per_coordinate():
+    latlongs = np.array([(1.3, 103.8), (1.300001, 103.8), (1.3, 103.800001), (-1.3, -103.8)])
+    assert len(set(location_keys(latlongs).tolist())) == 4
+
+
+def test_save_and_load(tmp_path):
+    index = LocationIndex.build([(1.3, 103.8), (1.4, 103.9)], [None, "123456"])
+    index.save(tmp_path / "keys.npy", tmp_path / "postal_codes.json")
+    loaded = LocationIndex.load(tmp_path / "keys.npy", tmp_path / "postal_codes.json")
+    assert loaded.lookup([(1.4, 103.9)]).tolist() == [1]
+    assert loaded.postal_codes == {"123456": 1}
+
+
+def test_store_lookup_uses_the_index(tmp_path):
+    from helper.matrix_store import MatrixStore
+
+    store = MatrixStore(tmp_path)
+    store.write([(1.3, 103.8), (1.4, 103.9)], np.zeros((2, 2)), np.zeros((2, 2)), ["111111", None])
+    assert store.lookup([(1.4000001, 103.9), (1.5, 104.0)]).tolist() == [1, -1]
+    assert store.index.lookup_postal_codes(["111111"]).tolist() == [0]
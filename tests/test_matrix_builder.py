@@ -0,0 +1,156 @@
+import threading
+import numpy as np
+import pytest
+import helper.onemap as onemap
+from domain.travelling_salesman.entities.location import Location
+from domain.travelling_salesman.value_objects.address import Address
+from domain.travelling_salesman.value_objects.coordinates import Coordinates
+from helper.matrix_builder import RouteMatrixBuilder, RoutePairsFailed, order_pairs
+from helper.matrix_journal import MatrixJournal
+from helper.matrix_store import NO_ROUTE
+from infrastructure.matrix_service import MatrixService
+from infrastructure.onemap_service import OneMapService
+
+LOCATIONS = [(1.30, 103.80), (1.31, 103.81), (1.32, 103.83), (1.34, 103.84)]
+
+
+class FakeRouter:
+    """OneMap routing stand-in: travel time follows the coordinates, failing legs raise, unroutable legs have no route"""
+
+    def __init__(self):
+        self.failing = set()
+        self.unroutable = set()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, start, end, priority=None):
+        with self._lock:
+            self.calls.append((start, end))
+        if (start, end) in self.failing or (end, start) in self.failing:
+            raise ConnectionError("retries exhausted")
+        if (start, end) in self.unroutable or (end, start) in self.unroutable:
+            return {"status": 1}
+        metres = round((abs(start[0] - end[0]) + abs(start[1] - end[1])) * 1e5)
+        return {"status": 0, "route_summary": {"total_time": metres // 10, "total_distance": metres}}
+
+
+def expected_matrices(locations):
+    latlongs = np.asarray(locations)
+    metres = np.rint((np.abs(latlongs[:, None] - latlongs[None]).sum(axis=2)) * 1e5)
+    return metres // 10, metres
+
+
+def test_depot_pairs_first_then_nearest():
+    pairs = [(1, 2), (2, 3), (1, 3), (0, 3), (0, 1)]
+    ordered = order_pairs(LOCATIONS, pairs, priority_indices=(0,))
+    assert set(ordered[:2]) == {(0, 3), (0, 1)}
+    assert ordered[2:] == [(1, 2), (2, 3), (1, 3)]
+
+
+def test_build_fills_both_directions():
+    router = FakeRouter()
+    progress = []
+    builder = RouteMatrixBuilder(router, max_workers=3, progress_callback=lambda done, total: progress.append(done))
+
+    duration_matrix, distance_matrix = builder.build(LOCATIONS)
+    expected_durations, expected_distances = expected_matrices(LOCATIONS)
+    assert (duration_matrix == expected_durations).all()
+    assert (distance_matrix == expected_distances).all()
+    assert len(router.calls) == builder.queried_pairs == 6
+    assert sorted(progress) == list(range(1, 7))
+
+
+def test_failed_pair_is_not_filled(tmp_path):
+    router = FakeRouter()
+    router.failing.add((LOCATIONS[1], LOCATIONS[3]))
+    journal = MatrixJournal(tmp_path / "journal.bin")
+    builder = RouteMatrixBuilder(router, max_workers=2, journal=journal)
+
+    duration_matrix, _ = builder.build(LOCATIONS)
+    assert builder.failed_pairs == [(1, 3)]
+    assert np.isnan(duration_matrix[1, 3]) and np.isnan(duration_matrix[3, 1])
+    assert np.isnan(duration_matrix).sum() == 2
+    with pytest.raises(RoutePairsFailed):
+        builder.raise_on_failed_pairs()
+
+    # A rerun takes the journaled pairs and queries only the failed one
+    router.failing.clear()
+    router.calls.clear()
+    builder = RouteMatrixBuilder(router, max_workers=2, journal=journal)
+    duration_matrix, _ = builder.build(LOCATIONS)
+    assert router.calls == [(LOCATIONS[1], LOCATIONS[3])]
+    assert (duration_matrix == expected_matrices(LOCATIONS)[0]).all()
+
+
+def test_no_route_pair_is_journaled_and_not_failed(tmp_path):
+    router = FakeRouter()
+    router.unroutable.add((LOCATIONS[0], LOCATIONS[2]))
+    journal = MatrixJournal(tmp_path / "journal.bin")
+    builder = RouteMatrixBuilder(router, max_workers=2, journal=journal)
+
+    duration_matrix, _ = builder.build(LOCATIONS, no_route_value=NO_ROUTE)
+    assert builder.failed_pairs == []
+    assert builder.no_route_pairs == [(0, 2)]
+    assert duration_matrix[0, 2] == duration_matrix[2, 0] == NO_ROUTE
+    builder.raise_on_failed_pairs()
+
+    router.calls.clear()
+    builder = RouteMatrixBuilder(router, max_workers=2, journal=journal)
+    builder.build(LOCATIONS)
+    assert router.calls == []
+    assert builder.no_route_pairs == [(0, 2)]
+
+
+@pytest.fixture
+def query(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    onemap_query = onemap.OneMapQuery(capture_geometry=False)
+    onemap_query.get_route = FakeRouter()
+    return onemap_query
+
+
+def test_failed_pairs_are_requeried_from_the_store(query):
+    router = query.get_route
+    router.failing.add((LOCATIONS[0], LOCATIONS[2]))
+    with pytest.raises(RoutePairsFailed):
+        query.get_route_matrices(LOCATIONS[:3], progress_callback=lambda done, total: None)
+
+    router.failing.add((LOCATIONS[3], LOCATIONS[1]))
+    with pytest.raises(RoutePairsFailed):
+        query.get_route_matrices(LOCATIONS, progress_callback=lambda done, total: None)
+
+    router.failing.clear()
+    router.calls.clear()
+    duration_matrix, _ = query.get_route_matrices(LOCATIONS, progress_callback=lambda done, total: None)
+    assert sorted(router.calls) == sorted([(LOCATIONS[0], LOCATIONS[2]), (LOCATIONS[1], LOCATIONS[3])])
+    assert (duration_matrix == expected_matrices(LOCATIONS)[0]).all()
+
+    router.calls.clear()
+    query.get_route_matrices(LOCATIONS)
+    assert router.calls == []
+
+
+def test_no_route_pairs_are_stored_and_estimated(query):
+    router = query.get_route
+    router.unroutable.add((LOCATIONS[1], LOCATIONS[3]))
+    duration_matrix, distance_matrix = query.get_route_matrices(LOCATIONS, progress_callback=lambda done, total: None)
+    assert query.matrix_store.pair_values([1], [3])[0][0] == NO_ROUTE
+    assert duration_matrix[1, 3] == duration_matrix[3, 1] > 0
+    assert distance_matrix[1, 3] > 0
+
+    # Permanent: the next request neither queries nor raises
+    router.calls.clear()
+    query.get_route_matrices(LOCATIONS)
+    query.get_local_route_matrices(LOCATIONS[1:], progress_callback=lambda done, total: None)
+    assert router.calls == []
+
+
+def test_matrix_service_estimates_failed_pairs(query):
+    query.get_route.failing.add((LOCATIONS[0], LOCATIONS[3]))
+    locations = [
+        Location(i, Address(f"{i:06d}", f"Address {i}"), Coordinates(latitude, longitude))
+        for i, (latitude, longitude) in enumerate(LOCATIONS)
+    ]
+    duration_matrix, _ = MatrixService(OneMapService(query)).get_matrices(locations, "duration")
+    assert duration_matrix[0, 3] == duration_matrix[3, 0] > 0
+    assert duration_matrix[1, 2] == expected_matrices(LOCATIONS)[0][1, 2]
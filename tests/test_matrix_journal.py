@@ -0,0 +1,28 @@
+from helper.matrix_journal import JOURNAL_RECORD, MatrixJournal
+
+
+def test_torn_record_is_ignored_and_dropped(tmp_path):
+    path = tmp_path / "journal.bin"
+    journal = MatrixJournal(path)
+    journal.append(1, 2, 30.0, 400.0)
+    journal.append(2, 3, 50.0, 600.0)
+    journal.close()
+
+    # A crash in the middle of writing the third record
+    with open(path, "ab") as fp:
+        fp.write(b"\x01" * (JOURNAL_RECORD.itemsize // 2))
+    assert MatrixJournal(path).load() == {(1, 2): (30.0, 400.0), (2, 3): (50.0, 600.0)}
+
+    # New records stay aligned after the torn one
+    journal = MatrixJournal(path)
+    journal.append(3, 4, 70.0, 800.0)
+    journal.close()
+    assert path.stat().st_size == 3 * JOURNAL_RECORD.itemsize
+    assert MatrixJournal(path).load()[(3, 4)] == (70.0, 800.0)
+
+
+def test_clear_removes_journal(tmp_path):
+    journal = MatrixJournal(tmp_path / "journal.bin")
+    journal.append(1, 2, 30.0, 400.0)
+    journal.clear()
+    assert journal.load() == {}
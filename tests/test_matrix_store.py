@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from helper.matrix_store import MISSING, MatrixStore
+
+
+def random_instance(size, seed=0):
+    rng = np.random.default_rng(seed)
+    locations = np.column_stack((rng.uniform(1.2, 1.45, size), rng.uniform(103.6, 104.0, size)))
+    durations = np.triu(rng.integers(1, 3600, (size, size)), 1).astype(np.float64)
+    durations += durations.T
+    return locations, durations, durations * 8
+
+
+@pytest.mark.parametrize("packed", [True, False])
+def test_round_trip(tmp_path, packed):
+    locations, durations, distances = random_instance(9)
+    store = MatrixStore(tmp_path, packed=packed)
+    store.write(locations, durations, distances)
+
+    rows = np.array([4, 0, 7, 7, 2])
+    duration_matrix, distance_matrix = MatrixStore(tmp_path, packed=packed).submatrices(rows)
+    assert duration_matrix.dtype == np.int32
+    assert (duration_matrix == durations[np.ix_(rows, rows)]).all()
+    assert (distance_matrix == distances[np.ix_(rows, rows)]).all()
+    assert (store.pair_values([1, 8], [8, 3])[0] == durations[[1, 8], [8, 3]]).all()
+    assert (store.lookup(locations[::-1]) == np.arange(9)[::-1]).all()
+
+
+@pytest.mark.parametrize("packed", [True, False])
+def test_extend_matches_full_write(tmp_path, packed):
+    locations, durations, distances = random_instance(10, seed=1)
+    durations[2, 8] = durations[8, 2] = np.nan
+    codes = [f"{100000 + row}" for row in range(10)]
+
+    full = MatrixStore(tmp_path / "full", packed=packed)
+    full.write(locations, durations, distances, codes)
+    extended = MatrixStore(tmp_path / "extended", packed=packed)
+    extended.write(locations[:6], durations[:6, :6], distances[:6, :6], codes[:6])
+    extended.extend(locations[6:], durations[6:], distances[6:], codes[6:])
+
+    rows = np.arange(10)
+    for expected, actual in zip(full.submatrices(rows), extended.submatrices(rows)):
+        assert (expected == actual).all()
+    assert extended.submatrices([2, 8])[0][0, 1] == MISSING
+    assert extended.index.postal_codes == full.index.postal_codes
+
+
+def test_readers_keep_their_version(tmp_path):
+    locations, durations, distances = random_instance(4)
+    writer = MatrixStore(tmp_path)
+    writer.write(locations, durations, distances)
+    reader = MatrixStore(tmp_path)
+    before = reader.submatrices([0, 1])[0].copy()
+
+    writer.write(locations, durations * 2, distances)
+    # The reader re-opens the new version on its next access
+    assert (reader.submatrices([0, 1])[0] == before * 2).all()
+    assert reader.version == 2
+
+
+def test_update_pairs_fills_missing(tmp_path):
+    locations, durations, distances = random_instance(5)
+    durations[1, 3] = durations[3, 1] = np.nan
+    store = MatrixStore(tmp_path)
+    store.write(locations, durations, distances)
+    version = store.version
+
+    store.update_pairs([3], [1], [42.0], [420.0])
+    duration_matrix, distance_matrix = store.submatrices([1, 3])
+    assert duration_matrix.tolist() == [[0, 42], [42, 0]]
+    assert distance_matrix[0, 1] == 420
+    assert store.version == version + 1
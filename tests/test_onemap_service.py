@@ -0,0 +1,34 @@
+import threading
+import time
+import requests
+import helper.onemap as onemap
+from helper.geocode_cache import GeocodeRecord
+from infrastructure.onemap_service import OneMapService
+
+
+def test_bulk_geocoding_searches_each_miss_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    query = onemap.OneMapQuery(capture_geometry=False)
+    query.geocode_cache.put(GeocodeRecord("000001", 1.30, 103.80, None, time.time()))
+
+    searched = []
+    lock = threading.Lock()
+
+    def search_postal(postal_code, require_address=False):
+        with lock:
+            searched.append(postal_code)
+        if postal_code == "000003":
+            raise requests.exceptions.ConnectionError("retries exhausted")
+        if postal_code == "000004":
+            return GeocodeRecord(postal_code, None, None, None, time.time())
+        return GeocodeRecord(postal_code, 1.31, 103.81, None, time.time())
+
+    query.search_postal = search_postal
+    results = OneMapService(query).get_coordinates_many(["1", "000002", "2", "3", "4"], max_workers=3)
+
+    assert sorted(searched) == ["000002", "000003", "000004"]
+    assert [result.postal_code for result in results] == ["000001", "000002", "000002", "000003", "000004"]
+    assert results[0].coordinates.latitude == 1.30
+    assert results[1].coordinates == results[2].coordinates
+    assert results[3].coordinates is None and "retries exhausted" in results[3].error
+    assert results[4].coordinates is None and results[4].error == "not found"
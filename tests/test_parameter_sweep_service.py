@@ -0,0 +1,41 @@
+import numpy as np
+from domain.travelling_salesman.entities.location import Location
+from domain.travelling_salesman.value_objects.address import Address
+from domain.travelling_salesman.value_objects.coordinates import Coordinates
+from infrastructure.job_service import JobService
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
+from infrastructure.vehicle_time_windows.services.parameter_sweep_service import ParameterSweepService
+
+
+def instance(jobs=4):
+    """Every job is 1000 s from the depot and 5000 s from the other jobs"""
+    locations = [
+        Location(i, Address(f"{i:06d}", f"Address {i}"), Coordinates(1.3 + i * 0.01, 103.8))
+        for i in range(jobs + 1)
+    ]
+    matrix = np.full((jobs + 1, jobs + 1), 5000, dtype=np.int32)
+    matrix[0, :] = matrix[:, 0] = 1000
+    np.fill_diagonal(matrix, 0)
+    return locations, matrix
+
+
+def sweep_service():
+    return ParameterSweepService(VehicleTimeWindowService(), JobService(), SolvePolicy(threads=2), workers=2)
+
+
+def test_grid_solves_every_setting():
+    locations, matrix = instance()
+    results = sweep_service().grid(locations, locations[0], matrix, [2, 4], [1.0])
+    assert [(result.num_vehicles, result.unassigned) for result in results] == [(2, 2), (4, 0)]
+    assert results[1].total_time == 8000
+
+
+def test_smallest_fleet_per_window():
+    locations, matrix = instance()
+    smallest = sweep_service().smallest_fleet(locations, locations[0], matrix, 6, [0.5, 1.0, 4.0])
+    # Half an hour is shorter than any round trip, one hour fits one job, four hours fit three
+    assert smallest[0.5] is None
+    assert smallest[1.0].num_vehicles == 4
+    assert smallest[4.0].num_vehicles == 2
+    assert smallest[4.0].unassigned == 0
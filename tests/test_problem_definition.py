@@ -0,0 +1,35 @@
+import pickle
+import numpy as np
+import pytest
+import vroom
+from infrastructure.problem_definition import ProblemDefinition
+
+
+def test_attributes_survive_round_trip():
+    definition = ProblemDefinition()
+    definition.add_vehicle([
+        vroom.Vehicle(id=1, start=0, end=0, time_window=(0, 1000), skills={1}, capacity=[2]),
+        vroom.Vehicle(id=2, start=0, end=0, capacity=[2], max_tasks=3,
+                      breaks=[vroom.Break(id=1, time_windows=[(10, 20)], service=5)])
+    ])
+    definition.add_job([
+        vroom.Job(id=1, location=1, skills={1}, pickup=[1], priority=50),
+        vroom.Job(id=2, location=2, skills={2}, delivery=[1]),
+    ])
+    definition = pickle.loads(pickle.dumps(definition))
+
+    assert definition.vehicles[0].skills == {1}
+    assert definition.vehicles[1].max_tasks == 3
+    assert definition.vehicles[1].breaks[0].time_windows == ((10, 20),)
+    assert definition.jobs[0].pickup == (1,) and definition.jobs[0].priority == 50
+
+    # Job 2 needs a skill no vehicle has
+    matrix = np.full((3, 3), 10) - np.eye(3, dtype=int) * 10
+    solution = definition.to_input(matrix).solve(exploration_level=1, nb_threads=1)
+    assert len(solution.unassigned) == 1
+    assert solution.routes.loc[solution.routes["type"] == "job", "id"].tolist() == [1]
+
+
+def test_unsupported_attributes_raise():
+    with pytest.raises(ValueError):
+        ProblemDefinition().add_vehicle(vroom.Vehicle(id=1, start=0, costs=vroom.VehicleCosts(fixed=5)))
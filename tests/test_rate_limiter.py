@@ -0,0 +1,61 @@
+import multiprocessing
+import threading
+import time
+import pytest
+from helper.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimitTimeout, TokenBucketRateLimiter
+
+
+def limiter(state_path=None):
+    # Burst of 10, then one token per second
+    return TokenBucketRateLimiter(calls_per_minute=70, burst=10, state_path=state_path)
+
+
+def test_burst_then_timeout():
+    bucket = limiter()
+    for _ in range(10):
+        assert bucket.acquire(PRIORITY_INTERACTIVE, timeout=0) < 0.1
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(PRIORITY_INTERACTIVE, timeout=0.1)
+    assert bucket.get_metrics()["interactive"]["acquired"] == 10
+
+
+def test_bulk_leaves_a_reserve_for_interactive():
+    bucket = limiter()
+    for _ in range(8):
+        bucket.acquire(PRIORITY_BULK, timeout=0)
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(PRIORITY_BULK, timeout=0.1)
+    bucket.acquire(PRIORITY_INTERACTIVE, timeout=0)
+    bucket.acquire(PRIORITY_INTERACTIVE, timeout=0)
+
+
+def test_bulk_steps_aside_while_interactive_waits():
+    bucket = limiter()
+    for _ in range(10):
+        bucket.acquire(PRIORITY_INTERACTIVE)
+    waiter = threading.Thread(target=bucket.acquire, args=(PRIORITY_INTERACTIVE,))
+    waiter.start()
+    time.sleep(0.05)
+
+    # A token refills while the bulk caller waits, but it goes to the interactive waiter
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(PRIORITY_BULK, timeout=0.5)
+    waiter.join()
+    assert bucket.get_metrics()["interactive"]["acquired"] == 11
+
+
+def drain(state_path):
+    bucket = limiter(state_path)
+    for _ in range(10):
+        bucket.acquire(PRIORITY_INTERACTIVE, timeout=0)
+
+
+def test_processes_share_the_bucket(tmp_path):
+    state_path = tmp_path / "rate_limit"
+    child = multiprocessing.get_context().Process(target=drain, args=(state_path,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    with pytest.raises(RateLimitTimeout):
+        limiter(state_path).acquire(PRIORITY_INTERACTIVE, timeout=0.1)
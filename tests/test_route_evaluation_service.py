@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
+from infrastructure.route_evaluation_service import RouteEvaluationService
+
+
+@pytest.fixture
+def matrices():
+    rng = np.random.default_rng(0)
+    return rng.integers(1, 600, (8, 8)), rng.integers(1, 5000, (8, 8))
+
+
+def path_cost(matrix, path):
+    return int(sum(matrix[a, b] for a, b in zip(path, path[1:])))
+
+
+@pytest.mark.parametrize("paths", [
+    [[], [0, 1, 2, 0]],
+    [[0, 1, 2, 0], []],
+    [[], [], [0, 3, 0], [], [0, 4, 5, 6, 0], []],
+    [[2], [0, 1, 0]],
+])
+def test_evaluate_paths_with_empty_paths(matrices, paths):
+    duration_matrix, distance_matrix = matrices
+    costs = RouteEvaluationService(duration_matrix, distance_matrix).evaluate_paths(paths)
+    assert [cost.total_duration for cost in costs] == [path_cost(duration_matrix, path) for path in paths]
+    assert [cost.total_distance for cost in costs] == [path_cost(distance_matrix, path) for path in paths]
+
+
+def total(matrices, routes):
+    return tuple(sum(path_cost(matrix, [0] + route + [0]) for route in routes) for matrix in matrices)
+
+
+def test_move_deltas_match_brute_force(matrices):
+    routes = [[1, 2, 3], [4, 5, 6, 7]]
+    service = RouteEvaluationService(*matrices)
+    service.load_routes(routes)
+    before = total(matrices, routes)
+
+    def check(delta, moved):
+        after = total(matrices, moved)
+        assert (delta.duration_delta, delta.distance_delta) == (after[0] - before[0], after[1] - before[1])
+
+    for from_route, to_route in ((0, 0), (0, 1), (1, 0), (1, 1)):
+        for from_position in range(len(routes[from_route])):
+            moved = [list(route) for route in routes]
+            job = moved[from_route].pop(from_position)
+            for to_position in range(len(moved[to_route]) + 1):
+                inserted = [list(route) for route in moved]
+                inserted[to_route].insert(to_position, job)
+                check(service.relocate_delta(from_route, from_position, to_route, to_position), inserted)
+
+    for first_route, second_route in ((0, 0), (0, 1), (1, 1)):
+        for first_position in range(len(routes[first_route])):
+            for second_position in range(len(routes[second_route])):
+                if (first_route, first_position) == (second_route, second_position):
+                    continue
+                swapped = [list(route) for route in routes]
+                swapped[first_route][first_position], swapped[second_route][second_position] = (
+                    routes[second_route][second_position], routes[first_route][first_position])
+                check(service.swap_delta(first_route, first_position, second_route, second_position), swapped)
+
+    for route, jobs in enumerate(routes):
+        for start in range(len(jobs)):
+            for end in range(start + 1, len(jobs)):
+                reversed_routes = [list(route) for route in routes]
+                reversed_routes[route][start:end + 1] = jobs[start:end + 1][::-1]
+                check(service.two_opt_delta(route, start, end), reversed_routes)
+
+
+def test_time_window_feasibility(matrices):
+    duration_matrix, distance_matrix = matrices
+    route_duration = path_cost(duration_matrix, [0, 1, 2, 0])
+    windows = [TimeWindow(start=0, end=route_duration), TimeWindow(start=0, end=10 ** 6)]
+    service = RouteEvaluationService(duration_matrix, distance_matrix)
+    costs = service.load_routes([[1, 2], [3]], windows)
+    assert [cost.feasible for cost in costs] == [True, True]
+
+    # The first route has no slack left, so inserting job 3 fits only if it adds no time
+    delta = service.relocate_delta(1, 0, 0, 0)
+    assert delta.feasible == (path_cost(duration_matrix, [0, 3, 1, 2, 0]) <= route_duration)
@@ -0,0 +1,56 @@
+import polyline
+import helper.onemap as onemap
+from helper.route_geometry_cache import RouteGeometryCache
+
+START, END = (1.3197280, 103.8), (1.33, 103.81)
+
+
+def test_geometries_persist_per_route_type(tmp_path):
+    cache = RouteGeometryCache(tmp_path / "geometry.sqlite", batch_size=10)
+    cache.put(START, END, "abc")
+    cache.put(START, END, "walk", route_type="walk")
+    assert cache.get((1.319728, 103.8), END) == "abc"
+
+    cache.flush()
+    cache = RouteGeometryCache(tmp_path / "geometry.sqlite")
+    assert cache.get(START, END) == "abc"
+    assert cache.get(START, END, route_type="walk") == "walk"
+    assert cache.get(END, START) is None
+
+
+def test_get_many_reads_in_chunks(tmp_path):
+    cache = RouteGeometryCache(tmp_path / "geometry.sqlite", batch_size=100)
+    legs = [((1.3 + i * 1e-4, 103.8), END) for i in range(600)]
+    for i, (start, end) in enumerate(legs):
+        cache.put(start, end, f"leg{i}")
+    cache.flush()
+
+    found = cache.get_many(legs + [(END, START)])
+    assert len(found) == 600
+    assert found[legs[599]] == "leg599"
+
+
+class RouteCounter:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, start, end, priority=None):
+        self.calls.append((start, end))
+        return {"status": 0, "route_geometry": polyline.encode([start, end])}
+
+
+def test_plotting_reuses_cached_geometries(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    query = onemap.OneMapQuery(capture_geometry=False)
+    query.get_route = RouteCounter()
+    query.geometry_cache.put(START, END, polyline.encode([START, (1.325, 103.805), END]))
+
+    geometries, errors = query.get_route_geometries([(START, END), (END, START), (END, (1.34, 103.82))])
+    assert errors == {}
+    # The reverse leg is drawn from the cached one, only the new leg is routed
+    assert polyline.decode(geometries[(END, START)]) == [END, (1.325, 103.805), (1.31973, 103.8)]
+    assert query.get_route.calls == [(END, (1.34, 103.82))]
+
+    query.get_route.calls.clear()
+    query.get_route_geometries([(END, (1.34, 103.82))])
+    assert query.get_route.calls == []
@@ -0,0 +1,34 @@
+from helper.route_map import deduplicate_segments, render_geojson_map
+
+ROAD = [(1.30, 103.80), (1.301, 103.801), (1.302, 103.8025), (1.303, 103.803)]
+
+
+def test_shared_road_keeps_the_first_leg():
+    branch = ROAD[2:] + [(1.31, 103.81)]
+    leg_lines = deduplicate_segments([ROAD, None, ROAD[1:][::-1], branch])
+    assert leg_lines[0] == [ROAD]
+    assert leg_lines[1] == []
+    assert leg_lines[2] == []
+    assert leg_lines[3] == [[ROAD[3], (1.31, 103.81)]]
+
+
+def test_repeated_point_does_not_split_the_line():
+    leg = [ROAD[0], ROAD[1], ROAD[1], ROAD[2]]
+    assert deduplicate_segments([leg]) == [[leg]]
+
+
+def test_geojson_map_draws_shared_roads_in_the_first_colour(tmp_path):
+    output_file = tmp_path / "map.html"
+    vehicles = [([ROAD[0], ROAD[-1]], [ROAD]), ([ROAD[-1], ROAD[0]], [ROAD[::-1]])]
+    render_geojson_map(vehicles, str(output_file), colors=["#ff0000", "#0000ff"], tolerance_m=1000)
+    html = output_file.read_text()
+    assert "Shared roads" not in html
+    assert html.count("MultiLineString") == 1
+
+
+def test_hidden_layers_are_still_embedded(tmp_path):
+    output_file = tmp_path / "map.html"
+    render_geojson_map([([ROAD[0], ROAD[-1]], [ROAD])], str(output_file), colors=["#ff0000"], hidden_layers=True)
+    html = output_file.read_text()
+    assert "MultiLineString" in html
+    assert str(ROAD[1][1]) in html
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import vroom
+import infrastructure.solution_processor_service as solution_processor_service
+from infrastructure.solution_processor_service import STEP_COLUMNS, route_step_columns
+
+
+@pytest.fixture
+def solution():
+    problem_instance = vroom.Input()
+    matrix = np.array([[0, 5, 9, 7], [5, 0, 4, 6], [9, 4, 0, 3], [7, 6, 3, 0]], dtype=np.uint32)
+    problem_instance.set_durations_matrix(profile="car", matrix_input=matrix)
+    problem_instance.add_vehicle([vroom.Vehicle(id=1, start=0, end=0), vroom.Vehicle(id=2, start=0, end=0, max_tasks=1)])
+    problem_instance.add_job([vroom.Job(id=job_id, location=job_id, default_service=10) for job_id in (1, 2, 3)])
+    return problem_instance.solve(exploration_level=1, nb_threads=1)
+
+
+def test_private_fast_path_matches_public_frame(solution, monkeypatch):
+    if not solution_processor_service._routes_numpy_supported():
+        pytest.skip("installed pyvroom has no verified _routes_numpy")
+    fast = route_step_columns(solution)
+
+    monkeypatch.setattr(solution_processor_service, "ROUTES_NUMPY_VERSIONS", set())
+    public = route_step_columns(solution)
+
+    for column in STEP_COLUMNS:
+        assert fast[column].tolist() == public[column].tolist(), column
+
+
+def test_public_frame_fallback(solution, monkeypatch):
+    monkeypatch.setattr(solution_processor_service, "ROUTES_NUMPY_VERSIONS", set())
+    steps = route_step_columns(solution)
+    assert sorted(steps["id"][steps["type"] == b"job"].tolist()) == [1, 2, 3]
+    assert (steps["id"][steps["type"] != b"job"] == -1).all()
@@ -0,0 +1,38 @@
+from datetime import timedelta
+import vroom
+from infrastructure.solve_policy import MAX_EXPLORATION_LEVEL, MIN_EXPLORATION_LEVEL, SolvePolicy, search_count
+
+
+def test_level_follows_problem_size():
+    policy = SolvePolicy(threads=8)
+    assert policy.parameters(50).exploration_level == MAX_EXPLORATION_LEVEL
+    assert policy.parameters(300).exploration_level == 4
+    assert policy.parameters(10_000).exploration_level == MIN_EXPLORATION_LEVEL
+    assert policy.parameters(50).timeout is None
+
+
+def test_threads_follow_jobs_and_searches():
+    assert SolvePolicy(threads=64).parameters(30).nb_threads == 2
+    parameters = SolvePolicy(threads=64).parameters(3000)
+    assert parameters.nb_threads == search_count(parameters.exploration_level)
+
+
+def test_budget_steps_the_level_down():
+    unbounded = SolvePolicy(threads=4).parameters(1000)
+    budgeted = SolvePolicy(time_budget=100, threads=4).parameters(1000)
+    assert budgeted.exploration_level < unbounded.exploration_level
+    assert SolvePolicy.estimate_seconds(1000, budgeted.exploration_level, 4) <= 100
+    assert budgeted.timeout == timedelta(seconds=100)
+    # The lowest level is kept even if it is estimated to exceed the budget
+    assert SolvePolicy(time_budget=1, threads=4).parameters(1000).exploration_level == MIN_EXPLORATION_LEVEL
+
+
+class NoTimeoutInput:
+    def solve(self, exploration_level, nb_threads=4):
+        pass
+
+
+def test_timeout_is_passed_where_supported():
+    parameters = SolvePolicy(time_budget=5, threads=1).parameters(10)
+    assert SolvePolicy.solve_arguments(vroom.Input(), parameters)["timeout"] == timedelta(seconds=5)
+    assert "timeout" not in SolvePolicy.solve_arguments(NoTimeoutInput(), parameters)
@@ -0,0 +1,45 @@
+import multiprocessing
+import time
+import infrastructure.solver_portfolio as solver_portfolio
+from infrastructure.problem_definition import ProblemDefinition
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.solver_portfolio import SolverPortfolio
+
+
+def straggling_solve(shm_name, shape, definition, parameters, job_order=None):
+    """Worker 0 (original job order) never finishes, the others return at once"""
+    if job_order is None:
+        time.sleep(60)
+    return {}, {"cost": len(job_order), "duration": 0}, 0, 0.0
+
+
+def test_stragglers_are_terminated(monkeypatch):
+    monkeypatch.setattr(solver_portfolio, "solve_on_shared_matrix", straggling_solve)
+    monkeypatch.setattr(solver_portfolio, "DEADLINE_GRACE_SECONDS", 0.5)
+    portfolio = SolverPortfolio(workers=3, solve_policy=SolvePolicy(time_budget=1.0, threads=3))
+
+    start = time.monotonic()
+    result = portfolio.solve(ProblemDefinition(), [[0]])
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 10
+    assert multiprocessing.active_children() == []
+    assert result.best_worker != 0
+    assert result.stats[0].error == "deadline exceeded"
+
+
+def hanging_solve(shm_name, shape, definition, parameters, job_order=None):
+    time.sleep(60)
+
+
+def test_no_result_when_every_worker_hangs(monkeypatch):
+    monkeypatch.setattr(solver_portfolio, "solve_on_shared_matrix", hanging_solve)
+    monkeypatch.setattr(solver_portfolio, "DEADLINE_GRACE_SECONDS", 0.5)
+    portfolio = SolverPortfolio(workers=2, solve_policy=SolvePolicy(time_budget=0.5, threads=2))
+
+    start = time.monotonic()
+    result = portfolio.solve(ProblemDefinition(), [[0]])
+
+    assert time.monotonic() - start < 10
+    assert result is None
+    assert multiprocessing.active_children() == []
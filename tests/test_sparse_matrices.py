@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import helper.onemap as onemap
+from helper.geo import haversine_matrix, k_nearest
+from tests.test_matrix_builder import FakeRouter, expected_matrices
+
+
+def random_locations(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return [tuple(point) for point in np.column_stack((rng.uniform(1.25, 1.45, size), rng.uniform(103.65, 104.0, size)))]
+
+
+def test_k_nearest_matches_brute_force():
+    locations = np.array(random_locations(50))
+    neighbours = k_nearest(locations, 4, chunk_size=7)
+    distances = haversine_matrix(locations)
+    np.fill_diagonal(distances, np.inf)
+    expected = np.argsort(distances, axis=1)[:, :4]
+    assert (np.sort(neighbours, axis=1) == np.sort(expected, axis=1)).all()
+
+
+@pytest.fixture
+def query(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    onemap_query = onemap.OneMapQuery(capture_geometry=False)
+    onemap_query.get_route = FakeRouter()
+    return onemap_query
+
+
+def test_sparse_matrices_route_neighbours_and_depot(query):
+    locations = random_locations(40)
+    n = len(locations)
+    duration_matrix, distance_matrix, stats = query.get_sparse_route_matrices(
+        locations, k=3, progress_callback=lambda done, total: None)
+
+    assert stats.api_calls == stats.real_pairs < n * (n - 1) // 2
+    assert stats.real_pairs + stats.estimated_pairs == n * (n - 1) // 2
+    expected_durations, _ = expected_matrices(locations)
+    # Depot pairs and nearest neighbours are routed
+    assert (duration_matrix[0] == expected_durations[0]).all()
+    for i, row in enumerate(k_nearest(locations, 3)):
+        assert (duration_matrix[i, row] == expected_durations[i, row]).all()
+    assert (duration_matrix == duration_matrix.T).all() and (np.diag(duration_matrix) == 0).all()
+    assert (distance_matrix > 0).sum() == n * (n - 1)
+
+    # Routed pairs are kept in the pair cache, the store stays untouched
+    _, _, stats = query.get_sparse_route_matrices(locations, k=3, progress_callback=lambda done, total: None)
+    assert stats.api_calls == 0
+    assert not query.matrix_store.exists()
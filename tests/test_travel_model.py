@@ -0,0 +1,46 @@
+import numpy as np
+from helper.geo import haversine_matrix
+from helper.matrix_store import MISSING, NO_ROUTE, MatrixStore
+from helper.travel_model import TravelModel
+
+
+def synthetic_store(path, size=30):
+    rng = np.random.default_rng(1)
+    locations = np.column_stack((rng.uniform(1.25, 1.45, size), rng.uniform(103.65, 104.0, size)))
+    distances = 1.4 * haversine_matrix(locations) + 100
+    durations = 0.1 * distances + 30
+    np.fill_diagonal(distances, 0)
+    np.fill_diagonal(durations, 0)
+    if size > 10:
+        # Pairs without a OneMap value must not pull the fit
+        durations[0, 1:5] = durations[1:5, 0] = MISSING
+        durations[2, 5:9] = durations[5:9, 2] = NO_ROUTE
+    store = MatrixStore(path)
+    store.write(locations, durations, distances)
+    return store, locations
+
+
+def test_fit_recovers_the_model(tmp_path):
+    store, _ = synthetic_store(tmp_path)
+    model, stats = TravelModel.fit(store)
+    assert np.isclose(model.detour_factor, 1.4, atol=1e-3)
+    assert np.isclose(model.distance_offset, 100, atol=1)
+    assert np.isclose(model.seconds_per_metre, 0.1, atol=1e-3)
+    assert np.isclose(model.base_seconds, 30, atol=1)
+    assert stats.samples > 0 and stats.duration_mape < 0.01
+
+
+def test_too_few_pairs_keep_the_default(tmp_path):
+    store, _ = synthetic_store(tmp_path, size=2)
+    assert TravelModel.fit(store) == (TravelModel(), None)
+
+
+def test_estimated_matrices(tmp_path):
+    store, locations = synthetic_store(tmp_path)
+    model, _ = TravelModel.fit(store)
+    durations, distances = model.estimate_matrices(locations[:6])
+    assert durations.dtype == distances.dtype == np.int32
+    assert (np.diag(durations) == 0).all() and (durations == durations.T).all()
+    expected = 0.1 * (1.4 * haversine_matrix(locations[:6]) + 100) + 30
+    off_diagonal = ~np.eye(6, dtype=bool)
+    assert np.abs(durations - expected)[off_diagonal].max() <= 2
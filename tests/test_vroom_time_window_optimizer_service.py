@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+import helper.onemap as onemap
+from domain.travelling_salesman.entities.location import Location
+from domain.travelling_salesman.value_objects.address import Address
+from domain.travelling_salesman.value_objects.coordinates import Coordinates
+from domain.vehicle_time_windows.entities.vehicle import Vehicle
+from domain.vehicle_time_windows.value_objects.time_window import TimeWindow
+from infrastructure.job_service import JobService
+from infrastructure.matrix_service import MatrixService
+from infrastructure.onemap_service import OneMapService
+from infrastructure.solution_processor_service import SolutionProcessorService
+from infrastructure.solve_policy import SolvePolicy
+from infrastructure.vehicle_time_window_service import VehicleTimeWindowService
+from infrastructure.vehicle_time_windows.services.vroom_time_window_optimizer_service import (
+    VroomTimeWindowOptimizerService
+)
+
+
+def make_locations(size, first_id=0, seed=0):
+    rng = np.random.default_rng(seed)
+    latlongs = np.column_stack((rng.uniform(1.28, 1.40, size), rng.uniform(103.75, 103.95, size)))
+    return [
+        Location(first_id + i, Address(f"{first_id + i:06d}", f"Address {first_id + i}"), Coordinates(lat, lon))
+        for i, (lat, lon) in enumerate(latlongs.tolist())
+    ]
+
+
+@pytest.fixture
+def optimizer(tmp_path, monkeypatch):
+    monkeypatch.setattr(onemap, "folder_path", tmp_path)
+    return VroomTimeWindowOptimizerService(
+        MatrixService(OneMapService(onemap.OneMapQuery(capture_geometry=False)), mode="estimated"),
+        VehicleTimeWindowService(),
+        JobService(),
+        SolutionProcessorService(),
+        SolvePolicy(threads=1)
+    )
+
+
+def vehicle_of_jobs(routes):
+    return {location.id: route.vehicle_id for route in routes for location in route.locations[1:-1]}
+
+
+def test_warm_start_keeps_the_plan_and_applies_the_changes(optimizer):
+    locations = make_locations(13)
+    vehicles = [Vehicle(1, TimeWindow(0, 86400)), Vehicle(2, TimeWindow(0, 86400))]
+    previous_routes = optimizer.optimize_routes(locations, vehicles, locations[0])
+    before = vehicle_of_jobs(previous_routes)
+    assert sorted(before) == list(range(1, 13))
+
+    added = make_locations(2, first_id=100, seed=1)
+    routes = optimizer.reoptimize_routes(previous_routes, vehicles, added, {3, 7}, locations[0])
+    after = vehicle_of_jobs(routes)
+    assert sorted(after) == sorted((set(range(1, 13)) - {3, 7}) | {100, 101})
+    kept = [job for job in after if job in before]
+    assert sum(after[job] == before[job] for job in kept) >= len(kept) // 2
+
+
+def test_warm_start_falls_back_when_the_seed_no_longer_fits(optimizer):
+    locations = make_locations(9)
+    previous_routes = optimizer.optimize_routes(
+        locations, [Vehicle(1, TimeWindow(0, 86400)), Vehicle(2, TimeWindow(0, 86400))], locations[0])
+
+    # The vehicles' windows shrank, so the previous routes cannot seed the new problem
+    vehicles = [Vehicle(1, TimeWindow(0, 1200)), Vehicle(2, TimeWindow(0, 1200))]
+    routes = optimizer.reoptimize_routes(previous_routes, vehicles, [], [], locations[0])
+    assert all(arrival <= 1200 for route in routes for arrival in route.arrival_times)